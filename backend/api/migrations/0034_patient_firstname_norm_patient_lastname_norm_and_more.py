@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:08
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_alter_patientsemd_attachment'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='patient',
+            name='firstname_norm',
+            field=models.CharField(max_length=255, null=True, verbose_name='Patient normalized first name'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='lastname_norm',
+            field=models.CharField(max_length=255, null=True, verbose_name='Patient normalized last name'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='middlename_norm',
+            field=models.CharField(max_length=255, null=True, verbose_name='Patient normalized middle name'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='snils_digits',
+            field=models.CharField(max_length=11, null=True, verbose_name='Patient SNILS digits'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['lastname_norm'], name='api_patient_lastname_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['firstname_norm'], name='api_patient_firstname_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['middlename_norm'], name='api_patient_middlename_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['snils_digits'], name='api_patient_snils_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['lastname_norm', 'firstname_norm', 'middlename_norm'], name='api_patient_name_norm'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['snils_digits'], name='api_patient_snils_digits'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE
+                    api_patient
+                SET
+                    lastname_norm = replace(lower(trim(lastname)), 'ё', 'е'),
+                    firstname_norm = replace(lower(trim(firstname)), 'ё', 'е'),
+                    middlename_norm = replace(lower(trim(middlename)), 'ё', 'е'),
+                    snils_digits = regexp_replace(snils, '[^0-9]', '', 'g')
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
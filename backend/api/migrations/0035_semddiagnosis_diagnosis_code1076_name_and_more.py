@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_patient_firstname_norm_patient_lastname_norm_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semddiagnosis',
+            name='diagnosis_code1076_name',
+            field=models.CharField(max_length=255, null=True, verbose_name='Diagnosis accuracy type name'),
+        ),
+        migrations.AddField(
+            model_name='semddiagnosis',
+            name='diagnosis_code1077_name',
+            field=models.CharField(max_length=255, null=True, verbose_name='Diagnosis type name'),
+        ),
+        migrations.AddField(
+            model_name='semddiagnosis',
+            name='diagnosis_name',
+            field=models.CharField(max_length=1024, null=True, verbose_name='Diagnosis name'),
+        ),
+        migrations.AddField(
+            model_name='semddiagnosis',
+            name='parent_node_class_code',
+            field=models.CharField(max_length=16, null=True, verbose_name='SEMD classCode of parent of diagnosis node'),
+        ),
+        migrations.AddField(
+            model_name='semddiagnosis',
+            name='parent_node_name',
+            field=models.CharField(max_length=64, null=True, verbose_name='SEMD name of parent of diagnosis node'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_semddiagnosis_diagnosis_code1076_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemdExtraction',
+            fields=[
+                ('internal_message_id', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='SEMD internal_message_id')),
+                ('time_rc', models.DateTimeField(db_index=True, null=True, verbose_name='SEMD time')),
+                ('document_type', models.CharField(max_length=8, null=True, verbose_name='SEMD type')),
+                ('nsi_doc_type', models.CharField(max_length=8, null=True, verbose_name='SEMD nsi type')),
+                ('profile', models.CharField(max_length=8, null=True, verbose_name='SEMD profile')),
+                ('author_mo_oid', models.CharField(max_length=64, null=True, verbose_name='SEMD author MO OID')),
+                ('author_snils', models.CharField(max_length=14, null=True, verbose_name='SEMD author SNILS')),
+                ('author_post', models.CharField(max_length=64, null=True, verbose_name='SEMD author post OID')),
+                ('effective_date', models.DateField(null=True, verbose_name='SEMD effective date')),
+                ('diagnoses', models.JSONField(default=list, verbose_name='SEMD diagnoses')),
+                ('services', models.JSONField(default=list, verbose_name='SEMD services')),
+                ('instrumental_diagnostics', models.JSONField(default=list, verbose_name='SEMD instrumental diagnostics')),
+                ('content', models.JSONField(null=True, verbose_name='SEMD content by document type')),
+                ('extracted_at', models.DateTimeField(auto_now_add=True, verbose_name='Extraction time')),
+            ],
+            options={
+                'verbose_name': 'SEMD extraction',
+                'verbose_name_plural': 'SEMD extractions',
+                'ordering': ['internal_message_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_semdextraction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDiagnosisMilestonesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('diagnosis_date', models.DateField(verbose_name='Diagnosis set date')),
+                ('diagnosis_mkb10', models.CharField(max_length=10, verbose_name='Diagnosis mkb10 code')),
+                ('ptn_mo_oid', models.CharField(max_length=64, null=True, verbose_name='Patient MO OID')),
+                ('kind', models.CharField(blank=True, default='', max_length=3, verbose_name='Milestone kind')),
+                ('milestone_codes', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=128), default=list, size=None, verbose_name='Milestone order|rule|services codes')),
+                ('patients_count', models.IntegerField(verbose_name='Patient-diagnoses count')),
+            ],
+            options={
+                'verbose_name': 'Patient-Diagnosis milestones rollup',
+                'verbose_name_plural': 'Patient-Diagnosis milestones rollup',
+                'ordering': ['diagnosis_date', 'diagnosis_mkb10'],
+                'indexes': [models.Index(fields=['diagnosis_mkb10', 'diagnosis_date'], name='api_p_d_m_rollup_dz_dat')],
+            },
+        ),
+    ]
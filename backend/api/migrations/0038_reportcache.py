@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:25
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_patientdiagnosismilestonesrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportCache',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False, verbose_name='Report cache key')),
+                ('report_type', models.CharField(max_length=16, verbose_name='Report type')),
+                ('date_from', models.DateField(verbose_name='Report period date from')),
+                ('date_to', models.DateField(verbose_name='Report period date to')),
+                ('rules_version', models.CharField(max_length=40, null=True, verbose_name='Orders rules version')),
+                ('cube_version', models.CharField(max_length=64, verbose_name='Cube load version')),
+                ('result', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Report result')),
+                ('elapsed', models.FloatField(verbose_name='Report processing time')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Report computing time')),
+            ],
+            options={
+                'verbose_name': 'Report cache',
+                'verbose_name_plural': 'Reports cache',
+                'ordering': ['report_type', 'date_from', 'date_to'],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+import django.core.serializers.json
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_reportcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='Report job id')),
+                ('report_type', models.CharField(max_length=16, verbose_name='Report type')),
+                ('date_from', models.DateField(verbose_name='Report period date from')),
+                ('date_to', models.DateField(verbose_name='Report period date to')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=8, verbose_name='Report job status')),
+                ('rows_done', models.IntegerField(default=0, verbose_name='Count of computed report rows')),
+                ('rows_total', models.IntegerField(default=0, verbose_name='Count of all report rows')),
+                ('result', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='Report result')),
+                ('error', models.TextField(null=True, verbose_name='Report job error')),
+                ('worker', models.CharField(max_length=64, null=True, verbose_name='Worker host:pid')),
+                ('elapsed', models.FloatField(null=True, verbose_name='Report processing time')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Report job creating time')),
+                ('started_at', models.DateTimeField(null=True, verbose_name='Report job starting time')),
+                ('finished_at', models.DateTimeField(null=True, verbose_name='Report job finishing time')),
+            ],
+            options={
+                'verbose_name': 'Report job',
+                'verbose_name_plural': 'Report jobs',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
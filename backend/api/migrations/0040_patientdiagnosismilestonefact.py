@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_reportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDiagnosisMilestoneFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=128, verbose_name='Milestone order|rule|services code')),
+                ('kind', models.CharField(max_length=3, verbose_name='Milestone kind')),
+                ('days', models.IntegerField(null=True, verbose_name='Days from diagnosis set date')),
+                ('patient_diagnosis', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='milestone_facts', to='api.patientdiagnosismilestones', verbose_name='Patient-Diagnosis')),
+            ],
+            options={
+                'verbose_name': 'Patient-Diagnosis milestone fact',
+                'verbose_name_plural': 'Patient-Diagnosis milestone facts',
+                'ordering': ['patient_diagnosis', 'code', 'kind'],
+                'indexes': [models.Index(fields=['patient_diagnosis', 'code', 'kind'], name='api_p_d_m_fact_pd_code_kind'), models.Index(fields=['code', 'kind', 'days'], name='api_p_d_m_fact_code_kind_days')],
+            },
+        ),
+    ]
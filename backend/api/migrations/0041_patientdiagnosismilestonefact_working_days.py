@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_patientdiagnosismilestonefact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patientdiagnosismilestonefact',
+            name='working_days',
+            field=models.IntegerField(null=True, verbose_name='Working days from diagnosis set date'),
+        ),
+    ]
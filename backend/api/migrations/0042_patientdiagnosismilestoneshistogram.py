@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0041_patientdiagnosismilestonefact_working_days'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDiagnosisMilestonesHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('diagnosis_date', models.DateField(verbose_name='Diagnosis set date')),
+                ('code', models.CharField(max_length=128, verbose_name='Milestone order|rule|services code')),
+                ('kind', models.CharField(max_length=3, verbose_name='Milestone kind')),
+                ('ptn_mo_oid', models.CharField(max_length=64, null=True, verbose_name='Patient MO OID')),
+                ('bucket', models.SmallIntegerField(verbose_name='Milestone days bucket')),
+                ('patients_count', models.IntegerField(verbose_name='Patient-diagnoses count')),
+            ],
+            options={
+                'verbose_name': 'Patient-Diagnosis milestones histogram',
+                'verbose_name_plural': 'Patient-Diagnosis milestones histograms',
+                'ordering': ['diagnosis_date', 'code', 'kind'],
+                'indexes': [models.Index(fields=['code', 'kind', 'diagnosis_date'], name='api_p_d_m_hist_code_kind_dat')],
+            },
+        ),
+    ]
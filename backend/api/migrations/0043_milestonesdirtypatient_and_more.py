@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0042_patientdiagnosismilestoneshistogram'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MilestonesDirtyPatient',
+            fields=[
+                ('ptn_id', models.CharField(max_length=16, primary_key=True, serialize=False, verbose_name='Patient @rid')),
+                ('time_marked', models.DateTimeField(verbose_name='Time of the last change')),
+            ],
+            options={
+                'verbose_name': 'Patient with stale milestones',
+                'verbose_name_plural': 'Patients with stale milestones',
+                'ordering': ['ptn_id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='semddiagnosis',
+            index=models.Index(fields=['internal_message_id', 'diagnosis_mkb10', 'diagnosis_date'], name='api_semddiagnosis_msg_dz_dat'),
+        ),
+        migrations.AddIndex(
+            model_name='semdservice',
+            index=models.Index(fields=['internal_message_id', 'service_code', 'service_date'], name='api_semdservice_msg_srv_dat'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0044_reportjob_heartbeat_at'),
+    ]
+
+    operations = [
+        # Histograms are rebuilt by fill_milestones_cube
+        migrations.RunSQL('DELETE FROM api_patientdiagnosismilestoneshistogram', migrations.RunSQL.noop),
+        migrations.RemoveIndex(
+            model_name='patientdiagnosismilestoneshistogram',
+            name='api_p_d_m_hist_code_kind_dat',
+        ),
+        migrations.RenameField(
+            model_name='patientdiagnosismilestoneshistogram',
+            old_name='code',
+            new_name='codes_key',
+        ),
+        migrations.AlterField(
+            model_name='patientdiagnosismilestoneshistogram',
+            name='codes_key',
+            field=models.CharField(max_length=32, verbose_name='Hash of services group order|rule|services codes'),
+        ),
+        migrations.AlterModelOptions(
+            name='patientdiagnosismilestoneshistogram',
+            options={'ordering': ['diagnosis_date', 'codes_key', 'kind'],
+                     'verbose_name': 'Patient-Diagnosis milestones histogram',
+                     'verbose_name_plural': 'Patient-Diagnosis milestones histograms'},
+        ),
+        migrations.AddIndex(
+            model_name='patientdiagnosismilestoneshistogram',
+            index=models.Index(fields=['codes_key', 'kind', 'diagnosis_date'], name='api_p_d_m_hist_codes_kind_dat'),
+        ),
+    ]
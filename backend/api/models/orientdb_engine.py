@@ -1,10 +1,235 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.db.models import Index
 from pyorient import OrientDB
+from pyorient.exceptions import PyOrientConnectionException, PyOrientConnectionPoolException
+
+from backend.settings import ORIENTDB_HOST, ORIENTDB_PORT, ORIENTDB_NAME, ORIENTDB_USER, ORIENTDB_PASSWORD, \
+    ORIENTDB_POOL_SIZE, ORIENTDB_POOL_TIMEOUT, ORIENTDB_POOL_HEALTH_CHECK_INTERVAL
+
+# Errors after which the socket of the connection can not be used anymore
+CONNECTION_ERRORS = (PyOrientConnectionException, OSError)
+
+
+class OrientDBPool:
+    """
+        Thread-safe pool of OrientDB connections.
+        Connections are opened lazily (not at import time), checked out per thread, checked for health after
+        being idle for a while and reopened automatically when the socket is broken.
+    """
+
+    def __init__(self, host: str, port: int, db_name: str, user: str, password: str,
+                 size: int = 10, timeout: float = 30, health_check_interval: float = 60):
+        self.host = host
+        self.port = port
+        self.db_name = db_name
+        self.user = user
+        self.password = password
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._idle = list()     # list of (client, last used monotonic time)
+        self._opened = 0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._health_check_failures = 0
+
+    def _open(self) -> OrientDB:
+        client = OrientDB(self.host, self.port)
+        client.db_open(self.db_name, self.user, self.password)
+        return client
+
+    @staticmethod
+    def _close(client: OrientDB):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(client: OrientDB) -> bool:
+        try:
+            client.db_size()
+            return True
+        except Exception:
+            return False
+
+    def _forget(self, client: OrientDB | None):
+        if client is not None:
+            self._close(client)
+        with self._condition:
+            self._opened -= 1
+            self._condition.notify()
+
+    def acquire(self) -> OrientDB:
+        """
+            Check out connection from pool (wait for free one if pool is exhausted)
+        """
+        s = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        client = None
+        last_used = None
+        with self._condition:
+            while True:
+                if self._idle:
+                    client, last_used = self._idle.pop()
+                    break
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    if self._idle or self._opened < self.size:
+                        continue
+                    self._timeouts += 1
+                    raise PyOrientConnectionPoolException(
+                        f"OrientDB pool is exhausted: no free connection in {self.timeout} seconds", []
+                    )
+            wait_time = time.perf_counter() - s
+            self._checkouts += 1
+            if wait_time > 0.001:
+                self._waits += 1
+            self._wait_time_total += wait_time
+            self._wait_time_max = max(self._wait_time_max, wait_time)
+
+        try:
+            if client is None:
+                client = self._open()
+            elif time.monotonic() - last_used > self.health_check_interval and not self._is_alive(client):
+                with self._condition:
+                    self._health_check_failures += 1
+                    self._reconnects += 1
+                self._close(client)
+                client = None
+                client = self._open()
+        except Exception:
+            self._forget(client)
+            raise
+
+        return client
 
-from backend.settings import ORIENTDB_HOST, ORIENTDB_PORT, ORIENTDB_NAME, ORIENTDB_USER, ORIENTDB_PASSWORD
+    def release(self, client: OrientDB, is_broken: bool = False):
+        """
+            Return connection to pool (broken connection is closed and its slot is freed)
+        """
+        if is_broken:
+            self._forget(client)
+            return
+        with self._condition:
+            self._idle.append((client, time.monotonic()))
+            self._condition.notify()
 
-orient_db_client = OrientDB(ORIENTDB_HOST, ORIENTDB_PORT)
-orient_db_client.db_open(ORIENTDB_NAME, ORIENTDB_USER, ORIENTDB_PASSWORD)
+    @contextmanager
+    def connection(self):
+        """
+            Context manager with checked out connection.
+            Nested usage in the same thread gets the connection already held by the thread.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is not None:
+            yield client
+            return
+
+        client = self.acquire()
+        self._local.client = client
+        is_broken = False
+        try:
+            yield client
+        except CONNECTION_ERRORS:
+            is_broken = True
+            raise
+        finally:
+            self._local.client = None
+            self.release(client, is_broken)
+
+    def query(self, *args):
+        """
+            Execute query on pooled connection, reconnect and retry once if connection was broken
+        """
+        is_nested = getattr(self._local, 'client', None) is not None
+        try:
+            with self.connection() as client:
+                return client.query(*args)
+        except CONNECTION_ERRORS:
+            if is_nested:
+                raise
+            with self._condition:
+                self._reconnects += 1
+
+        with self.connection() as client:
+            return client.query(*args)
+
+    def command(self, *args):
+        """
+            Execute command on pooled connection
+        """
+        with self.connection() as client:
+            return client.command(*args)
+
+    def stats(self) -> dict:
+        """
+            Pool usage and pool-wait metrics
+        """
+        with self._condition:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'idle': len(self._idle),
+                'in_use': self._opened - len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_total': self._wait_time_total,
+                'wait_time_avg': self._wait_time_total / self._checkouts if self._checkouts else 0.0,
+                'wait_time_max': self._wait_time_max,
+                'timeouts': self._timeouts,
+                'reconnects': self._reconnects,
+                'health_check_failures': self._health_check_failures,
+            }
+
+    def reset_after_fork(self):
+        """
+            Forget connections inherited from parent process (their sockets belong to parent, so they are not closed)
+        """
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._idle = list()
+        self._opened = 0
+
+    def close(self):
+        """
+            Close all idle connections
+        """
+        with self._condition:
+            idle = self._idle
+            self._idle = list()
+            self._opened -= len(idle)
+            self._condition.notify_all()
+        for client, last_used in idle:
+            self._close(client)
+
+
+orient_db_pool = OrientDBPool(
+    ORIENTDB_HOST,
+    ORIENTDB_PORT,
+    ORIENTDB_NAME,
+    ORIENTDB_USER,
+    ORIENTDB_PASSWORD,
+    size=ORIENTDB_POOL_SIZE,
+    timeout=ORIENTDB_POOL_TIMEOUT,
+    health_check_interval=ORIENTDB_POOL_HEALTH_CHECK_INTERVAL,
+)
 
 
 # Fantom OrientDB models for ModelViewSet
@@ -20,14 +245,52 @@ class Patient(models.Model):
     mo_oid = models.CharField(max_length=64, null=True, verbose_name='Patient assigned clinic oid')
     med_terr = models.CharField(max_length=255, null=True, verbose_name='Patient medical territory')
     is_in_cancer_register = models.BooleanField(verbose_name='Patient is in Cancer register flag')
+    # Normalized columns of patient search index
+    lastname_norm = models.CharField(max_length=255, null=True, verbose_name='Patient normalized last name')
+    firstname_norm = models.CharField(max_length=255, null=True, verbose_name='Patient normalized first name')
+    middlename_norm = models.CharField(max_length=255, null=True, verbose_name='Patient normalized middle name')
+    snils_digits = models.CharField(max_length=11, null=True, verbose_name='Patient SNILS digits')
 
     def __str__(self):
         return str(self.rid) + ': ' + str(self.lastname) + ' ' + \
             str(self.firstname) + ' ' + str(self.middlename)
 
+    def save(self, *args, **kwargs):
+        self.lastname_norm = normalize_name(self.lastname)
+        self.firstname_norm = normalize_name(self.firstname)
+        self.middlename_norm = normalize_name(self.middlename)
+        self.snils_digits = normalize_snils(self.snils)
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
+        indexes = (
+            GinIndex(fields=['lastname_norm'], opclasses=['gin_trgm_ops'], name='api_patient_lastname_trgm'),
+            GinIndex(fields=['firstname_norm'], opclasses=['gin_trgm_ops'], name='api_patient_firstname_trgm'),
+            GinIndex(fields=['middlename_norm'], opclasses=['gin_trgm_ops'], name='api_patient_middlename_trgm'),
+            GinIndex(fields=['snils_digits'], opclasses=['gin_trgm_ops'], name='api_patient_snils_trgm'),
+            Index(fields=['lastname_norm', 'firstname_norm', 'middlename_norm'], name='api_patient_name_norm'),
+            Index(fields=['snils_digits'], name='api_patient_snils_digits'),
+        )
+
+
+def normalize_name(name: str | None) -> str | None:
+    """
+        Normalized name for patient search index (lower case, without spaces at the ends, 'ё' as 'е')
+    """
+    if name is None:
+        return None
+    return name.strip().lower().replace('ё', 'е')
+
+
+def normalize_snils(snils: str | None) -> str | None:
+    """
+        Only digits of SNILS for patient search index
+    """
+    if snils is None:
+        return None
+    return ''.join(c for c in snils if c.isdigit())
 
 
 """
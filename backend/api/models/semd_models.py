@@ -1,3 +1,7 @@
+import uuid
+
+from django.contrib.postgres.fields import ArrayField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import Index
 
@@ -23,6 +27,12 @@ class SemdDiagnosis(models.Model):
     diagnosis_code1379 = models.CharField(max_length=10, null=True, verbose_name='Diagnosis SEMD section')
     diagnosis_code1076 = models.CharField(max_length=10, null=True, verbose_name='Diagnosis accuracy type')
     diagnosis_code1077 = models.CharField(max_length=10, null=True, verbose_name='Diagnosis type')
+    diagnosis_name = models.CharField(max_length=1024, null=True, verbose_name='Diagnosis name')
+    diagnosis_code1076_name = models.CharField(max_length=255, null=True, verbose_name='Diagnosis accuracy type name')
+    diagnosis_code1077_name = models.CharField(max_length=255, null=True, verbose_name='Diagnosis type name')
+    parent_node_name = models.CharField(max_length=64, null=True, verbose_name='SEMD name of parent of diagnosis node')
+    parent_node_class_code = models.CharField(max_length=16, null=True,
+                                              verbose_name='SEMD classCode of parent of diagnosis node')
 
     def __str__(self):
         return str(self.ptn_id) + '-' + str(self.rc_id) + '-' + \
@@ -35,6 +45,8 @@ class SemdDiagnosis(models.Model):
         indexes = (
             Index(fields=['ptn_id', 'diagnosis_mkb10', 'diagnosis_date'], name='api_semddiagnosis_ptn_dz_dat'),
             Index(fields=['ptn_id', 'diagnosis_mkb10', 'time_rc'], name='api_semddiagnosis_ptn_dz_rcdat'),
+            Index(fields=['internal_message_id', 'diagnosis_mkb10', 'diagnosis_date'],
+                  name='api_semddiagnosis_msg_dz_dat'),
         )
 
 
@@ -70,9 +82,96 @@ class SemdService(models.Model):
         indexes = (
             Index(fields=['ptn_id', 'service_code', 'service_date'], name='api_semdservice_ptn_srv_dat'),
             Index(fields=['ptn_id', 'service_code', 'time_rc'], name='api_semdservice_ptn_srv_rcdat'),
+            Index(fields=['internal_message_id', 'service_code', 'service_date'], name='api_semdservice_msg_srv_dat'),
         )
 
 
+class SemdExtraction(models.Model):
+    # Data extracted once from immutable SEMD payload of vimis_sending
+    internal_message_id = models.CharField(max_length=64, primary_key=True, verbose_name='SEMD internal_message_id')
+    time_rc = models.DateTimeField(null=True, verbose_name='SEMD time', db_index=True)
+    document_type = models.CharField(max_length=8, null=True, verbose_name='SEMD type')
+    nsi_doc_type = models.CharField(max_length=8, null=True, verbose_name='SEMD nsi type')
+    profile = models.CharField(max_length=8, null=True, verbose_name='SEMD profile')
+    author_mo_oid = models.CharField(max_length=64, null=True, verbose_name='SEMD author MO OID')
+    author_snils = models.CharField(max_length=14, null=True, verbose_name='SEMD author SNILS')
+    author_post = models.CharField(max_length=64, null=True, verbose_name='SEMD author post OID')
+    effective_date = models.DateField(null=True, verbose_name='SEMD effective date')
+    diagnoses = models.JSONField(default=list, verbose_name='SEMD diagnoses')
+    services = models.JSONField(default=list, verbose_name='SEMD services')
+    instrumental_diagnostics = models.JSONField(default=list, verbose_name='SEMD instrumental diagnostics')
+    content = models.JSONField(null=True, verbose_name='SEMD content by document type')
+    extracted_at = models.DateTimeField(auto_now_add=True, verbose_name='Extraction time')
+
+    def __str__(self):
+        return str(self.internal_message_id)
+
+    class Meta:
+        verbose_name = 'SEMD extraction'
+        verbose_name_plural = 'SEMD extractions'
+        ordering = ['internal_message_id']
+
+
+class ReportCache(models.Model):
+    # Computed reports shared by all workers, valid while versions of orders rules and cube are the same
+    key = models.CharField(max_length=40, primary_key=True, verbose_name='Report cache key')
+    report_type = models.CharField(max_length=16, verbose_name='Report type')
+    date_from = models.DateField(verbose_name='Report period date from')
+    date_to = models.DateField(verbose_name='Report period date to')
+    rules_version = models.CharField(max_length=40, null=True, verbose_name='Orders rules version')
+    cube_version = models.CharField(max_length=64, verbose_name='Cube load version')
+    result = models.JSONField(encoder=DjangoJSONEncoder, verbose_name='Report result')
+    elapsed = models.FloatField(verbose_name='Report processing time')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Report computing time')
+
+    def __str__(self):
+        return str(self.report_type) + '-' + str(self.date_from) + '-' + str(self.date_to)
+
+    class Meta:
+        verbose_name = 'Report cache'
+        verbose_name_plural = 'Reports cache'
+        ordering = ['report_type', 'date_from', 'date_to']
+
+
+class ReportJob(models.Model):
+    # Report computed asynchronously by local pool of workers
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='Report job id')
+    report_type = models.CharField(max_length=16, verbose_name='Report type')
+    date_from = models.DateField(verbose_name='Report period date from')
+    date_to = models.DateField(verbose_name='Report period date to')
+    status = models.CharField(max_length=8, choices=STATUSES, default=QUEUED, verbose_name='Report job status',
+                              db_index=True)
+    rows_done = models.IntegerField(default=0, verbose_name='Count of computed report rows')
+    rows_total = models.IntegerField(default=0, verbose_name='Count of all report rows')
+    result = models.JSONField(null=True, encoder=DjangoJSONEncoder, verbose_name='Report result')
+    error = models.TextField(null=True, verbose_name='Report job error')
+    worker = models.CharField(max_length=64, null=True, verbose_name='Worker host:pid')
+    elapsed = models.FloatField(null=True, verbose_name='Report processing time')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Report job creating time')
+    started_at = models.DateTimeField(null=True, verbose_name='Report job starting time')
+    heartbeat_at = models.DateTimeField(null=True, verbose_name='Report job last heartbeat time')
+    finished_at = models.DateTimeField(null=True, verbose_name='Report job finishing time')
+
+    def __str__(self):
+        return str(self.id) + '-' + str(self.report_type) + '-' + str(self.status)
+
+    class Meta:
+        verbose_name = 'Report job'
+        verbose_name_plural = 'Report jobs'
+        ordering = ['created_at']
+
+
 class OncorSettings(models.Model):
     code = models.CharField(max_length=40, primary_key=True, verbose_name='Setting code')
     value = models.JSONField(null=True, verbose_name='Setting value')
@@ -109,6 +208,89 @@ class PatientDiagnosisMilestones(models.Model):
         )
 
 
+class PatientDiagnosisMilestonesRollup(models.Model):
+    # Daily rollup of Patient-Diagnosis cube: kind '' counts all patient-diagnoses,
+    # kinds 'нап' and 'исп' count patient-diagnoses which have exactly this set of milestone codes of the kind
+    diagnosis_date = models.DateField(verbose_name='Diagnosis set date')
+    diagnosis_mkb10 = models.CharField(max_length=10, verbose_name='Diagnosis mkb10 code')
+    ptn_mo_oid = models.CharField(max_length=64, null=True, verbose_name='Patient MO OID')
+    kind = models.CharField(max_length=3, blank=True, default='', verbose_name='Milestone kind')
+    milestone_codes = ArrayField(models.CharField(max_length=128), default=list,
+                                 verbose_name='Milestone order|rule|services codes')
+    patients_count = models.IntegerField(verbose_name='Patient-diagnoses count')
+
+    def __str__(self):
+        return str(self.diagnosis_date) + '-' + str(self.diagnosis_mkb10) + '-' + str(self.ptn_mo_oid) + '-' + \
+            str(self.kind)
+
+    class Meta:
+        verbose_name = 'Patient-Diagnosis milestones rollup'
+        verbose_name_plural = 'Patient-Diagnosis milestones rollup'
+        ordering = ['diagnosis_date', 'diagnosis_mkb10']
+        indexes = (
+            Index(fields=['diagnosis_mkb10', 'diagnosis_date'], name='api_p_d_m_rollup_dz_dat'),
+        )
+
+
+class PatientDiagnosisMilestoneFact(models.Model):
+    # Normalized milestones of Patient-Diagnosis cube: one row for every key of diagnosis_milestones
+    patient_diagnosis = models.ForeignKey(PatientDiagnosisMilestones, on_delete=models.DO_NOTHING, db_constraint=False,
+                                          related_name='milestone_facts', verbose_name='Patient-Diagnosis')
+    code = models.CharField(max_length=128, verbose_name='Milestone order|rule|services code')
+    kind = models.CharField(max_length=3, verbose_name='Milestone kind')
+    days = models.IntegerField(null=True, verbose_name='Days from diagnosis set date')
+    working_days = models.IntegerField(null=True, verbose_name='Working days from diagnosis set date')
+
+    def __str__(self):
+        return str(self.patient_diagnosis_id) + '-' + str(self.code) + ':' + str(self.kind) + '-' + str(self.days)
+
+    class Meta:
+        verbose_name = 'Patient-Diagnosis milestone fact'
+        verbose_name_plural = 'Patient-Diagnosis milestone facts'
+        ordering = ['patient_diagnosis', 'code', 'kind']
+        indexes = (
+            Index(fields=['patient_diagnosis', 'code', 'kind'], name='api_p_d_m_fact_pd_code_kind'),
+            Index(fields=['code', 'kind', 'days'], name='api_p_d_m_fact_code_kind_days'),
+        )
+
+
+class PatientDiagnosisMilestonesHistogram(models.Model):
+    # Daily histograms of milestone days by services group (codes of report row), kind and MO:
+    # count of patient-diagnoses which first milestone days of group are in bucket (see MILESTONE_DAYS_BUCKETS)
+    diagnosis_date = models.DateField(verbose_name='Diagnosis set date')
+    codes_key = models.CharField(max_length=32, verbose_name='Hash of services group order|rule|services codes')
+    kind = models.CharField(max_length=3, verbose_name='Milestone kind')
+    ptn_mo_oid = models.CharField(max_length=64, null=True, verbose_name='Patient MO OID')
+    bucket = models.SmallIntegerField(verbose_name='Milestone days bucket')
+    patients_count = models.IntegerField(verbose_name='Patient-diagnoses count')
+
+    def __str__(self):
+        return str(self.diagnosis_date) + '-' + str(self.codes_key) + ':' + str(self.kind) + '-' + \
+            str(self.ptn_mo_oid) + '-' + str(self.bucket)
+
+    class Meta:
+        verbose_name = 'Patient-Diagnosis milestones histogram'
+        verbose_name_plural = 'Patient-Diagnosis milestones histograms'
+        ordering = ['diagnosis_date', 'codes_key', 'kind']
+        indexes = (
+            Index(fields=['codes_key', 'kind', 'diagnosis_date'], name='api_p_d_m_hist_codes_kind_dat'),
+        )
+
+
+class MilestonesDirtyPatient(models.Model):
+    # Patients which SEMD cubes rows were changed by incremental refresh, their milestones must be recomputed
+    ptn_id = models.CharField(max_length=16, primary_key=True, verbose_name='Patient @rid')
+    time_marked = models.DateTimeField(verbose_name='Time of the last change')
+
+    def __str__(self):
+        return str(self.ptn_id) + '-' + str(self.time_marked)
+
+    class Meta:
+        verbose_name = 'Patient with stale milestones'
+        verbose_name_plural = 'Patients with stale milestones'
+        ordering = ['ptn_id']
+
+
 class PatientRecord(models.Model):
     # Patient Cancer Register Records
     ptn_id = models.CharField(max_length=16, verbose_name='Patient @rid', db_index=True)
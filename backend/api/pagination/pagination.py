@@ -1,6 +1,38 @@
+import base64
+import re
+
 from rest_framework import pagination
+from rest_framework.exceptions import ParseError
 
 
 class SemdPageNumberPagination(pagination.PageNumberPagination):
     def get_paginated_response_schema(self, schema):
         return schema['items']
+
+
+RID_PATTERN = re.compile(r'^#\d+:\d+$')
+
+
+def encode_cursor(rid: str) -> str:
+    """
+        Make opaque keyset pagination cursor from the last OrientDB @rid of page
+    """
+    return base64.urlsafe_b64encode(rid.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> str | None:
+    """
+        Get OrientDB @rid from keyset pagination cursor (None for the first page)
+    """
+    if not cursor:
+        return None
+
+    try:
+        rid = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except Exception:
+        rid = None
+
+    if not rid or not RID_PATTERN.match(rid):
+        raise ParseError(f"Value of cursor parameter ({cursor}) is not valid", code='cursor')
+
+    return rid
@@ -5,7 +5,7 @@ class PatientPermission(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method == 'OPTIONS':
             return True
-        if view.action in ['list', 'retrieve', 'diagnoses', 'semds', 'tests', 'registry_report']:
+        if view.action in ['list', 'retrieve', 'diagnoses', 'suggest', 'semds', 'tests', 'registry_report']:
             return request.user.is_authenticated
         else:
             return False
@@ -13,7 +13,7 @@ class PatientPermission(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method == 'OPTIONS':
             return True
-        if view.action in ['list', 'retrieve', 'diagnoses', 'semds', 'tests', 'registry_report']:
+        if view.action in ['list', 'retrieve', 'diagnoses', 'suggest', 'semds', 'tests', 'registry_report']:
             return request.user.is_authenticated
         else:
             return False
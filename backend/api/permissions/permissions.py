@@ -55,3 +55,39 @@ class ListRetrievePermission(permissions.BasePermission):
             return False
 
 
+
+
+class CreateRetrievePermission(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.method == 'OPTIONS':
+            return True
+        if view.action in ['create', 'retrieve', 'result']:
+            return request.user.is_authenticated
+        else:
+            return False
+
+    def has_object_permission(self, request, view, obj):
+        if request.method == 'OPTIONS':
+            return True
+        if view.action in ['create', 'retrieve', 'result']:
+            return request.user.is_authenticated
+        else:
+            return False
+
+
+class ServicePermission(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.method == 'OPTIONS':
+            return True
+        if view.action in ['list', 'invalidate']:
+            return request.user.is_authenticated and request.user.is_staff
+        else:
+            return False
+
+    def has_object_permission(self, request, view, obj):
+        if request.method == 'OPTIONS':
+            return True
+        if view.action in ['list', 'invalidate']:
+            return request.user.is_authenticated and request.user.is_staff
+        else:
+            return False
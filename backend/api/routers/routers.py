@@ -13,6 +13,24 @@ class OnlyListRouter(routers.SimpleRouter):
     ]
 
 
+class ListActionsRouter(routers.SimpleRouter):
+    routes = [
+        routers.Route(
+            url=r'^{prefix}$',
+            mapping={'get': 'list'},
+            name='{basename}-list',
+            detail=False,
+            initkwargs={'suffix': 'List'}
+        ),
+        routers.DynamicRoute(
+            url=r'^{prefix}/{url_path}$',
+            name='{basename}-{url_name}',
+            detail=False,
+            initkwargs={}
+        ),
+    ]
+
+
 class ListRetrieveRouter(routers.SimpleRouter):
     routes = [
         routers.Route(
@@ -22,6 +40,12 @@ class ListRetrieveRouter(routers.SimpleRouter):
             detail=False,
             initkwargs={'suffix': 'List'}
         ),
+        routers.DynamicRoute(
+            url=r'^{prefix}/{url_path}$',
+            name='{basename}-{url_name}',
+            detail=False,
+            initkwargs={}
+        ),
         routers.Route(
             url=r'^{prefix}/{lookup}$',
             mapping={'get': 'retrieve'},
@@ -63,3 +87,28 @@ class FullRouter(routers.SimpleRouter):
     ]
 
 
+
+
+class CreateRetrieveRouter(routers.SimpleRouter):
+    routes = [
+        routers.Route(
+            url=r'^{prefix}$',
+            mapping={'post': 'create'},
+            name='{basename}-list',
+            detail=False,
+            initkwargs={'suffix': 'List'}
+        ),
+        routers.Route(
+            url=r'^{prefix}/{lookup}$',
+            mapping={'get': 'retrieve'},
+            name='{basename}-detail',
+            detail=True,
+            initkwargs={'suffix': 'Detail'}
+        ),
+        routers.DynamicRoute(
+            url=r'^{prefix}/{lookup}/{url_path}$',
+            name='{basename}-{url_name}',
+            detail=True,
+            initkwargs={}
+        ),
+    ]
@@ -79,10 +79,22 @@ class MilestonesSerializer(serializers.Serializer):
     patients_count = serializers.DictField(required=False, help_text='Patients count')
     referrals_count = serializers.DictField(required=False, help_text='Referrals count')
     protocols_count = serializers.DictField(required=False, help_text='Protocols count')
+    within_period_count = serializers.DictField(required=False,
+                                                help_text='Count of patients with protocol within services period')
+    overdue_count = serializers.DictField(required=False,
+                                          help_text='Count of patients with protocol after services period')
+    referrals_days = serializers.DictField(required=False,
+                                           help_text='Distribution of days to referral: all and by MO '
+                                                     '(count, median, p75, p90, histogram), only with distribution')
+    protocols_days = serializers.DictField(required=False,
+                                           help_text='Distribution of days to protocol: all and by MO '
+                                                     '(count, median, p75, p90, histogram), only with distribution')
     services = ServiceSerializer(many=True)
     diagnoses = DiagnosisSerializer(many=True)
     codes = serializers.ListField(required=False, help_text='List of order|rule|services codes')
     order_rules = OrderRuleSerializer(required=False, many=True)
+    series = serializers.DictField(required=False,
+                                   help_text='Series of counts by periods: all and by MO (only with granularity)')
 
 
 class F14v2Serializer(serializers.Serializer):
@@ -91,6 +103,11 @@ class F14v2Serializer(serializers.Serializer):
     """
     milestones = MilestonesSerializer(many=True)
     medical_organizations = MOSerializer(many=True)
+    granularity = serializers.CharField(required=False, help_text='Granularity of series (month or week)')
+    periods = serializers.ListField(child=serializers.DateField(), required=False,
+                                    help_text='Starts of series periods')
+    days_buckets = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                         help_text='Lower bounds of days buckets of distributions histograms')
 
 
 class F14v2ListSerializer(BaseResponseSerializer):
@@ -99,3 +116,56 @@ class F14v2ListSerializer(BaseResponseSerializer):
     """
     result = F14v2Serializer(many=True)
     retExtInfo = PaginationListSerializer()
+
+
+class F14v2DrillDownSerializer(serializers.Serializer):
+    """
+        Standard F14 v.2 drill-down schema (for all responses)
+    """
+    ptn_id = serializers.CharField(help_text='Patient @rid')
+    ptn_code = serializers.CharField(allow_null=True, help_text='Patient extra abbreviation')
+    mo_oid = serializers.CharField(allow_null=True, help_text='Patient medical organization OID')
+    diagnosis_code = serializers.CharField(help_text='Diagnosis code')
+    diagnosis_date = serializers.DateField(help_text='Diagnosis set date')
+
+
+class F14v2DrillDownListSerializer(BaseResponseSerializer):
+    """
+        F14 v.2 drill-down list schema
+    """
+    result = F14v2DrillDownSerializer(many=True)
+    retExtInfo = PaginationListSerializer()
+
+
+class ReportJobSerializer(serializers.Serializer):
+    """
+        Standard report job schema (for all responses)
+    """
+    job_id = serializers.UUIDField(help_text='Report job id')
+    report_type = serializers.CharField(help_text='Report type (F14 or F14v2)')
+    date_from = serializers.DateField(help_text='Report period date from')
+    date_to = serializers.DateField(help_text='Report period date to')
+    status = serializers.CharField(help_text='Report job status (queued, running, done or failed)')
+    rows_done = serializers.IntegerField(help_text='Count of computed report rows')
+    rows_total = serializers.IntegerField(help_text='Count of all report rows (0 until computing is started)')
+    error = serializers.CharField(required=False, allow_null=True, help_text='Report job error')
+    elapsed = serializers.FloatField(required=False, allow_null=True, help_text='Report processing time')
+    created_at = serializers.DateTimeField(help_text='Report job creating time')
+    started_at = serializers.DateTimeField(required=False, allow_null=True, help_text='Report job starting time')
+    finished_at = serializers.DateTimeField(required=False, allow_null=True, help_text='Report job finishing time')
+
+
+class ReportJobDetailsSerializer(BaseResponseSerializer):
+    """
+        Report job details schema
+    """
+    result = ReportJobSerializer(many=False)
+
+
+class ReportJobCreateSerializer(serializers.Serializer):
+    """
+        Report job request schema
+    """
+    report_type = serializers.ChoiceField(choices=['F14', 'F14v2'], help_text='Report type')
+    date_from = serializers.DateField(help_text='Report period date from')
+    date_to = serializers.DateField(help_text='Report period date to')
@@ -109,6 +109,25 @@ class PatientListDiagnosisSerializer(BaseResponseSerializer):
     retExtInfo = PaginationListSerializer()
 
 
+class PatientSuggestSerializer(serializers.Serializer):
+    """
+        Patient autocomplete suggestion schema
+    """
+    rid = serializers.CharField(help_text='Patient @rid')
+    lastname = serializers.CharField(help_text='Patient last name')
+    firstname = serializers.CharField(help_text='Patient first name')
+    middlename = serializers.CharField(help_text='Patient middle name')
+    birthday = serializers.DateField(help_text='Patient birthday')
+    snils = serializers.CharField(help_text='Patient SNILS')
+
+
+class PatientSuggestListSerializer(BaseResponseSerializer):
+    """
+        Patient autocomplete suggestion list schema
+    """
+    result = PatientSuggestSerializer(many=True)
+
+
 # class PatientRegistryReportSerializer(serializers.Serializer):
 #     """
 #         Patient Registry report schema
@@ -43,13 +43,16 @@ class PaginationListSerializer(serializers.Serializer):
     """
         Pagination list's extra information schema
     """
-    count_items = serializers.IntegerField(help_text='Total number of items in result set')
+    count_items = serializers.IntegerField(allow_null=True, help_text='Total number of items in result set '
+                                                                      '(null if it was not calculated)')
     items_per_page = serializers.IntegerField(help_text='Number of items on one page')
     start_item_index = serializers.IntegerField(help_text='Index of start item on current page')
     end_item_index = serializers.IntegerField(help_text='Index of end item on current page')
     previous_page = serializers.IntegerField(help_text='Number of previous page (null if the current page is the last)')
     current_page = serializers.IntegerField(help_text='Number of current page')
     next_page = serializers.IntegerField(help_text='Number of next page (null if the current page is the first)')
+    next_cursor = serializers.CharField(required=False, allow_null=True,
+                                        help_text='Cursor of next page (null if the current page is the last)')
 
     def create(self, validated_data):
         pass
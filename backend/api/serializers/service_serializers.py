@@ -0,0 +1,28 @@
+from rest_framework import serializers
+
+from api.serializers.serializers import BaseResponseSerializer
+
+
+class ServiceStatsSerializer(serializers.Serializer):
+    """
+        Standard service stats schema (for all responses)
+    """
+    pid = serializers.IntegerField(help_text='Worker process id (counters are kept by every worker process)')
+    orientdb_pool = serializers.DictField(help_text='OrientDB connection pool usage and pool-wait counters')
+    ptn_tags = serializers.DictField(help_text='Patient tags cache counters')
+    directories = serializers.DictField(help_text='NSI directories cache counters')
+    orders_rules = serializers.DictField(help_text='Orders rules cache counters')
+
+
+class ServiceStatsDetailsSerializer(BaseResponseSerializer):
+    """
+        Service stats details schema
+    """
+    result = ServiceStatsSerializer(many=False)
+
+
+class ServiceCachesInvalidateSerializer(BaseResponseSerializer):
+    """
+        Invalidated caches schema
+    """
+    result = serializers.ListField(child=serializers.CharField(), help_text='Names of invalidated caches')
@@ -0,0 +1,181 @@
+import math
+import time
+from collections import OrderedDict
+from datetime import date
+
+from django.db import connection
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.request import Request
+from rest_framework.viewsets import ModelViewSet
+
+from api.serializers.order_serializers import F14v2DrillDownListSerializer, F14v2DrillDownSerializer
+from api.serializers.serializers import PaginationListSerializer
+from api.services.order_services.order_F14v2_services import get_grouped_rule_services
+from api.services.order_services.order_report_job_services import parse_report_period
+from api.utils.milestones_rollup_utils import ROLLUP_KIND_REFERRALS, ROLLUP_KIND_PROTOCOLS
+from backend.settings import PAGE_SIZE
+
+# Indicator of report cell -> kind of missing milestone
+DRILL_DOWN_INDICATORS = {
+    'referrals_count': ROLLUP_KIND_REFERRALS,
+    'protocols_count': ROLLUP_KIND_PROTOCOLS,
+}
+
+
+class GetF14v2DrillDownService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> F14v2DrillDownListSerializer:
+        """
+            Retrieve patients of F14 v.2 report cell which have no milestone of the cell indicator
+        """
+
+        s_all = time.perf_counter()
+
+        # Get query params
+        date_from, date_to = parse_report_period(request.query_params.get('date_from', None),
+                                                 request.query_params.get('date_to', None))
+
+        services_group = request.query_params.get('services_group', None)
+        if not services_group:
+            raise ValidationError(f"Request must have 'services_group' parameter", code='services_group')
+
+        indicator = request.query_params.get('indicator', None)
+        if indicator not in DRILL_DOWN_INDICATORS:
+            raise ValidationError(f"Value of indicator parameter ({indicator}) is not valid. "
+                                  f"See valid indicators: " + '; '.join(["'" + i + "'" for i in DRILL_DOWN_INDICATORS]),
+                                  code='indicator')
+
+        service_codes = frozenset(request.query_params.getlist('service_code', None))
+
+        mo_oid = request.query_params.get('mo_oid', None)
+
+        # Report row of the cell: rows are grouped by services, so services group may be shared by several rows
+        records = [
+            record for record in get_grouped_rule_services(date_from, date_to)
+            if record['services_group'] == services_group and (
+                not service_codes or frozenset(srv['service_code'] for srv in record['services']) == service_codes
+            )
+        ]
+        if len(records) > 1:
+            raise ValidationError(f"Services group='{services_group}' has {len(records)} report rows, "
+                                  f"'service_code' parameters must have codes of services of report row",
+                                  code='service_code')
+        record = records[0] if records else None
+        if record is None or not record['diagnoses'] or not record['codes']:
+            raise NotFound(f"Report row with services group='{services_group}' was not found", code='services_group')
+
+        query_body, query_params = get_drill_down_query(record, DRILL_DOWN_INDICATORS[indicator], date_from, date_to,
+                                                        mo_oid)
+
+        # Calculate count of queryset
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM (' + query_body + ') AS dd', query_params)
+            count = cursor.fetchone()[0]
+
+        # Add paginate to request
+        page = request.query_params.get('page', None)
+        if page is not None:
+            try:
+                page = int(page)
+                page = page if page >= 1 else 1
+                page = page if page <= math.ceil(count / PAGE_SIZE) else math.ceil(count / PAGE_SIZE)
+            except:
+                page = 1
+        else:
+            page = 1
+        page = page if page >= 1 else 1
+
+        query_body += """
+            ORDER BY
+                pdm.diagnosis_date, pdm.id
+            LIMIT """ + str(PAGE_SIZE) + """
+            OFFSET """ + str((page - 1) * PAGE_SIZE) + """
+        """
+
+        # Get queryset
+        with connection.cursor() as cursor:
+            cursor.execute(query_body, query_params)
+            rows = cursor.fetchall()
+
+        result = [
+            OrderedDict([
+                ('ptn_id', ptn_id),
+                ('ptn_code', ptn_code),
+                ('mo_oid', ptn_mo_oid),
+                ('diagnosis_code', diagnosis_mkb10),
+                ('diagnosis_date', diagnosis_date),
+            ])
+            for ptn_id, ptn_code, ptn_mo_oid, diagnosis_mkb10, diagnosis_date in rows
+        ]
+
+        drill_down_serializer = F14v2DrillDownSerializer(result, many=True)
+
+        # Formate pagination list's extra information schema
+        pagination_list_serializer = PaginationListSerializer(
+            data={
+                'count_items': count,
+                'items_per_page': PAGE_SIZE,
+                'start_item_index': 0 if count == 0 else (page - 1) * PAGE_SIZE + 1,
+                'end_item_index': (page - 1) * PAGE_SIZE + len(rows),
+                'previous_page': page - 1 if page > 1 else None,
+                'current_page': page,
+                'next_page': page + 1 if page < math.ceil(count / PAGE_SIZE) else None,
+            }
+        )
+        pagination_list_serializer.is_valid()
+
+        elapsed = time.perf_counter() - s_all
+
+        ret_msg = 'Ok' if count > 0 else 'Result set is empty'
+        ret_msg += f", processing time = {elapsed: 0.12f}"
+
+        # Formate response schema
+        return_serializer = F14v2DrillDownListSerializer(
+            data={
+                'retCode': 0,
+                'retMsg': ret_msg,
+                'result': drill_down_serializer.data,
+                'retExtInfo': pagination_list_serializer.data,
+                'retTime': int(time.time() * 10 ** 3)
+            }
+        )
+        return_serializer.is_valid()
+
+        return return_serializer
+
+
+def get_drill_down_query(record: dict, kind: str, date_from: date, date_to: date, mo_oid: str | None) -> (str, list):
+    """
+        Patient-diagnoses of report row in period without milestone of the kind for any code of the row.
+        Milestones are looked up in milestone facts by (patient_diagnosis, code, kind) index.
+    """
+    diagnoses = ','.join(["'" + dz['diagnosis_code'] + "'" for dz in record['diagnoses']])
+    codes = ','.join(["'" + code + "'" for code in record['codes']])
+
+    query_params = list()
+    query_body = """
+        SELECT
+            pdm.ptn_id, pdm.ptn_code, pdm.ptn_mo_oid, pdm.diagnosis_mkb10, pdm.diagnosis_date
+        FROM
+            api_patientdiagnosismilestones pdm
+        WHERE
+            pdm.diagnosis_mkb10 IN (""" + diagnoses + """) AND
+            pdm.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """' AND
+            NOT EXISTS (
+                SELECT
+                    1
+                FROM
+                    api_patientdiagnosismilestonefact f
+                WHERE
+                    f.patient_diagnosis_id = pdm.id AND
+                    f.code IN (""" + codes + """) AND
+                    f.kind = '""" + kind + """'
+            )
+    """
+    if mo_oid:
+        query_body += """    AND
+            pdm.ptn_mo_oid = %s
+    """
+        query_params.append(mo_oid)
+
+    return query_body, query_params
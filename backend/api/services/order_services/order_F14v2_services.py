@@ -1,6 +1,7 @@
 import time
 from collections import OrderedDict
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from typing import Callable
 
 from django.db import connection
 from django.utils import formats, translation
@@ -8,10 +9,25 @@ from rest_framework.exceptions import ValidationError
 from rest_framework.request import Request
 from rest_framework.viewsets import ModelViewSet
 
-from api.models.semd_models import OncorSettings
-from api.serializers.order_serializers import F14v2ListSerializer
+from api.serializers.order_serializers import F14v2ListSerializer, F14v2Serializer
 from api.serializers.serializers import PaginationListSerializer
-from api.utils.directories_utils import expand_diagnoses, expand_services, expand_mos
+from api.utils.directories_utils import expand_mos
+from api.utils.milestones_histogram_utils import get_codes_key, get_empty_histogram, get_histogram_statistics, \
+    MILESTONE_DAYS_BUCKETS, MILESTONE_DAYS_BUCKET_EXPRESSION
+from api.utils.milestones_rollup_utils import is_milestones_rollup_fresh, ROLLUP_KIND_PATIENTS, \
+    ROLLUP_KIND_REFERRALS, ROLLUP_KIND_PROTOCOLS
+from api.utils.orders_rules_utils import orders_rules_cache
+from api.utils.report_cache_utils import get_cached_report, get_common_periods, REPORT_TYPE_F14V2
+
+# Report rows are counted by one query for every chunk of this size
+INDICATORS_CHUNK_SIZE = 100
+# Granularities of report series (PostgreSQL date_trunc fields)
+GRANULARITIES = ('month', 'week')
+# Indicators of report rows: counted from cube (or rollup) and counted from milestone facts by services period
+INDICATORS = ('patients_count', 'referrals_count', 'protocols_count')
+SLA_INDICATORS = ('within_period_count', 'overdue_count')
+# Milestone kind -> name of days distribution
+DISTRIBUTIONS = OrderedDict([(ROLLUP_KIND_REFERRALS, 'referrals_days'), (ROLLUP_KIND_PROTOCOLS, 'protocols_days')])
 
 
 class GetF14v2Service:
@@ -65,247 +81,151 @@ class GetF14v2Service:
             raise ValidationError(f"Period is empty: date from ({date_from}) is greater than date to ({date_to})",
                                   code='period')
 
-        # Generate sceleton of report
-        result = get_grouped_rule_services(date_from, date_to)
-
-        # Get report indicators
-        result = get_report_indicators(result, date_from, date_to)
-
-        f14v2_list_serializer = view.get_serializer(result)
-
-        count = len(result)
-        items_per_page = count
-        start_item_index = 0 if count == 0 else 1
-        end_item_index = count
-        previous_page = None
-        current_page = 1
-        next_page = None
-
-        # Formate pagination list's extra information schema
-        pagination_list_serializer = PaginationListSerializer(
-            data={
-                'count_items': count,
-                'items_per_page': items_per_page,
-                'start_item_index': start_item_index,
-                'end_item_index': end_item_index,
-                'previous_page': previous_page,
-                'current_page': current_page,
-                'next_page': next_page,
-            }
-        )
-        pagination_list_serializer.is_valid()
-
-        elapsed = time.perf_counter() - s_all
-
-        ret_msg = 'Ok' if count > 0 else 'Result set is empty'
-        ret_msg += f", processing time = {elapsed: 0.12f}"
-
-        # Formate response schema
-        return_serializer = F14v2ListSerializer(
-            data={
-                'retCode': 0,
-                'retMsg': ret_msg,
-                'result': f14v2_list_serializer.data,
-                'retExtInfo': pagination_list_serializer.data,
-                'retTime': int(time.time() * 10 ** 3)
-            }
-        )
-        return_serializer.is_valid()
-
-        return return_serializer
+        granularity = request.query_params.get('granularity', None)
+        if granularity is not None and granularity not in GRANULARITIES:
+            raise ValidationError(f"Value of granularity parameter ({granularity}) is not valid. "
+                                  f"See valid granularities: " + '; '.join(["'" + g + "'" for g in GRANULARITIES]),
+                                  code='granularity')
+
+        is_distribution = str(request.query_params.get('distribution', '')).lower() in ('1', 'true', 'yes')
+
+        # Get report from cache or compute it
+        result = get_cached_report(REPORT_TYPE_F14V2, date_from, date_to,
+                                   lambda: get_f14v2_report(date_from, date_to, granularity=granularity,
+                                                            is_distribution=is_distribution),
+                                   variant=(granularity or '') + ('|distribution' if is_distribution else ''))
+
+        return get_f14v2_response(result, s_all)
+
+
+def get_f14v2_response(result: dict, s_all: float) -> F14v2ListSerializer:
+    """
+        Formate response schema of F14 v.2 report
+    """
+    f14v2_list_serializer = F14v2Serializer(result)
+
+    count = len(result)
+    items_per_page = count
+    start_item_index = 0 if count == 0 else 1
+    end_item_index = count
+    previous_page = None
+    current_page = 1
+    next_page = None
+
+    # Formate pagination list's extra information schema
+    pagination_list_serializer = PaginationListSerializer(
+        data={
+            'count_items': count,
+            'items_per_page': items_per_page,
+            'start_item_index': start_item_index,
+            'end_item_index': end_item_index,
+            'previous_page': previous_page,
+            'current_page': current_page,
+            'next_page': next_page,
+        }
+    )
+    pagination_list_serializer.is_valid()
+
+    elapsed = time.perf_counter() - s_all
+
+    ret_msg = 'Ok' if count > 0 else 'Result set is empty'
+    ret_msg += f", processing time = {elapsed: 0.12f}"
+
+    # Formate response schema
+    return_serializer = F14v2ListSerializer(
+        data={
+            'retCode': 0,
+            'retMsg': ret_msg,
+            'result': f14v2_list_serializer.data,
+            'retExtInfo': pagination_list_serializer.data,
+            'retTime': int(time.time() * 10 ** 3)
+        }
+    )
+    return_serializer.is_valid()
+
+    return return_serializer
+
+
+def get_f14v2_report(date_from: date, date_to: date, progress: Callable[[int, int], None] | None = None,
+                     granularity: str | None = None, is_distribution: bool = False) -> dict:
+    # Generate sceleton of report
+    result = get_grouped_rule_services(date_from, date_to)
+
+    # Get report indicators
+    return get_report_indicators(result, date_from, date_to, progress=progress, granularity=granularity,
+                                 is_distribution=is_distribution)
+
+
+def warm_up_report_cache(today: date | None = None):
+    """
+        Compute and cache report for common periods, it is called after loading of cube
+    """
+    for date_from, date_to in get_common_periods(today or datetime.now().date()):
+        s_all = time.perf_counter()
+        get_cached_report(REPORT_TYPE_F14V2, date_from, date_to, lambda: get_f14v2_report(date_from, date_to))
+        print(f"Report {REPORT_TYPE_F14V2} for period {date_from} - {date_to} is cached, "
+              f"processing time = {time.perf_counter() - s_all: 0.3f}")
 
 
 def get_grouped_rule_services(date_from: date, date_to: date) -> list:
     result = list()
 
-    def find_rule_service(services: set) -> int | None:
-        for result_idx, result_item in enumerate(result):
-            if result_item['services'] == services:
-                return result_idx
-        return None
-
-    # Get orders settings
     try:
-        orders = OncorSettings.objects.get(code='orders_rules').value
-    except:
-        orders = list()
-
-    if not orders:
-        return []
-
-    date_formats = formats.get_format("DATE_INPUT_FORMATS", lang=translation.get_language())
-    date_formats.append('%d.%m.%Y')
-
-    try:
-        for order in orders:
-            if not isinstance(order, dict):
-                continue
-
-            # Get order parameters
-            order_code = order.get('code', None)
-            order_name = order.get('наименование', None)
-            order_author = order.get('автор', None)
-            order_valid = order.get('действителен', None)
-            if order_valid and isinstance(order_valid, dict):
-                order_valid_from = order_valid.get('от', None)
-                order_valid_to = order_valid.get('до', None)
-            else:
-                order_valid_from = None
-                order_valid_to = None
-
-            # Check type of values of date parameters
-            if order_valid_from:
-                is_date_error = True
-                for date_format in date_formats:
-                    try:
-                        order_valid_from = datetime.strptime(order_valid_from, date_format).date()
-                        is_date_error = False
-                        break
-                    except:
-                        pass
-                if is_date_error:
-                    order_valid_from = None
-
-            if order_valid_to:
-                is_date_error = True
-                for date_format in date_formats:
-                    try:
-                        order_valid_to = datetime.strptime(order_valid_to, date_format).date()
-                        is_date_error = False
-                        break
-                    except:
-                        pass
-                if is_date_error:
-                    order_valid_to = None
-
-            if not order_valid_from or not isinstance(order_valid_from, date):
-                continue
-
-            # Check order valid dates with report period
-            if order_valid_from > date_to:
-                continue
-            if order_valid_to and isinstance(order_valid_to, date) and order_valid_to < date_from:
+        # Group items of orders valid in report period by services
+        groups = dict()
+        for item in orders_rules_cache.get().valid_in_period(date_from, date_to):
+            if item.code is None:
                 continue
-
-            # Get order rules list
-            rules = order.get('правила', None)
-            if not rules or not isinstance(rules, list):
-                break
-
-            for rule in rules:
-                if not isinstance(rule, dict):
-                    continue
-
-                # Get rule parameters
-                rule_code = rule.get('code', None)
-                rule_name = rule.get('наименование', None)
-                rule_text = rule.get('текст', None)
-
-                # Get diagnoses templates string
-                rule_diagnoses = rule.get('диагнозы', None)
-                if not rule_diagnoses or not isinstance(rule_diagnoses, str):
-                    continue
-
-                # Get expanded verified by dictionary list of diagnoses
-                rule_expanded_diagnoses = expand_diagnoses(rule_diagnoses)
-
-                # Get rule mandatory services list
-                rule_mandatory_services = rule.get('обязательныеУслуги', None)
-                if not rule_mandatory_services or not isinstance(rule_mandatory_services, list):
-                    continue
-
-                for rule_mandatory_service in rule_mandatory_services:
-                    if not rule_mandatory_service or not isinstance(rule_mandatory_service, dict):
-                        continue
-
-                    # Get mandatory services item parameters
-                    rule_services_code = rule_mandatory_service.get('code', None)
-                    rule_services_group = rule_mandatory_service.get('группа', None)
-                    rule_services_period = rule_mandatory_service.get('срокРабочихДней', None)
-                    rule_services_name = rule_mandatory_service.get('наименование', None)
-
-                    # Get mandatory services item services list
-                    rule_services = rule_mandatory_service.get('услуги', None)
-                    if not rule_services or not isinstance(rule_services, list):
-                        continue
-
-                    # Get verified by dictionary list of services
-                    rule_expand_services = expand_services(rule_services)
-
-                    if not rule_expand_services:
-                        continue
-
-                    # Try to get index of existing result list item with the same list of services
-                    idx = find_rule_service(rule_expand_services)
-                    if idx is None:
-                        result.append(OrderedDict([
-                            ('services_group', rule_services_group),
-                            ('services_period', rule_services_period),
-                            ('services_name', rule_services_name),
-                            ('patients_count', OrderedDict([('all', 0)])),
-                            ('referrals_count', OrderedDict([('all', 0)])),
-                            ('protocols_count', OrderedDict([('all', 0)])),
-                            ('services', rule_expand_services),
-                            ('diagnoses', rule_expanded_diagnoses),
-                            ('codes', {order_code + '|' + rule_code + '|' + rule_services_code}),
-                            ('order_rules', [
-                                OrderedDict([
-                                    ('order_code', order_code),
-                                    ('order_name', order_name),
-                                    ('order_valid_from', order_valid_from),
-                                    ('order_valid_to', order_valid_to),
-                                    ('order_author', order_author),
-                                    ('rule_code', rule_code),
-                                    ('rule_name', rule_name),
-                                    ('rule_text', rule_text),
-                                    ('rule_diagnoses', rule_diagnoses),
-                                    ('rule_services_code', rule_services_code),
-                                ])
-                            ]),
-                            ('order_valid_from', order_valid_from),
-                        ]))
-                    else:
-                        if result[idx]['order_valid_from'] < order_valid_from:
-                            result[idx]['order_valid_from'] = order_valid_from
-                            result[idx]['services_group'] = order_valid_from
-                            result[idx]['services_period'] = order_valid_from
-                            result[idx]['services_name'] = order_valid_from
-                        result[idx]['diagnoses'] = result[idx]['diagnoses'].union(rule_expanded_diagnoses)
-                        result[idx]['codes'] = \
-                            result[idx]['codes'].union({order_code + '|' + rule_code + '|' + rule_services_code})
-                        result[idx]['order_rules'].append(
-                            OrderedDict([
-                                ('order_code', order_code),
-                                ('order_name', order_name),
-                                ('order_valid_from', order_valid_from),
-                                ('order_valid_to', order_valid_to),
-                                ('order_author', order_author),
-                                ('rule_code', rule_code),
-                                ('rule_name', rule_name),
-                                ('rule_text', rule_text),
-                                ('rule_diagnoses', rule_diagnoses),
-                                ('rule_services_code', rule_services_code),
-                            ])
-                        )
-        for item in result:
-            item['services'] = sorted(item['services'], key=lambda x: x[0])
-            item['services'] = [
-                OrderedDict([
-                    ('service_code', srv[0]),
-                    ('service_name', srv[1]),
-                ])
-                for srv in item['services']
-            ]
-            item['diagnoses'] = sorted(item['diagnoses'], key=lambda x: x[0])
-            item['diagnoses'] = [
-                OrderedDict([
-                    ('diagnosis_code', dz[0]),
-                    ('diagnosis_name', dz[1]),
-                ])
-                for dz in item['diagnoses']
-            ]
-            item['codes'] = list(item['codes'])
-            item.pop('order_valid_from')
+            groups.setdefault(item.service_codes, list()).append(item)
+
+        for items in groups.values():
+            # Services group parameters are taken from the latest order
+            latest = items[0]
+            for item in items:
+                if item.order_valid_from > latest.order_valid_from:
+                    latest = item
+            diagnoses = frozenset().union(*(item.diagnoses for item in items))
+
+            result.append(OrderedDict([
+                ('services_group', latest.services_group),
+                ('services_period', latest.services_period),
+                ('services_name', latest.services_name),
+                ('patients_count', OrderedDict([('all', 0)])),
+                ('referrals_count', OrderedDict([('all', 0)])),
+                ('protocols_count', OrderedDict([('all', 0)])),
+                ('within_period_count', OrderedDict([('all', 0)])),
+                ('overdue_count', OrderedDict([('all', 0)])),
+                ('services', [
+                    OrderedDict([
+                        ('service_code', srv[0]),
+                        ('service_name', srv[1]),
+                    ])
+                    for srv in sorted(latest.services, key=lambda x: x[0])
+                ]),
+                ('diagnoses', [
+                    OrderedDict([
+                        ('diagnosis_code', dz[0]),
+                        ('diagnosis_name', dz[1]),
+                    ])
+                    for dz in sorted(diagnoses, key=lambda x: x[0])
+                ]),
+                ('codes', list(dict.fromkeys(item.code for item in items))),
+                ('order_rules', [
+                    OrderedDict([
+                        ('order_code', item.order_code),
+                        ('order_name', item.order_name),
+                        ('order_valid_from', item.order_valid_from),
+                        ('order_valid_to', item.order_valid_to),
+                        ('order_author', item.order_author),
+                        ('rule_code', item.rule_code),
+                        ('rule_name', item.rule_name),
+                        ('rule_text', item.rule_text),
+                        ('rule_diagnoses', item.rule_diagnoses),
+                        ('rule_services_code', item.rule_services_code),
+                    ])
+                    for item in items
+                ]),
+            ]))
 
         result = sorted(result, key=lambda x: x['services_group'])
 
@@ -315,85 +235,402 @@ def get_grouped_rule_services(date_from: date, date_to: date) -> list:
     return result
 
 
-def get_report_indicators(result: list, date_from: date, date_to: date) -> dict:
+def get_report_periods(date_from: date, date_to: date, granularity: str) -> list:
+    """
+        Starts of series periods covering report period (the same as date_trunc of PostgreSQL)
+    """
+    periods = list()
+    if granularity == 'week':
+        period = date_from - timedelta(days=date_from.weekday())
+        while period <= date_to:
+            periods.append(period)
+            period += timedelta(days=7)
+    else:
+        period = date_from.replace(day=1)
+        while period <= date_to:
+            periods.append(period)
+            period = (period + timedelta(days=32)).replace(day=1)
+    return periods
+
+
+def get_period_expression(column: str, granularity: str | None) -> str:
+    if granularity is None:
+        return 'NULL::date'
+    return "date_trunc('" + granularity + "', " + column + ")::date"
+
+
+def get_report_indicators(result: list, date_from: date, date_to: date, query_indicators=None,
+                          progress: Callable[[int, int], None] | None = None,
+                          granularity: str | None = None, query_sla=None, is_distribution: bool = False) -> dict:
+    """
+        Counts of report rows by MO. If granularity is set, rows get also series of counts by MO
+        for every period of report periods, all series are got by the same grouped pass over cube.
+        If is_distribution is set, rows get also distributions of referrals and protocols days by MO
+        (percentiles and histogram), they are got by merging of daily histograms.
+    """
     mo_oids = set()
-
-    for record in result:
-        diagnoses = ','.join(["'" + dz['diagnosis_code'] + "'" for dz in record['diagnoses']])
-
-        # Get patients count
-        query_body = """
-            SELECT
-                ptn_mo_oid, COUNT(*) AS patient_count
-            FROM
-                api_patientdiagnosismilestones
-            WHERE
-                diagnosis_mkb10 IN (""" + diagnoses + """) AND
-                diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """"' AND '""" + date_to.strftime('%Y-%m-%d') + """'
-            GROUP BY
-                ptn_mo_oid
-        """
-        with connection.cursor() as cursor:
-            cursor.execute(query_body)
-            patients_counts = cursor.fetchall()
-
-        if patients_counts:
-            for patients_count in patients_counts:
-                mo_oids = mo_oids.union({str(patients_count[0])})
-                record['patients_count']['all'] += patients_count[1]
-                record['patients_count'].setdefault(str(patients_count[0]), patients_count[1])
-
-        # Get referrals count
-        referrals_codes = ','.join(["'" + code + ":нап'" for code in record['codes']])
-        query_body = """
-            SELECT
-                ptn_mo_oid, COUNT(*) AS patient_count
-            FROM
-                api_patientdiagnosismilestones
-            WHERE
-                diagnosis_mkb10 IN (""" + diagnoses + """) AND
-                diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """"' AND '""" + date_to.strftime('%Y-%m-%d') + """' AND
-                diagnosis_milestones ?| array[""" + referrals_codes + """]
-            GROUP BY
-                ptn_mo_oid
-            """
-        with connection.cursor() as cursor:
-            cursor.execute(query_body)
-            referrals_counts = cursor.fetchall()
-
-        if referrals_counts:
-            for referrals_count in referrals_counts:
-                mo_oids = mo_oids.union({str(referrals_count[0])})
-                record['referrals_count']['all'] += referrals_count[1]
-                record['referrals_count'].setdefault(str(referrals_count[0]), referrals_count[1])
-
-        # Get protocols count
-        protocols_codes = ','.join(["'" + code + ":исп'" for code in record['codes']])
-        query_body = """
-            SELECT
-                ptn_mo_oid, COUNT(*) AS patient_count
-            FROM
-                api_patientdiagnosismilestones
-            WHERE
-                diagnosis_mkb10 IN (""" + diagnoses + """) AND
-                diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """"' AND '""" + date_to.strftime('%Y-%m-%d') + """' AND
-                diagnosis_milestones ?| array[""" + protocols_codes + """]
-            GROUP BY
-                ptn_mo_oid
-            """
-        with connection.cursor() as cursor:
-            cursor.execute(query_body)
-            protocols_counts = cursor.fetchall()
-
-        if protocols_counts:
-            for protocols_count in protocols_counts:
-                mo_oids = mo_oids.union({str(protocols_count[0])})
-                record['protocols_count']['all'] += protocols_count[1]
-                record['protocols_count'].setdefault(str(protocols_count[0]), protocols_count[1])
+    periods = get_report_periods(date_from, date_to, granularity) if granularity is not None else list()
+    period_indexes = {period: idx for idx, period in enumerate(periods)}
+    if granularity is not None:
+        for record in result:
+            record['series'] = OrderedDict([('all', get_empty_series(len(periods)))])
+
+    # Counts are got from daily rollup, from Patient-Diagnosis cube only if rollup is stale
+    if query_indicators is None:
+        query_indicators = query_rollup_indicators if is_milestones_rollup_fresh() else query_report_indicators
+    if query_sla is None:
+        query_sla = query_sla_indicators
+
+    # Counts of all report rows are got by one query (and one query of SLA counts) for every chunk of rows
+    for k in range(0, len(result), INDICATORS_CHUNK_SIZE):
+        records = result[k:k + INDICATORS_CHUNK_SIZE]
+        for indicators, rows in (
+            (INDICATORS, query_indicators(records, date_from, date_to, granularity=granularity)),
+            (SLA_INDICATORS, query_sla(records, date_from, date_to, granularity=granularity)),
+        ):
+            for row_idx, period, mo_oid, *counts in rows:
+                record = records[row_idx]
+                mo_oids = mo_oids.union({str(mo_oid)})
+                for indicator, count in zip(indicators, counts):
+                    if count:
+                        record[indicator]['all'] += count
+                        record[indicator][str(mo_oid)] = record[indicator].get(str(mo_oid), 0) + count
+                        if granularity is not None:
+                            period_idx = period_indexes[period]
+                            record['series']['all'][indicator][period_idx] += count
+                            record['series'].setdefault(str(mo_oid), get_empty_series(len(periods))) \
+                                [indicator][period_idx] += count
+
+        if is_distribution:
+            add_days_distributions(records, query_days_histograms(records, date_from, date_to))
+
+        if progress is not None:
+            progress(min(k + INDICATORS_CHUNK_SIZE, len(result)), len(result))
 
     result = OrderedDict([
         ('milestones', result),
         ('medical_organizations', expand_mos(mo_oids)),
     ])
+    if granularity is not None:
+        result['granularity'] = granularity
+        result['periods'] = periods
+    if is_distribution:
+        result['days_buckets'] = list(MILESTONE_DAYS_BUCKETS)
 
     return result
+
+
+def add_days_distributions(records: list, histograms: list):
+    """
+        Merge histograms (row index, mo_oid, kind, bucket, count) of rows and add days distributions to rows
+    """
+    merged = [OrderedDict((kind, OrderedDict([('all', get_empty_histogram())])) for kind in DISTRIBUTIONS)
+              for _ in records]
+    for row_idx, mo_oid, kind, bucket, count in histograms:
+        merged[row_idx][kind]['all'][bucket] += count
+        merged[row_idx][kind].setdefault(str(mo_oid), get_empty_histogram())[bucket] += count
+
+    for record, row_histograms in zip(records, merged):
+        for kind, name in DISTRIBUTIONS.items():
+            record[name] = OrderedDict([
+                (mo_oid, get_histogram_statistics(histogram))
+                for mo_oid, histogram in row_histograms[kind].items()
+            ])
+
+
+def get_empty_series(periods_count: int) -> OrderedDict:
+    return OrderedDict([(indicator, [0] * periods_count) for indicator in INDICATORS + SLA_INDICATORS])
+
+
+def quoted_array(values) -> str:
+    return 'ARRAY[' + ','.join(["'" + value + "'" for value in values]) + ']::text[]'
+
+
+def get_report_diagnoses_values(records: list) -> str:
+    # Diagnoses of row are (code, name) pairs of all versions of directory, so code may be repeated,
+    # repeated (row_idx, code) would multiply counts of joined cube rows
+    return ','.join([
+        '(' + str(row_idx) + ", '" + diagnosis_code + "')"
+        for row_idx, record in enumerate(records)
+        for diagnosis_code in dict.fromkeys(dz['diagnosis_code'] for dz in record['diagnoses'])
+    ])
+
+
+def query_report_indicators(records: list, date_from: date, date_to: date, granularity: str | None = None) -> list:
+    """
+        Patients, referrals and protocols counts of report rows by MO:
+        (row index, period, mo_oid, patients, referrals, protocols), period is None without granularity.
+        Report rows are joined to cube as VALUES lists, counts are got by conditional aggregation.
+    """
+    report_rows = ','.join([
+        '(' + str(row_idx) + ', ' +
+        quoted_array([code + ':нап' for code in record['codes']]) + ', ' +
+        quoted_array([code + ':исп' for code in record['codes']]) + ')'
+        for row_idx, record in enumerate(records)
+    ])
+    report_diagnoses = get_report_diagnoses_values(records)
+    if not report_diagnoses:
+        return []
+
+    query_body = """
+        WITH
+            report_rows (row_idx, referrals_codes, protocols_codes) AS (
+                VALUES """ + report_rows + """
+            ),
+            report_diagnoses (row_idx, diagnosis_mkb10) AS (
+                VALUES """ + report_diagnoses + """
+            )
+        SELECT
+            rd.row_idx,
+            """ + get_period_expression('pdm.diagnosis_date', granularity) + """ AS period,
+            pdm.ptn_mo_oid,
+            COUNT(*) AS patients_count,
+            COUNT(*) FILTER (WHERE pdm.diagnosis_milestones ?| rr.referrals_codes) AS referrals_count,
+            COUNT(*) FILTER (WHERE pdm.diagnosis_milestones ?| rr.protocols_codes) AS protocols_count
+        FROM
+            api_patientdiagnosismilestones pdm
+            JOIN report_diagnoses rd ON rd.diagnosis_mkb10 = pdm.diagnosis_mkb10
+            JOIN report_rows rr ON rr.row_idx = rd.row_idx
+        WHERE
+            pdm.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """'
+        GROUP BY
+            rd.row_idx, period, pdm.ptn_mo_oid
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def query_rollup_indicators(records: list, date_from: date, date_to: date, granularity: str | None = None) -> list:
+    """
+        The same counts as query_report_indicators, but summed over daily rollup of Patient-Diagnosis cube.
+        Diagnoses of row are matched by semi-join, so every rollup row is summed once per report row.
+    """
+    report_rows = ','.join([
+        '(' + str(row_idx) + ', ' + quoted_array(record['codes']) + ')'
+        for row_idx, record in enumerate(records)
+    ])
+    report_diagnoses = get_report_diagnoses_values(records)
+    if not report_diagnoses:
+        return []
+
+    query_body = """
+        WITH
+            report_rows (row_idx, codes) AS (
+                VALUES """ + report_rows + """
+            ),
+            report_diagnoses (row_idx, diagnosis_mkb10) AS (
+                VALUES """ + report_diagnoses + """
+            )
+        SELECT
+            rr.row_idx,
+            """ + get_period_expression('r.diagnosis_date', granularity) + """ AS period,
+            r.ptn_mo_oid,
+            COALESCE(SUM(r.patients_count) FILTER (WHERE r.kind = '""" + ROLLUP_KIND_PATIENTS + """'), 0)
+                AS patients_count,
+            COALESCE(SUM(r.patients_count) FILTER (
+                WHERE r.kind = '""" + ROLLUP_KIND_REFERRALS + """' AND r.milestone_codes::text[] && rr.codes), 0)
+                AS referrals_count,
+            COALESCE(SUM(r.patients_count) FILTER (
+                WHERE r.kind = '""" + ROLLUP_KIND_PROTOCOLS + """' AND r.milestone_codes::text[] && rr.codes), 0)
+                AS protocols_count
+        FROM
+            api_patientdiagnosismilestonesrollup r
+            JOIN report_rows rr ON EXISTS (
+                SELECT 1 FROM report_diagnoses rd WHERE rd.row_idx = rr.row_idx AND rd.diagnosis_mkb10 = r.diagnosis_mkb10
+            )
+        WHERE
+            r.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """'
+        GROUP BY
+            rr.row_idx, period, r.ptn_mo_oid
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def get_services_period(record: dict) -> int | None:
+    try:
+        return int(record.get('services_period', None))
+    except (TypeError, ValueError):
+        return None
+
+
+def query_sla_indicators(records: list, date_from: date, date_to: date, granularity: str | None = None) -> list:
+    """
+        Counts of patients whose first protocol of report row was made within services period (working days)
+        and after it by MO: (row index, period, mo_oid, within period, overdue).
+        Working days are computed by ETL for every milestone fact, so counts are got by comparison of integers.
+    """
+    report_rows = ','.join([
+        '(' + str(row_idx) + ', ' + quoted_array(record['codes']) + ', ' + str(get_services_period(record)) + ')'
+        for row_idx, record in enumerate(records)
+        if get_services_period(record) is not None and record['codes']
+    ])
+    report_diagnoses = get_report_diagnoses_values(records)
+    if not report_rows or not report_diagnoses:
+        return []
+
+    query_body = """
+        WITH
+            report_rows (row_idx, codes, services_period) AS (
+                VALUES """ + report_rows + """
+            ),
+            report_diagnoses (row_idx, diagnosis_mkb10) AS (
+                VALUES """ + report_diagnoses + """
+            ),
+            first_protocols AS (
+                SELECT
+                    rd.row_idx,
+                    """ + get_period_expression('pdm.diagnosis_date', granularity) + """ AS period,
+                    pdm.ptn_mo_oid,
+                    rr.services_period,
+                    MIN(f.working_days) AS working_days
+                FROM
+                    api_patientdiagnosismilestones pdm
+                    JOIN report_diagnoses rd ON rd.diagnosis_mkb10 = pdm.diagnosis_mkb10
+                    JOIN report_rows rr ON rr.row_idx = rd.row_idx
+                    JOIN api_patientdiagnosismilestonefact f ON
+                        f.patient_diagnosis_id = pdm.id AND
+                        f.code = ANY(rr.codes) AND
+                        f.kind = '""" + ROLLUP_KIND_PROTOCOLS + """'
+                WHERE
+                    pdm.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """' AND
+                    f.working_days IS NOT NULL
+                GROUP BY
+                    rd.row_idx, period, pdm.ptn_mo_oid, rr.services_period, pdm.id
+            )
+        SELECT
+            row_idx,
+            period,
+            ptn_mo_oid,
+            COUNT(*) FILTER (WHERE working_days <= services_period) AS within_period_count,
+            COUNT(*) FILTER (WHERE working_days > services_period) AS overdue_count
+        FROM
+            first_protocols
+        GROUP BY
+            row_idx, period, ptn_mo_oid
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def query_days_histograms(records: list, date_from: date, date_to: date) -> list:
+    """
+        Histograms of referrals and protocols days of report rows by MO: (row index, mo_oid, kind, bucket, count).
+        Patient-diagnosis is counted once by its first milestone of row codes. Daily histograms of row services
+        group are summed by buckets, raw milestones are not sorted. Rows without daily histograms (codes of orders
+        valid in report period differ from codes of all orders of group) are bucketed from milestone facts.
+    """
+    codes_keys = {row_idx: get_codes_key(record['codes']) for row_idx, record in enumerate(records) if record['codes']}
+    if not codes_keys:
+        return []
+
+    built_codes_keys = query_histograms_codes_keys(set(codes_keys.values()))
+    return query_merged_days_histograms(
+        {row_idx: codes_key for row_idx, codes_key in codes_keys.items() if codes_key in built_codes_keys},
+        date_from, date_to
+    ) + query_facts_days_histograms(
+        {row_idx: records[row_idx]['codes'] for row_idx, codes_key in codes_keys.items()
+         if codes_key not in built_codes_keys},
+        date_from, date_to
+    )
+
+
+def query_histograms_codes_keys(codes_keys: set) -> set:
+    """
+        Keys of services groups which have daily histograms
+    """
+    query_body = """
+        SELECT
+            v.codes_key
+        FROM
+            (VALUES """ + ','.join(["('" + codes_key + "')" for codes_key in codes_keys]) + """) AS v (codes_key)
+        WHERE
+            EXISTS (SELECT 1 FROM api_patientdiagnosismilestoneshistogram h WHERE h.codes_key = v.codes_key)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def query_merged_days_histograms(codes_keys: dict, date_from: date, date_to: date) -> list:
+    """
+        Daily histograms of services groups of rows (row index -> codes key) summed by buckets
+    """
+    if not codes_keys:
+        return []
+
+    query_body = """
+        WITH
+            report_rows (row_idx, codes_key) AS (
+                VALUES """ + ','.join([
+                    '(' + str(row_idx) + ", '" + codes_key + "')" for row_idx, codes_key in codes_keys.items()
+                ]) + """
+            )
+        SELECT
+            rr.row_idx,
+            h.ptn_mo_oid,
+            h.kind,
+            h.bucket,
+            SUM(h.patients_count) AS patients_count
+        FROM
+            api_patientdiagnosismilestoneshistogram h
+            JOIN report_rows rr ON rr.codes_key = h.codes_key
+        WHERE
+            h.kind IN (""" + ','.join(["'" + kind + "'" for kind in DISTRIBUTIONS]) + """) AND
+            h.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """'
+        GROUP BY
+            rr.row_idx, h.ptn_mo_oid, h.kind, h.bucket
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def query_facts_days_histograms(codes: dict, date_from: date, date_to: date) -> list:
+    """
+        Histograms of rows (row index -> codes) bucketed from the first milestone facts of row codes
+    """
+    if not codes:
+        return []
+
+    query_body = """
+        WITH
+            report_rows (row_idx, codes) AS (
+                VALUES """ + ','.join([
+                    '(' + str(row_idx) + ', ' + quoted_array(row_codes) + ')' for row_idx, row_codes in codes.items()
+                ]) + """
+            ),
+            first_milestones AS (
+                SELECT
+                    rr.row_idx,
+                    pdm.ptn_mo_oid,
+                    f.kind,
+                    MIN(f.days) AS days
+                FROM
+                    api_patientdiagnosismilestones pdm
+                    JOIN api_patientdiagnosismilestonefact f ON f.patient_diagnosis_id = pdm.id
+                    JOIN report_rows rr ON f.code = ANY(rr.codes)
+                WHERE
+                    f.kind IN (""" + ','.join(["'" + kind + "'" for kind in DISTRIBUTIONS]) + """) AND
+                    f.days >= 0 AND
+                    pdm.diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """'
+                GROUP BY
+                    rr.row_idx, pdm.ptn_mo_oid, f.kind, pdm.id
+            )
+        SELECT
+            row_idx,
+            ptn_mo_oid,
+            kind,
+            """ + MILESTONE_DAYS_BUCKET_EXPRESSION.format(days='days') + """ AS bucket,
+            COUNT(*) AS patients_count
+        FROM
+            first_milestones
+        GROUP BY
+            1, 2, 3, 4
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
@@ -0,0 +1,237 @@
+import time
+import uuid
+from datetime import datetime, date, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import formats, timezone, translation
+from rest_framework.exceptions import ValidationError, ParseError, NotFound
+from rest_framework.request import Request
+from rest_framework.viewsets import ModelViewSet
+
+from api.models.semd_models import ReportJob
+from api.serializers.order_serializers import ReportJobSerializer, ReportJobDetailsSerializer
+from api.services.order_services.order_F14_services import get_f14_report, get_f14_response
+from api.services.order_services.order_F14v2_services import get_f14v2_report, get_f14v2_response
+from api.utils.report_cache_utils import get_cached_report, REPORT_TYPE_F14, REPORT_TYPE_F14V2
+from api.utils.report_jobs_utils import report_job_pool
+from backend.settings import REPORT_JOBS_STALE_TIMEOUT
+
+# Report type -> (compute report, formate response schema, count of report rows)
+REPORTS = {
+    REPORT_TYPE_F14: (get_f14_report, get_f14_response, lambda result: len(result)),
+    REPORT_TYPE_F14V2: (get_f14v2_report, get_f14v2_response, lambda result: len(result['milestones'])),
+}
+
+
+class CreateReportJobService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> ReportJobDetailsSerializer:
+        """
+            Create report job, report is computed by pool of workers
+        """
+
+        # Check input data
+        report_type = request.data.get('report_type', None)
+        if report_type not in REPORTS:
+            raise ValidationError(f"Value of report type parameter ({report_type}) is not valid. "
+                                  f"See valid report types: " + '; '.join(["'" + r + "'" for r in REPORTS]),
+                                  code='report_type')
+
+        date_from, date_to = parse_report_period(request.data.get('date_from', None),
+                                                 request.data.get('date_to', None))
+
+        job = ReportJob.objects.create(report_type=report_type, date_from=date_from, date_to=date_to)
+
+        # Any free worker takes the oldest queued job
+        report_job_pool.submit(run_queued_report_jobs)
+
+        return get_report_job_response(job)
+
+
+class GetReportJobService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> ReportJobDetailsSerializer:
+        """
+            Retrieve status and progress of report job
+        """
+        job_id = kwargs.get("pk", None)
+
+        # Jobs of killed processes are re-queued, queued jobs are taken by free worker of this process
+        requeue_stale_report_jobs()
+        job = get_report_job(job_id, is_result=False)
+        if job.status == ReportJob.QUEUED:
+            report_job_pool.submit(run_queued_report_jobs)
+
+        return get_report_job_response(job)
+
+
+class GetReportJobResultService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs):
+        """
+            Retrieve result of report job (the same schema as synchronous report has)
+        """
+        s_all = time.perf_counter()
+
+        job = get_report_job(kwargs.get("pk", None), is_result=True)
+        if job.status != ReportJob.DONE:
+            raise ParseError(f"Report job with id='{job.id}' is {job.status}"
+                             + (f": {job.error}" if job.status == ReportJob.FAILED else ''), code='status')
+
+        get_response = REPORTS[job.report_type][1]
+        return get_response(job.result, s_all)
+
+
+def get_report_job(job_id: str | None, is_result: bool) -> ReportJob:
+    if not job_id:
+        raise ParseError(f"Request must have 'id' parameter", code='id')
+    try:
+        job_id = uuid.UUID(str(job_id))
+    except ValueError:
+        raise NotFound(f"Report job with id='{job_id}' was not found", code='id')
+
+    jobs = ReportJob.objects.filter(id=job_id)
+    if not is_result:
+        jobs = jobs.defer('result')
+    job = jobs.first()
+    if job is None:
+        raise NotFound(f"Report job with id='{job_id}' was not found", code='id')
+
+    return job
+
+
+def get_report_job_response(job: ReportJob) -> ReportJobDetailsSerializer:
+    report_job_serializer = ReportJobSerializer(
+        data={
+            'job_id': job.id,
+            'report_type': job.report_type,
+            'date_from': job.date_from,
+            'date_to': job.date_to,
+            'status': job.status,
+            'rows_done': job.rows_done,
+            'rows_total': job.rows_total,
+            'error': job.error,
+            'elapsed': job.elapsed,
+            'created_at': job.created_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+    )
+    report_job_serializer.is_valid()
+
+    # Formate response schema
+    return_serializer = ReportJobDetailsSerializer(
+        data={
+            'retCode': 0,
+            'retMsg': 'Ok',
+            'result': report_job_serializer.data,
+            'retExtInfo': '',
+            'retTime': int(time.time() * 10 ** 3)
+        }
+    )
+    return_serializer.is_valid()
+
+    return return_serializer
+
+
+def parse_report_period(date_from_str: str | None, date_to_str: str | None) -> (date, date):
+    if not date_from_str or not date_to_str:
+        raise ValidationError(f"Period parameters must have filled", code='period')
+
+    date_formats = list(formats.get_format("DATE_INPUT_FORMATS", lang=translation.get_language()))
+    date_formats.append('%d.%m.%Y')
+
+    period = list()
+    for code, date_str in (('date_from', date_from_str), ('date_to', date_to_str)):
+        for date_format in date_formats:
+            try:
+                period.append(datetime.strptime(str(date_str), date_format).date())
+                break
+            except ValueError:
+                pass
+        else:
+            raise ValidationError(f"Value of period {code.replace('_', ' ')} parameter ({date_str}) is not valid. "
+                                  f"See valid date formats: " + '; '.join(["'" + f + "'" for f in date_formats]),
+                                  code=code)
+
+    date_from, date_to = period
+    if date_to < date_from:
+        raise ValidationError(f"Period is empty: date from ({date_from}) is greater than date to ({date_to})",
+                              code='period')
+
+    return date_from, date_to
+
+
+def run_queued_report_jobs():
+    """
+        Compute queued jobs while there are ones (stale running jobs are re-queued before every claim)
+    """
+    while True:
+        requeue_stale_report_jobs()
+        job = claim_report_job()
+        if job is None:
+            return
+        run_report_job(job)
+
+
+def requeue_stale_report_jobs() -> int:
+    """
+        Re-queue running jobs without heartbeat for REPORT_JOBS_STALE_TIMEOUT (their processes were stopped).
+        Returns count of re-queued jobs.
+    """
+    stale_at = timezone.now() - timedelta(seconds=REPORT_JOBS_STALE_TIMEOUT)
+    return ReportJob.objects.filter(
+        Q(heartbeat_at__lt=stale_at) | Q(heartbeat_at__isnull=True, started_at__lt=stale_at),
+        status=ReportJob.RUNNING,
+    ).update(status=ReportJob.QUEUED, worker=None, started_at=None, heartbeat_at=None, rows_done=0, rows_total=0)
+
+
+def claim_report_job() -> ReportJob | None:
+    with transaction.atomic():
+        job = ReportJob.objects.select_for_update(skip_locked=True).defer('result') \
+            .filter(status=ReportJob.QUEUED).order_by('created_at').first()
+        if job is None:
+            return None
+        job.status = ReportJob.RUNNING
+        job.worker = report_job_pool.worker_name
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'worker', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def run_report_job(job: ReportJob):
+    get_report, _, count_rows = REPORTS[job.report_type]
+
+    # Job re-queued as stale and claimed again is updated only by its new run
+    claimed_jobs = ReportJob.objects.filter(id=job.id, status=ReportJob.RUNNING, worker=job.worker,
+                                            started_at=job.started_at)
+
+    def progress(rows_done: int, rows_total: int):
+        claimed_jobs.update(rows_done=rows_done, rows_total=rows_total)
+
+    report_job_pool.start_job(job.id)
+    s_all = time.perf_counter()
+    try:
+        result = get_cached_report(job.report_type, job.date_from, job.date_to,
+                                   lambda: get_report(job.date_from, job.date_to, progress))
+    except Exception as e:
+        claimed_jobs.update(
+            status=ReportJob.FAILED,
+            error=str(e),
+            elapsed=time.perf_counter() - s_all,
+            finished_at=timezone.now(),
+        )
+        return
+    finally:
+        report_job_pool.finish_job(job.id)
+
+    rows = count_rows(result)
+    claimed_jobs.update(
+        status=ReportJob.DONE,
+        rows_done=rows,
+        rows_total=rows,
+        result=result,
+        elapsed=time.perf_counter() - s_all,
+        finished_at=timezone.now(),
+    )
@@ -1,22 +1,29 @@
+import hashlib
 import math
 import time
 from collections import OrderedDict
-from datetime import datetime, date
-from html import unescape
+from datetime import date
 from typing import List
 
-import xmltodict
-from django.db import connections
+from django.core.cache import cache
+from django.db.models import Q
 from rest_framework.exceptions import ParseError, NotFound
 from rest_framework.request import Request
 from rest_framework.viewsets import ModelViewSet
 
 from api.serializers.patient_serializers import PatientListSerializer, PatientDetailsSerializer, PatientSerializer, \
-    PatientListDiagnosisSerializer, PatientDiagnosisSerializer
+    PatientListDiagnosisSerializer, PatientDiagnosisSerializer, PatientSuggestSerializer, PatientSuggestListSerializer
 from api.serializers.serializers import PaginationListSerializer
 
-from api.models.orientdb_engine import orient_db_client
-from backend.settings import PAGE_SIZE
+from api.models.orientdb_engine import orient_db_pool, Patient, normalize_name, normalize_snils
+from api.models.semd_models import SemdDiagnosis
+from api.pagination.pagination import encode_cursor, decode_cursor
+from api.utils.patient_suggest_utils import patient_suggest_index
+from api.utils.patients_index_utils import get_new_patients_condition
+from api.utils.ptn_tags_utils import ptn_tag_cache
+from api.utils.semd_cubes_utils import get_semd_cubes_watermark
+from api.utils.semd_extraction_utils import extract_semds
+from backend.settings import PAGE_SIZE, PATIENTS_COUNT_CACHE_TIMEOUT, PATIENTS_SEARCH_MAX_RIDS
 
 
 class GetPatientListService:
@@ -57,153 +64,37 @@ class GetPatientListService:
         """
 
         # Get query params
-        page = request.query_params.get('page', None)
         q = request.query_params.get('q', None)
         snils = request.query_params.get('snils', None)
         name = request.query_params.get('name', None)
 
         # Add filter to request
-        if q:
+        condition = get_patients_search_condition(q, snils, name)
+        if condition:
             query_body += f"""
                 WHERE
-                   person.lastName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.firstName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.middleName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.snils LIKE "%{q}%"
+                    {condition}
             """
             query_count_body += f"""
                 WHERE
-                   person.lastName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.firstName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.middleName.toLowerCase() LIKE "%{q.lower()}%" OR  
-                   person.snils LIKE "%{q}%"
+                    {condition}
             """
-        else:
-            if snils:
-                exp_snils = None
-                if len(snils) == 11:
-                    exp_snils = snils[0:3] + '-' + snils[3:6] + '-' + snils[6:9] + ' ' + snils[9:]
-                elif len(snils) == 14:
-                    exp_snils = snils
-                    snils = snils[0:3] + snils[4:7] + snils[8:11] + snils[12:]
-                if exp_snils:
-                    query_body += f"""
-                        WHERE
-                           person.snils in ["{snils}", "{exp_snils}"]
-                    """
-                    query_count_body += f"""
-                        WHERE
-                           person.snils in ["{snils}", "{exp_snils}"]
-                    """
-                else:
-                    query_body += f"""
-                        WHERE
-                           person.snils = "{snils}"
-                    """
-                    query_count_body += f"""
-                        WHERE
-                           person.snils = "{snils}"
-                    """
-            elif name:
-                names = name.split(' ')
-                lastname = names[0]
-                condition = f'person.lastName.toLowerCase() = "{lastname.lower()}"'
-                if len(names) > 1:
-                    firstname = names[1]
-                    condition += f' AND person.firstName.toLowerCase() = "{firstname.lower()}"'
-                if len(names) > 2:
-                    middlename = names[2]
-                    condition += f' AND person.middleName.toLowerCase() = "{middlename.lower()}"'
-                query_body += f"""
-                    WHERE
-                       {condition}
-                """
-                query_count_body += f"""
-                    WHERE
-                       {condition}
-                """
-
-        # Calculate count of queryset
-        orient_result = orient_db_client.query(query_count_body, -1)
-        count = orient_result[0].count
-
-        # Add paginate to request
-        if page is not None:
-            try:
-                page = int(page)
-                page = page if page >= 1 else 1
-                page = page if page <= math.ceil(count / PAGE_SIZE) else math.ceil(count / PAGE_SIZE)
-            except:
-                page = 1
-        else:
-            page = 1
-
-        query_body += f"""
-            SKIP {(page - 1) * PAGE_SIZE}
-            LIMIT {PAGE_SIZE}
-        """
 
-        # Get queryset
-        orient_result = orient_db_client.query(query_body, -1)
-        result = [
-            OrderedDict(
-                [
-                    ('rid', str(rec.oRecordData.get('rid', None))),
-                    ('lastname', rec.oRecordData.get('lastname', None)),
-                    ('firstname', rec.oRecordData.get('firstname', None)),
-                    ('middlename', rec.oRecordData.get('middlename', None)),
-                    ('birthday', rec.oRecordData.get('birthday', None)),
-                    ('gender', rec.oRecordData.get('gender', None)),
-                    ('code', rec.oRecordData.get('code', None)),
-                    ('snils', rec.oRecordData.get('snils', None)),
-                    ('mo_oid', rec.oRecordData.get('mo_oid', None)),
-                    ('mo_name', rec.oRecordData.get('mo_name', None)),
-                    ('med_terr', rec.oRecordData.get('med_terr', None)),
-                    ('living_area_type', rec.oRecordData.get('living_area_type', None)),
-                    ('phones', rec.oRecordData.get('phones', None)),
-                    ('address', OrderedDict(
-                        [
-                            ('locality_type', rec.oRecordData.get('locality_type', None)),
-                            ('locality_name', rec.oRecordData.get('locality_name', None)),
-                            ('address', rec.oRecordData.get('address', None)),
-                        ]
-                    )),
-                    ('base_diagnoses', get_patient_base_diagnoses(str(rec.oRecordData.get('rid', None)))),
-                    ('semd_diagnoses', get_patient_semd_diagnoses(str(rec.oRecordData.get('rid', None)))),
-                    ('tags', get_patient_tags(rec.oRecordData.get('tags', None))),
-                ]
-            )
-            for rec in orient_result
-        ]
+        # Get paginated queryset
+        result, pagination_data = \
+            paginate_patients(request, query_body, query_count_body, is_filtered=condition is not None)
 
         patient_list_serializer = view.get_serializer(result, many=True)
 
-        items_per_page = PAGE_SIZE
-        start_item_index = 0 if count == 0 else (page - 1) * PAGE_SIZE + 1
-        end_item_index = (page - 1) * PAGE_SIZE - 1 + len(orient_result) + 1
-        previous_page = page - 1 if page > 1 else None
-        current_page = page
-        next_page = page + 1 if page < math.ceil(count / PAGE_SIZE) else None
-
         # Formate pagination list's extra information schema
-        pagination_list_serializer = PaginationListSerializer(
-            data={
-                'count_items': count,
-                'items_per_page': items_per_page,
-                'start_item_index': start_item_index,
-                'end_item_index': end_item_index,
-                'previous_page': previous_page,
-                'current_page': current_page,
-                'next_page': next_page,
-            }
-        )
+        pagination_list_serializer = PaginationListSerializer(data=pagination_data)
         pagination_list_serializer.is_valid()
 
         # Formate response schema
         return_serializer = PatientListSerializer(
             data={
                 'retCode': 0,
-                'retMsg': 'Ok' if count > 0 else 'Result set is empty',
+                'retMsg': 'Ok' if result else 'Result set is empty',
                 'result': patient_list_serializer.data,
                 'retExtInfo': pagination_list_serializer.data,
                 'retTime': int(time.time() * 10 ** 3)
@@ -253,38 +144,11 @@ class GetPatientDetailsService:
         """
 
         # Get queryset
-        orient_result = orient_db_client.query(query_body, -1)
+        orient_result = orient_db_pool.query(query_body, -1)
         if len(orient_result) != 1:
             raise NotFound(f"Patient with rid='{rid}' was not found", code='rid')
 
-        result = \
-            OrderedDict(
-                [
-                    ('rid', str(orient_result[0].oRecordData.get('rid', None))),
-                    ('lastname', orient_result[0].oRecordData.get('lastname', None)),
-                    ('firstname', orient_result[0].oRecordData.get('firstname', None)),
-                    ('middlename', orient_result[0].oRecordData.get('middlename', None)),
-                    ('birthday', orient_result[0].oRecordData.get('birthday', None)),
-                    ('gender', orient_result[0].oRecordData.get('gender', None)),
-                    ('code', orient_result[0].oRecordData.get('code', None)),
-                    ('snils', orient_result[0].oRecordData.get('snils', None)),
-                    ('mo_oid', orient_result[0].oRecordData.get('mo_oid', None)),
-                    ('mo_name', orient_result[0].oRecordData.get('mo_name', None)),
-                    ('med_terr', orient_result[0].oRecordData.get('med_terr', None)),
-                    ('living_area_type', orient_result[0].oRecordData.get('living_area_type', None)),
-                    ('phones', orient_result[0].oRecordData.get('phones', None)),
-                    ('address', OrderedDict(
-                        [
-                            ('locality_type', orient_result[0].oRecordData.get('locality_type', None)),
-                            ('locality_name', orient_result[0].oRecordData.get('locality_name', None)),
-                            ('address', orient_result[0].oRecordData.get('address', None)),
-                        ]
-                    )),
-                    ('base_diagnoses', get_patient_base_diagnoses(str(orient_result[0].oRecordData.get('rid', None)))),
-                    ('semd_diagnoses', get_patient_semd_diagnoses(str(orient_result[0].oRecordData.get('rid', None)))),
-                    ('tags', get_patient_tags(orient_result[0].oRecordData.get('tags', None))),
-                ]
-            )
+        result = hydrate_patients(orient_result)[0]
 
         # Convert data to a standard schema for a response
         patient_serializer = PatientSerializer(
@@ -307,46 +171,387 @@ class GetPatientDetailsService:
         return return_serializer
 
 
-def get_patient_base_diagnoses(rid: str) -> List[OrderedDict]:
+class GetPatientSuggestService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> PatientSuggestListSerializer:
+        """
+            Retrieve patient autocomplete suggestions
+        """
+
+        # Get query params
+        q = request.query_params.get('q', None)
+        if not q:
+            raise ParseError(f"Request must have 'q' parameter", code='q')
+        try:
+            limit = int(request.query_params.get('limit', 10))
+            limit = min(max(limit, 1), 100)
+        except:
+            limit = 10
+
+        # Get suggestions from in-process index
+        result = patient_suggest_index.suggest(q, limit)
+
+        patient_suggest_list_serializer = PatientSuggestSerializer(result, many=True)
+
+        # Formate response schema
+        return_serializer = PatientSuggestListSerializer(
+            data={
+                'retCode': 0,
+                'retMsg': 'Ok' if result else 'Result set is empty',
+                'result': patient_suggest_list_serializer.data,
+                'retExtInfo': '',
+                'retTime': int(time.time() * 10 ** 3)
+            }
+        )
+        return_serializer.is_valid()
+
+        return return_serializer
+
+
+def get_patients_search_condition(q: str | None, snils: str | None, name: str | None) -> str | None:
+    """
+        OrientDB condition of ptn for patient search parameters.
+        Matching rids are resolved by the Postgres patient search index (api_patient) first,
+        the scan of ptn is used only if the index is empty or too many patients are matched.
+        Patients created after the last refresh of index are scanned by rids above index watermarks.
+    """
+    if not q and not snils and not name:
+        return None
+
+    rids = search_patient_rids(q, snils, name)
+    if rids is None:
+        return get_patients_scan_condition(q, snils, name)
+
+    # '#-1:-1' is never existing rid (for the empty result set)
+    condition = f"@rid IN [{','.join(rids) if rids else '#-1:-1'}]"
+    new_patients_condition = get_new_patients_condition()
+    if new_patients_condition:
+        condition = f"({condition} OR ({new_patients_condition} AND {get_patients_scan_condition(q, snils, name)}))"
+
+    return condition
+
+
+def get_patients_scan_condition(q: str | None, snils: str | None, name: str | None) -> str:
+    """
+        OrientDB condition of ptn for patient search parameters by scan of person fields
+    """
+    if q:
+        return f"""
+            (person.lastName.toLowerCase() LIKE "%{q.lower()}%" OR  
+            person.firstName.toLowerCase() LIKE "%{q.lower()}%" OR  
+            person.middleName.toLowerCase() LIKE "%{q.lower()}%" OR  
+            person.snils LIKE "%{q}%")
+        """
+
+    if snils:
+        exp_snils = None
+        if len(snils) == 11:
+            exp_snils = snils[0:3] + '-' + snils[3:6] + '-' + snils[6:9] + ' ' + snils[9:]
+        elif len(snils) == 14:
+            exp_snils = snils
+            snils = snils[0:3] + snils[4:7] + snils[8:11] + snils[12:]
+        if exp_snils:
+            return f'person.snils in ["{snils}", "{exp_snils}"]'
+        return f'person.snils = "{snils}"'
+
+    names = name.split(' ')
+    lastname = names[0]
+    condition = f'person.lastName.toLowerCase() = "{lastname.lower()}"'
+    if len(names) > 1:
+        firstname = names[1]
+        condition += f' AND person.firstName.toLowerCase() = "{firstname.lower()}"'
+    if len(names) > 2:
+        middlename = names[2]
+        condition += f' AND person.middleName.toLowerCase() = "{middlename.lower()}"'
+
+    return '(' + condition + ')'
+
+
+def search_patient_rids(q: str | None, snils: str | None, name: str | None) -> List[str] | None:
+    """
+        Rids of patients matched by the Postgres patient search index
+        (None if the index is empty or more than PATIENTS_SEARCH_MAX_RIDS patients are matched)
+    """
+    if not Patient.objects.exists():
+        return None
+
+    patients = Patient.objects.all()
+    if q:
+        q_name = normalize_name(q)
+        condition = Q(lastname_norm__contains=q_name) | \
+            Q(firstname_norm__contains=q_name) | \
+            Q(middlename_norm__contains=q_name)
+        q_snils = normalize_snils(q)
+        if q_snils:
+            condition |= Q(snils_digits__contains=q_snils)
+        patients = patients.filter(condition)
+    elif snils:
+        # SNILS without digits matches no patient
+        snils_digits = normalize_snils(snils)
+        if not snils_digits:
+            return []
+        patients = patients.filter(snils_digits=snils_digits)
+    else:
+        names = name.split(' ')
+        patients = patients.filter(lastname_norm=normalize_name(names[0]))
+        if len(names) > 1:
+            patients = patients.filter(firstname_norm=normalize_name(names[1]))
+        if len(names) > 2:
+            patients = patients.filter(middlename_norm=normalize_name(names[2]))
+
+    rids = list(patients.values_list('rid', flat=True)[:PATIENTS_SEARCH_MAX_RIDS + 1])
+    if len(rids) > PATIENTS_SEARCH_MAX_RIDS:
+        return None
+
+    return rids
+
+
+def get_patients_count(query_count_body: str, is_refresh: bool = False, is_required: bool = True) -> int | None:
+    """
+        Count of ptn records for query. The count is cached, so it is not recalculated for every page.
+    """
+    cache_key = 'patients_count:' + hashlib.md5(' '.join(query_count_body.split()).encode()).hexdigest()
+    count = None if is_refresh else cache.get(cache_key)
+    if count is None and (is_required or is_refresh):
+        orient_result = orient_db_pool.query(query_count_body, -1)
+        count = orient_result[0].count
+        cache.set(cache_key, count, PATIENTS_COUNT_CACHE_TIMEOUT)
+
+    return count
+
+
+def paginate_patients(request: Request, query_body: str, query_count_body: str, is_filtered: bool) -> (list, dict):
+    """
+        Get page of patients and pagination list's extra information.
+        Page is defined by 'page' parameter (SKIP/LIMIT, for compatibility) or
+        by opaque 'cursor' parameter (keyset pagination by @rid, empty cursor for the first page).
+        In cursor mode count is calculated only with 'count' parameter, otherwise cached count is returned.
+    """
+    page = request.query_params.get('page', None)
+    cursor = request.query_params.get('cursor', None)
+    is_count = str(request.query_params.get('count', '')).lower() in ('1', 'true', 'yes')
+
+    if cursor is not None and page is None:
+        # Add keyset paginate to request
+        last_rid = decode_cursor(cursor)
+        if last_rid:
+            query_body += f"""
+                {'AND' if is_filtered else 'WHERE'}
+                    @rid > {last_rid}
+            """
+        query_body += f"""
+            ORDER BY @rid
+            LIMIT {PAGE_SIZE + 1}
+        """
+
+        # Get queryset
+        orient_result = orient_db_pool.query(query_body, -1)
+        is_next = len(orient_result) > PAGE_SIZE
+        result = hydrate_patients(orient_result[:PAGE_SIZE])
+
+        pagination_data = {
+            'count_items': get_patients_count(query_count_body, is_refresh=is_count, is_required=False),
+            'items_per_page': PAGE_SIZE,
+            'start_item_index': None,
+            'end_item_index': None,
+            'previous_page': None,
+            'current_page': None,
+            'next_page': None,
+            'next_cursor': encode_cursor(result[-1]['rid']) if is_next else None,
+        }
+
+        return result, pagination_data
+
+    # Calculate count of queryset
+    count = get_patients_count(query_count_body, is_refresh=is_count)
+
+    # Add paginate to request
+    if page is not None:
+        try:
+            page = int(page)
+            page = page if page >= 1 else 1
+            page = page if page <= math.ceil(count / PAGE_SIZE) else math.ceil(count / PAGE_SIZE)
+        except:
+            page = 1
+    else:
+        page = 1
+
+    query_body += f"""
+        SKIP {(page - 1) * PAGE_SIZE}
+        LIMIT {PAGE_SIZE}
+    """
+
+    # Get queryset
+    orient_result = orient_db_pool.query(query_body, -1)
+    result = hydrate_patients(orient_result)
+
+    pagination_data = {
+        'count_items': count,
+        'items_per_page': PAGE_SIZE,
+        'start_item_index': 0 if count == 0 else (page - 1) * PAGE_SIZE + 1,
+        'end_item_index': (page - 1) * PAGE_SIZE - 1 + len(orient_result) + 1,
+        'previous_page': page - 1 if page > 1 else None,
+        'current_page': page,
+        'next_page': page + 1 if page < math.ceil(count / PAGE_SIZE) else None,
+        'next_cursor': None,
+    }
+
+    return result, pagination_data
+
+
+def hydrate_patients(orient_result: list) -> List[OrderedDict]:
+    """
+        Convert page of ptn records to patient schema rows.
+        Diagnoses and tags are fetched in batch for the whole page (constant number of queries per page).
+    """
+    rids = [str(rec.oRecordData.get('rid', None)) for rec in orient_result]
+    base_diagnoses = get_patients_base_diagnoses(rids)
+    semd_diagnoses = get_patients_semd_diagnoses(rids)
+    tags = get_patients_tags([rec.oRecordData.get('tags', None) for rec in orient_result])
+
     result = [
         OrderedDict(
             [
-                ('diagnosis_code', d_rec.oRecordData.get('mkb10', None)),
-                ('diagnosis_name', d_rec.oRecordData.get('name', None)),
-                ('diagnosis_first_date', d_rec.oRecordData.get('date', None)),
-                ('diagnosis_first_kind_code', ''),
-                ('diagnosis_first_kind_name', ''),
+                ('rid', rid),
+                ('lastname', rec.oRecordData.get('lastname', None)),
+                ('firstname', rec.oRecordData.get('firstname', None)),
+                ('middlename', rec.oRecordData.get('middlename', None)),
+                ('birthday', rec.oRecordData.get('birthday', None)),
+                ('gender', rec.oRecordData.get('gender', None)),
+                ('code', rec.oRecordData.get('code', None)),
+                ('snils', rec.oRecordData.get('snils', None)),
+                ('mo_oid', rec.oRecordData.get('mo_oid', None)),
+                ('mo_name', rec.oRecordData.get('mo_name', None)),
+                ('med_terr', rec.oRecordData.get('med_terr', None)),
+                ('living_area_type', rec.oRecordData.get('living_area_type', None)),
+                ('phones', rec.oRecordData.get('phones', None)),
+                ('address', OrderedDict(
+                    [
+                        ('locality_type', rec.oRecordData.get('locality_type', None)),
+                        ('locality_name', rec.oRecordData.get('locality_name', None)),
+                        ('address', rec.oRecordData.get('address', None)),
+                    ]
+                )),
+                ('base_diagnoses', base_diagnoses.get(rid, list())),
+                ('semd_diagnoses', semd_diagnoses.get(rid, list())),
+                ('tags', rec_tags),
             ]
         )
-        for d_rec in orient_db_client.query(
-            f'''
-            SELECT 
-                diagnosis.registerDz.mkb10 as mkb10, 
-                diagnosis.registerDz.name as name,
-                timeRc.format('yyyy-MM-dd') as date 
-            from 
-                (SELECT 
-                    EXPAND(records) 
-                FROM 
-                    ptn 
-                WHERE 
-                    @rid={rid}) 
+        for rid, rec, rec_tags in zip(rids, orient_result, tags)
+    ]
+
+    return result
+
+
+def get_patient_base_diagnoses(rid: str) -> List[OrderedDict]:
+    return get_patients_base_diagnoses([rid]).get(rid, list())
+
+
+def get_patients_base_diagnoses(rids: List[str]) -> dict:
+    result = {rid: list() for rid in rids}
+    if not rids:
+        return result
+
+    # Get diagnoses of all patients by one query
+    for d_rec in orient_db_pool.query(
+        f'''
+        SELECT 
+            ehr.patient.@rid as ptn_rid,
+            diagnosis.registerDz.mkb10 as mkb10, 
+            diagnosis.registerDz.name as name,
+            timeRc.format('yyyy-MM-dd') as date 
+        from 
+            (SELECT 
+                EXPAND(records) 
+            FROM 
+                ptn 
             WHERE 
-                @class="RcDz"
-            ''',
-            -1
+                @rid IN [{','.join(rids)}]) 
+        WHERE 
+            @class="RcDz"
+        ''',
+        -1
+    ):
+        ptn_rid = str(d_rec.oRecordData.get('ptn_rid', None))
+        if ptn_rid not in result:
+            continue
+        result[ptn_rid].append(
+            OrderedDict(
+                [
+                    ('diagnosis_code', d_rec.oRecordData.get('mkb10', None)),
+                    ('diagnosis_name', d_rec.oRecordData.get('name', None)),
+                    ('diagnosis_first_date', d_rec.oRecordData.get('date', None)),
+                    ('diagnosis_first_kind_code', ''),
+                    ('diagnosis_first_kind_name', ''),
+                ]
+            )
+        )
+
+    for rid in result:
+        result[rid] = sorted(
+            result[rid],
+            key=lambda x: date.today() if x['diagnosis_first_date'] is None else x['diagnosis_first_date']
         )
-    ]
-    result = \
-        sorted(result, key=lambda x: date.today() if x['diagnosis_first_date'] is None else x['diagnosis_first_date'])
 
     return result
 
 
 def get_patient_semd_diagnoses(rid: str) -> List[OrderedDict]:
-    # Define queries
+    return get_patients_semd_diagnoses([rid]).get(rid, list())
+
+
+def get_patients_semd_diagnoses(rids: List[str]) -> dict:
+    """
+        SEMD diagnoses of patients from Patient-SEMD-diagnosis cube.
+        Diagnoses of messages received after cube watermark are taken from SEMD extractions.
+    """
+    result = {rid: list() for rid in rids}
+    if not rids:
+        return result
+
+    # Get diagnoses of all patients from cube by one query
+    watermark = get_semd_cubes_watermark()
+    patient_diagnoses = {rid: set() for rid in rids}
+    if watermark is not None:
+        for ptn_id, *diagnosis in SemdDiagnosis.objects.filter(ptn_id__in=rids).values_list(
+            'ptn_id', 'diagnosis_mkb10', 'diagnosis_date', 'diagnosis_code1077', 'diagnosis_name',
+            'diagnosis_code1077_name'
+        ):
+            if ptn_id in patient_diagnoses:
+                patient_diagnoses[ptn_id].add(tuple(diagnosis))
+
+    # Get diagnoses of messages newer than watermark from extracted SEMDs
+    message_patients = get_patients_messages(rids)
+    for internal_message_id, extraction in extract_semds(list(message_patients), after=watermark).items():
+        ptn_rid = message_patients.get(internal_message_id, None)
+        if ptn_rid not in patient_diagnoses:
+            continue
+        for diagnosis in extraction.diagnoses:
+            code_node = diagnosis['code_node']
+            is_kind = code_node['code_system'] == '1.2.643.5.1.13.13.11.1077'
+            patient_diagnoses[ptn_rid].add(
+                (
+                    diagnosis['mkb10'],
+                    date.fromisoformat(diagnosis['date']) if diagnosis['date'] else None,
+                    code_node['code'] if is_kind else None,
+                    diagnosis['name'],
+                    code_node['display_name'] if is_kind else None
+                )
+            )
+
+    for rid, diagnoses in patient_diagnoses.items():
+        result[rid] = summarize_semd_diagnoses(diagnoses)
+
+    return result
+
+
+def get_patients_messages(rids: List[str]) -> dict:
+    """
+        SEMD messages of patients: internal_message_id -> patient rid
+    """
     query_body = f"""
         SELECT 
+            ehr.patient.@rid as ptn_rid,
             internalMessageId 
         FROM 
             (
@@ -355,90 +560,22 @@ def get_patient_semd_diagnoses(rid: str) -> List[OrderedDict]:
                 FROM 
                     ptn 
                 WHERE 
-                    @rid={rid}
+                    @rid IN [{','.join(rids)}]
             ) 
         WHERE 
             @class="RcSMS"
     """
 
-    # Get messages
-    orient_result = orient_db_client.query(query_body, -1)
-    messages = ["'" + rec.oRecordData.get('internalMessageId', '') + "'" for rec in orient_result]
+    message_patients = dict()
+    for rec in orient_db_pool.query(query_body, -1):
+        internal_message_id = rec.oRecordData.get('internalMessageId', None)
+        if internal_message_id:
+            message_patients[internal_message_id] = str(rec.oRecordData.get('ptn_rid', None))
 
-    # Get message diagnoses
-    message_diagnoses = None
-    if messages:
-        query_body = """
-            SELECT
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:observation[x:value[@codeSystem="1.2.643.5.1.13.13.11.1005"]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as diagnoses
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id in (""" + ','.join(messages) + ')'
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            message_diagnoses = cursor.fetchall()
+    return message_patients
 
-    # Calculate diagnoses set
-    diagnoses = set()
-    if message_diagnoses:
-        for message_diagnosis in message_diagnoses:
-            xmls = message_diagnosis[0].split('<new/>')
-            for xml in xmls:
-                if xml:
-                    try:
-                        row_diagnosis = None
-                        row_diagnosis_name = None
-                        row_diagnosis_time = None
-                        row_diagnosis_kind_code = None
-                        row_diagnosis_kind_name = None
-                        observation = xmltodict.parse(xml)['observation']
-                        observation_values = observation.get('value', None)
-                        if observation_values:
-                            if isinstance(observation_values, dict):
-                                observation_values = [observation_values]
-                            for observation_value in observation_values:
-                                if isinstance(observation_value, dict):
-                                    observation_value_code_system = observation_value.get('@codeSystem', '')
-                                    if observation_value_code_system == '1.2.643.5.1.13.13.11.1005':
-                                        row_diagnosis = observation_value.get('@code', None)
-                                        row_diagnosis_name = unescape(observation_value.get('@displayName', None))
-                                        break
-                        observation_effective_times = observation.get('effectiveTime', None)
-                        if isinstance(observation_effective_times, dict):
-                            observation_effective_time = observation_effective_times.get('@value', None)
-                            if isinstance(observation_effective_time, str):
-                                row_diagnosis_time = datetime(
-                                    int(observation_effective_time[0:4]),
-                                    int(observation_effective_time[4:6]),
-                                    int(observation_effective_time[6:8])
-                                ).date()
-                        observation_codes = observation.get('code', None)
-                        if observation_codes:
-                            if isinstance(observation_codes, dict):
-                                observation_codes = [observation_codes]
-                            for observation_code in observation_codes:
-                                if isinstance(observation_code, dict):
-                                    observation_code_code_system = observation_code.get('@codeSystem', '')
-                                    if observation_code_code_system == '1.2.643.5.1.13.13.11.1077':
-                                        row_diagnosis_kind_code = observation_code.get('@code', None)
-                                        row_diagnosis_kind_name = unescape(observation_code.get('@displayName', None))
-                                        break
-                        if row_diagnosis:
-                            diagnoses = diagnoses.union(
-                                {
-                                    (
-                                        row_diagnosis,
-                                        row_diagnosis_time,
-                                        row_diagnosis_kind_code,
-                                        row_diagnosis_name,
-                                        row_diagnosis_kind_name
-                                    )
-                                 }
-                            )
-                    except:
-                        pass
 
+def summarize_semd_diagnoses(diagnoses: set) -> List[OrderedDict]:
     result = list()
     diagnoses = sorted(
         diagnoses,
@@ -466,28 +603,19 @@ def get_patient_semd_diagnoses(rid: str) -> List[OrderedDict]:
 
 
 def get_patient_tags(tags: list) -> List[OrderedDict]:
-    result = [
-        OrderedDict(
-            [
-                ('tag_rid', str(tag.oRecordData.get('rid', None))),
-                ('tag_name', tag.oRecordData.get('name', None)),
-                ('tag_description', tag.oRecordData.get('description', None)),
-            ]
-        )
-        for tag in orient_db_client.query(
-            f'''
-            SELECT 
-                @rid, 
-                name,
-                description 
-            from 
-                PtnTag 
-            WHERE 
-                @rid in [{','.join([str(rid) for rid in tags])}]
-            ''',
-            -1
-        )
-    ]
+    return get_patients_tags([tags])[0]
+
+
+def get_patients_tags(patients_tags: List[list]) -> List[List[OrderedDict]]:
+    # Resolve tags of patients by process-wide tag dictionary
+    result = list()
+    for tags in patients_tags:
+        patient_tags = list()
+        for rid in tags or list():
+            tag = ptn_tag_cache.get(str(rid))
+            if tag is not None:
+                patient_tags.append(tag)
+        result.append(patient_tags)
 
     return result
 
@@ -504,156 +632,8 @@ class GetPatientDiagnosesService:
         if not rid:
             raise ParseError(f"Request must have 'rid' parameter", code='rid')
 
-        # Define queries
-        query_body = f"""
-            SELECT 
-                internalMessageId 
-            FROM 
-                (
-                    SELECT 
-                        EXPAND(records) 
-                    FROM 
-                        ptn 
-                    WHERE 
-                        @rid={rid}
-                ) 
-            WHERE 
-                @class="RcSMS"
-        """
-
-        # Get messages
-        orient_result = orient_db_client.query(query_body, -1)
-        messages = ["'" + rec.oRecordData.get('internalMessageId', '') + "'" for rec in orient_result]
-
-        # Get message diagnoses
-        message_diagnoses = None
-        if messages:
-            query_body = """
-                SELECT
-                    regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[x:observation[x:value[@codeSystem="1.2.643.5.1.13.13.11.1005"]]]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as diagnoses,
-                    internal_message_id,
-                    document_type,
-                    array_to_string(xpath('/x:ClinicalDocument/x:effectiveTime/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ',') as date_time
-                FROM
-                    vimis_sending
-                WHERE
-                    internal_message_id in (""" + ','.join(messages) + ')'
-            with connections['egisz-db'].cursor() as cursor:
-                cursor.execute(query_body)
-                message_diagnoses = cursor.fetchall()
-
-        # Calculate diagnoses set
-        diagnoses = set()
-        if message_diagnoses:
-            for message_diagnosis in message_diagnoses:
-                xmls = message_diagnosis[0].split('<new/>')
-                internal_message_id = message_diagnosis[1]
-                document_type = message_diagnosis[2]
-                internal_message_time = datetime(
-                    int(message_diagnosis[3][0:4]),
-                    int(message_diagnosis[3][4:6]),
-                    int(message_diagnosis[3][6:8])
-                ).date()
-                for xml in xmls:
-                    if not xml:
-                        continue
-                    try:
-                        parent = xmltodict.parse(xml)
-                        if not isinstance(parent, dict):
-                            continue
-                        for parent_key, parent_dict in parent.items():
-                            if not isinstance(parent_dict, dict):
-                                continue
-                            parent_node_name = parent_key
-                            parent_node_class_code = parent_dict.get('@classCode', None)
-                            parent_node_code = None
-                            parent_node_display_name = None
-                            parent_node_code_system = None
-                            parent_node_code_system_version = None
-                            parent_node_code_system_name = None
-                            parent_node_code_node = parent_dict.get('code', None)
-                            if parent_node_code_node and isinstance(parent_node_code_node, dict):
-                                parent_node_code = parent_node_code_node.get('@code', None)
-                                parent_node_display_name = unescape(parent_node_code_node.get('@displayName', None))
-                                parent_node_code_system = parent_node_code_node.get('@codeSystem', None)
-                                parent_node_code_system_version = parent_node_code_node.get('@codeSystemVersion', None)
-                                parent_node_code_system_name = unescape(parent_node_code_node.get('@codeSystemName', None))
-                            for key, entry_list in parent_dict.items():
-                                if not isinstance(entry_list, list):
-                                    entry_list = [entry_list]
-                                for entry in entry_list:
-                                    if not isinstance(entry, dict):
-                                        continue
-                                    observation = entry.get('observation', None)
-                                    if not observation:
-                                        continue
-
-                                    row_date = None
-                                    observation_effective_times = observation.get('effectiveTime', None)
-                                    if isinstance(observation_effective_times, dict):
-                                        observation_effective_time = observation_effective_times.get('@value', None)
-                                        if isinstance(observation_effective_time, str):
-                                            row_date = datetime(
-                                                int(observation_effective_time[0:4]),
-                                                int(observation_effective_time[4:6]),
-                                                int(observation_effective_time[6:8])
-                                            ).date()
-
-                                    node_code = None
-                                    node_display_name = None
-                                    node_code_system = None
-                                    node_code_system_version = None
-                                    node_code_system_name = None
-                                    node_code_node = observation.get('code', None)
-                                    if node_code_node and isinstance(node_code_node, dict):
-                                        node_code = node_code_node.get('@code', None)
-                                        node_display_name = unescape(node_code_node.get('@displayName', None))
-                                        node_code_system = node_code_node.get('@codeSystem', None)
-                                        node_code_system_version = node_code_node.get('@codeSystemVersion', None)
-                                        node_code_system_name = unescape(node_code_node.get('@codeSystemName', None))
-
-                                    row_diagnosis = None
-                                    row_diagnosis_name = None
-                                    observation_values = observation.get('value', None)
-                                    if observation_values:
-                                        if not isinstance(observation_values, list):
-                                            observation_values = [observation_values]
-                                        for observation_value in observation_values:
-                                            if not isinstance(observation_value, dict):
-                                                continue
-                                            observation_value_code_system = observation_value.get('@codeSystem', '')
-                                            if observation_value_code_system == '1.2.643.5.1.13.13.11.1005':
-                                                row_diagnosis = observation_value.get('@code', None)
-                                                row_diagnosis_name = unescape(observation_value.get('@displayName', None))
-                                                break
-
-                                    if row_diagnosis:
-                                        diagnoses = diagnoses.union(
-                                            {
-                                                (
-                                                    row_diagnosis,
-                                                    row_date,
-                                                    node_code,
-                                                    row_diagnosis_name,
-                                                    internal_message_id,
-                                                    document_type,
-                                                    internal_message_time,
-                                                    parent_node_name,
-                                                    parent_node_class_code,
-                                                    parent_node_code,
-                                                    parent_node_display_name,
-                                                    parent_node_code_system,
-                                                    parent_node_code_system_version,
-                                                    parent_node_code_system_name,
-                                                    node_display_name,
-                                                    node_code_system,
-                                                    node_code_system_version,
-                                                    node_code_system_name
-                                                )
-                                            }
-                                        )
-                    except:
-                        pass
+        # Get diagnoses from cube and from messages newer than cube watermark
+        diagnoses = get_patient_semd_diagnoses_in_semds(rid)
 
         diagnoses = sorted(
             diagnoses,
@@ -769,3 +749,52 @@ class GetPatientDiagnosesService:
         return_serializer.is_valid()
 
         return return_serializer
+
+
+def get_patient_semd_diagnoses_in_semds(rid: str) -> set:
+    """
+        SEMD diagnoses of patient with their nodes in SEMDs. Messages of patient are taken from
+        Patient-SEMD-diagnosis cube and messages received after cube watermark from OrientDB,
+        diagnoses of all messages are taken from SEMD extractions, so every message has the same fields.
+    """
+    extractions = dict()
+
+    # Get messages from cube (their extractions are kept while cube is filled)
+    watermark = get_semd_cubes_watermark()
+    if watermark is not None:
+        extractions.update(extract_semds(list(
+            SemdDiagnosis.objects.filter(ptn_id=rid).values_list('internal_message_id', flat=True).distinct()
+        )))
+
+    # Get messages newer than watermark
+    extractions.update(extract_semds(list(get_patients_messages([rid])), after=watermark))
+
+    diagnoses = set()
+    for internal_message_id, extraction in extractions.items():
+        for diagnosis in extraction.diagnoses:
+            parent_node_code_node = diagnosis['parent_node_code_node']
+            code_node = diagnosis['code_node']
+            diagnoses.add(
+                (
+                    diagnosis['mkb10'],
+                    date.fromisoformat(diagnosis['date']) if diagnosis['date'] else None,
+                    code_node['code'],
+                    diagnosis['name'],
+                    internal_message_id,
+                    extraction.document_type,
+                    extraction.effective_date,
+                    diagnosis['parent_node_name'],
+                    diagnosis['parent_node_class_code'],
+                    parent_node_code_node['code'],
+                    parent_node_code_node['display_name'],
+                    parent_node_code_node['code_system'],
+                    parent_node_code_node['code_system_version'],
+                    parent_node_code_node['code_system_name'],
+                    code_node['display_name'],
+                    code_node['code_system'],
+                    code_node['code_system_version'],
+                    code_node['code_system_name']
+                )
+            )
+
+    return diagnoses
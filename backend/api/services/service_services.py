@@ -0,0 +1,60 @@
+import time
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.viewsets import ModelViewSet
+
+from api.serializers.service_serializers import ServiceStatsDetailsSerializer, ServiceCachesInvalidateSerializer
+from api.utils.service_stats_utils import get_service_stats, invalidate_caches, PROCESS_CACHES
+
+
+class GetServiceStatsService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> ServiceStatsDetailsSerializer:
+        """
+            Retrieve counters of OrientDB connection pool and process-wide caches
+        """
+
+        # Formate response schema
+        return_serializer = ServiceStatsDetailsSerializer(
+            data={
+                'retCode': 0,
+                'retMsg': 'Ok',
+                'result': get_service_stats(),
+                'retExtInfo': '',
+                'retTime': int(time.time() * 10 ** 3)
+            }
+        )
+        return_serializer.is_valid()
+
+        return return_serializer
+
+
+class InvalidateServiceCachesService:
+    @staticmethod
+    def execute(request: Request, view: ModelViewSet, *args, **kwargs) -> ServiceCachesInvalidateSerializer:
+        """
+            Invalidate process-wide caches
+        """
+
+        # Check input data
+        names = request.query_params.getlist('cache', None)
+        for name in names:
+            if name not in PROCESS_CACHES:
+                raise ValidationError(f"Value of cache parameter ({name}) is not valid. "
+                                      f"See valid caches: " + '; '.join(["'" + c + "'" for c in PROCESS_CACHES]),
+                                      code='cache')
+
+        # Formate response schema
+        return_serializer = ServiceCachesInvalidateSerializer(
+            data={
+                'retCode': 0,
+                'retMsg': 'Ok',
+                'result': invalidate_caches(names),
+                'retExtInfo': '',
+                'retTime': int(time.time() * 10 ** 3)
+            }
+        )
+        return_serializer.is_valid()
+
+        return return_serializer
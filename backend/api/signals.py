@@ -0,0 +1,11 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api.models.semd_models import OncorSettings
+from api.utils.orders_rules_utils import ORDERS_RULES_CODE, orders_rules_cache
+
+
+@receiver([post_save, post_delete], sender=OncorSettings)
+def invalidate_orders_rules(sender, instance: OncorSettings, **kwargs):
+    if instance.code == ORDERS_RULES_CODE:
+        orders_rules_cache.invalidate()
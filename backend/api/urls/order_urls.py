@@ -1,7 +1,7 @@
 from django.urls import path, include
 
-from api.views.order_views import F14ViewSet, F14v2ViewSet
-from api.routers.routers import OnlyListRouter
+from api.views.order_views import F14ViewSet, F14v2ViewSet, F14v2DrillDownViewSet, ReportJobViewSet
+from api.routers.routers import OnlyListRouter, CreateRetrieveRouter
 from backend.settings import API_PREFIX
 
 orders_f14_report_router = OnlyListRouter()
@@ -10,7 +10,15 @@ orders_f14_report_router.register(r'orders_f14_report', F14ViewSet)
 orders_f14v2_report_router = OnlyListRouter()
 orders_f14v2_report_router.register(r'orders_f14v2_report', F14v2ViewSet)
 
+orders_f14v2_drill_down_router = OnlyListRouter()
+orders_f14v2_drill_down_router.register(r'orders_f14v2_drill_down', F14v2DrillDownViewSet)
+
+orders_report_job_router = CreateRetrieveRouter()
+orders_report_job_router.register(r'orders_report_job', ReportJobViewSet)
+
 urlpatterns = [
     path(API_PREFIX, include(orders_f14_report_router.urls)),
     path(API_PREFIX, include(orders_f14v2_report_router.urls)),
+    path(API_PREFIX, include(orders_f14v2_drill_down_router.urls)),
+    path(API_PREFIX, include(orders_report_job_router.urls)),
 ]
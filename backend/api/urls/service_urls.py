@@ -0,0 +1,12 @@
+from django.urls import path, include
+
+from api.views.service_views import ServiceStatsViewSet
+from api.routers.routers import ListActionsRouter
+from backend.settings import API_PREFIX
+
+service_stats_router = ListActionsRouter()
+service_stats_router.register(r'service_stats', ServiceStatsViewSet, basename='service_stats')
+
+urlpatterns = [
+    path(API_PREFIX, include(service_stats_router.urls)),
+]
@@ -0,0 +1,525 @@
+from datetime import date
+from html import unescape
+from typing import NamedTuple, Tuple, List
+
+from lxml import etree
+
+NAMESPACES = {'x': 'urn:hl7-org:v3'}
+
+CODE_SYSTEM_DIAGNOSES = '1.2.643.5.1.13.13.11.1005'
+CODE_SYSTEM_SERVICES = '1.2.643.5.1.13.13.11.1070'
+CODE_SYSTEM_INSTRUMENTAL_DIAGNOSTICS = '1.2.643.5.1.13.13.11.1471'
+
+# One parser for all documents: payload encoding is defined by database, not by XML declaration
+PARSER = etree.XMLParser(encoding='utf-8', resolve_entities=False, no_network=True, huge_tree=True)
+
+
+def compile_xpath(path: str) -> etree.XPath:
+    return etree.XPath(path, namespaces=NAMESPACES, smart_strings=False)
+
+
+# Header of document
+XPATH_NSI_DOC_TYPE_592 = compile_xpath('/x:ClinicalDocument/x:code[@codeSystem="1.2.643.5.1.13.13.99.2.592"]/@code')
+XPATH_NSI_DOC_TYPE_1522 = compile_xpath('/x:ClinicalDocument/x:code[@codeSystem="1.2.643.5.1.13.13.11.1522"]/@code')
+XPATH_AUTHOR_MO_OID = compile_xpath(
+    '/x:ClinicalDocument/x:author/x:assignedAuthor/x:representedOrganization/x:id/@root'
+)
+XPATH_AUTHOR_SNILS = compile_xpath(
+    '/x:ClinicalDocument/x:author/x:assignedAuthor/x:id[@root="1.2.643.100.3"]/@extension'
+)
+XPATH_AUTHOR_POST = compile_xpath(
+    '/x:ClinicalDocument/x:author/x:assignedAuthor/x:code[@codeSystem="1.2.643.5.1.13.13.11.1002"]/@code'
+)
+XPATH_EFFECTIVE_TIME = compile_xpath('/x:ClinicalDocument/x:effectiveTime/@value')
+
+# Body of document: coded nodes are found by one pass over components of body
+BODY = '/x:ClinicalDocument/x:component/x:structuredBody/x:component'
+XPATH_BODY_COMPONENTS = compile_xpath(BODY)
+
+# Content of document by document type: (name, separator of values, XPath) of fields,
+# values of text nodes are joined in one line
+CONTENT_FIELDS = {
+    '1': (
+        ('recipient', ', ',
+         BODY + '/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act/x:performer/x:assignedEntity'
+                '/x:representedOrganization/x:id/@root'),
+        ('purpose', ', ',
+         BODY + '/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act'
+                '/x:code[@codeSystem="1.2.643.5.1.13.13.11.1009"]/@displayName'),
+        ('service', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('consultation_type', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1463"]/@displayName'),
+    ),
+    '2': (
+        ('protocol', ' ',
+         BODY + '//x:*[x:code[@code="1805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('conclusion', ' ',
+         BODY + '//x:*[x:code[@code="1806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('recommendation', ' ',
+         BODY + '//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+    ),
+    '3': (
+        ('laboratory_tests', ';', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code'),
+    ),
+    '4': (
+        ('histological_tests', ';', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+    ),
+    '5': (
+        ('protocol', ' ', BODY + '//x:*[x:code[@code="805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('protocol2', ' ',
+         BODY + '//x:*[x:code[@code="12193"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('conclusion', ' ',
+         BODY + '//x:*[x:code[@code="806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('conclusion2', ' ',
+         BODY + '//x:*[x:code[@code="837"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('recommendation', ' ',
+         BODY + '//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+    ),
+    '6': (
+        ('date', ', ',
+         BODY + '/x:section[x:code[@code="vimisConsiliumProtocol"]]/x:entry/x:observation/x:effectiveTime/@value'),
+        ('date2', ', ', '/x:ClinicalDocument/x:effectiveTime/@value'),
+        ('number', ', ',
+         BODY + '/x:section[x:code[@code="vimisConsiliumProtocol"]]/x:entry/x:observation/x:text/text()'),
+        ('number2', ', ',
+         BODY + '/x:section[x:code[@code="CONSILIUM"]]/x:entry'
+                '/x:observation[x:code[@code="11003"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('purpose', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1506"]/@displayName'),
+        ('form', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.166"]/@displayName'),
+        ('conclusion', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.349"]/@displayName'),
+    ),
+    '8': (
+        ('date_start', ';', BODY + '/x:section[x:code[@code="HOSP"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value'),
+        ('date_start2', ';',
+         BODY + '/x:section[x:code[@code="HOSP"]]/x:component/x:section[x:code[@code="PATIENTROUTE"]]/x:component'
+                '/x:section[x:code[@code="DEPARTINFO"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value'),
+        ('urgency', ';', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.256"]/@displayName'),
+        ('stateadm', ';',
+         BODY + '//x:*[x:code[@code="STATEADM"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1006"]/@displayName'),
+        ('date_end', ';', BODY + '/x:section[x:code[@code="HOSP"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value'),
+        ('date_end2', ';',
+         BODY + '/x:section[x:code[@code="HOSP"]]/x:component/x:section[x:code[@code="PATIENTROUTE"]]/x:component'
+                '/x:section[x:code[@code="DEPARTINFO"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value'),
+        ('statedis', ';',
+         BODY + '//x:*[x:code[@code="STATEDIS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1006"]/@displayName'),
+        ('result', ';', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1046"]/@displayName'),
+        ('consultations', ';',
+         BODY + '//x:*[x:code[@code="RESCONS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('diagnostics', ';',
+         BODY + '//x:*[x:code[@code="RESINSTR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('laboratory_tests', ';',
+         BODY + '//x:*[x:code[@code="RESLAB"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code'),
+        ('morphology_tests', ';',
+         BODY + '//x:*[x:code[@code="RESMOR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('sum_drug', ';', BODY + '//x:*[x:code[@code="DRUG"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1367"]/@code'),
+        ('ray_therapy', ';',
+         BODY + '//x:*[x:code[@code="2"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]/'
+                '/x:*[@codeSystem="1.2.643.5.1.13.13.99.2.133"]/@code'),
+        ('chemo_therapy', ';',
+         BODY + '//x:*[x:code[@code="41"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]/'
+                '/x:*[@codeSystem="1.2.643.5.1.13.13.99.2.647"]/@code'),
+        ('hormone_therapy', ';',
+         BODY + '//x:*[x:code[@code="42"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]/'
+                '/x:*[@codeSystem="1.2.643.5.1.13.13.99.2.407"]/@code'),
+        ('sur', ';', BODY + '//x:*[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+    ),
+    '9': (
+        ('cytological_tests', ';', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code'),
+    ),
+    '10': (
+        ('sur', ';', BODY + '/x:section[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('date_start', ';', BODY + '/x:section[x:code[@code="SUR"]]//x:effectiveTime/x:low/@value'),
+        ('date_end', ';', BODY + '/x:section[x:code[@code="SUR"]]//x:effectiveTime/x:high/@value'),
+    ),
+    '11': (
+        ('late_reason', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.144"]/@displayName'),
+        ('tnm', ' ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.547"]/@displayName'),
+        ('stage', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.546"]/@displayName'),
+        ('side', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.143"]/@displayName'),
+        ('morph_class', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1486"]/@displayName'),
+        ('clinical_group', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.146"]/@displayName'),
+        ('how_discover', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.129"]/@displayName'),
+        ('gem_limph_class', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.901"]/@displayName'),
+        ('topograph', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1487"]/@displayName'),
+        ('loc_met', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1477"]/@displayName'),
+        ('loc_far_met', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:value[@codeSystem="1.2.643.5.1.13.13.99.2.127"]/@displayName'),
+        ('tumor_number', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]/'
+                '/x:*[x:code[@code="12298"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value'),
+        ('tumor_main', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]/'
+                '/x:*[x:code[@code="12299"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value'),
+        ('plural', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.141"]/@displayName'),
+        ('tumor_state', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.583"]/@displayName'),
+        ('blast_form', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.761"]/@displayName'),
+        ('miel_phase', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.760"]/@displayName'),
+        ('method', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.128"]/@displayName'),
+        ('refined_method', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1117"]/@displayName'),
+    ),
+    '12': (
+        ('date_start', ';', BODY + '/x:section[x:code[@code="AMBS"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value'),
+        ('date_end', ';', BODY + '/x:section[x:code[@code="AMBS"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value'),
+        ('order', ';',
+         BODY + '/x:section[x:code[@code="AMBS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1007"]/@displayName'),
+        ('result', ';',
+         BODY + '/x:section[x:code[@code="AMBS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1046"]/@displayName'),
+        ('consultations', ';',
+         BODY + '//x:*[x:code[@code="RESCONS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('diagnostics', ';',
+         BODY + '//x:*[x:code[@code="RESINSTR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('laboratory_tests', ';',
+         BODY + '//x:*[x:code[@code="RESLAB"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code'),
+        ('morphology_tests', ';',
+         BODY + '//x:*[x:code[@code="RESMOR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+        ('sum_drug', ';', BODY + '//x:*[x:code[@code="DRUG"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1367"]/@code'),
+        ('sur', ';', BODY + '//x:*[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+    ),
+    '20': (
+        ('protocol', ' ', BODY + '//x:*[x:code[@code="805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('conclusion', ' ',
+         BODY + '//x:*[x:code[@code="806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+        ('recommendation', ' ',
+         BODY + '//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()'),
+    ),
+    '27': (
+        ('recipient', ', ',
+         BODY + '/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act/x:performer/x:assignedEntity'
+                '/x:representedOrganization/x:id/@root'),
+        ('service', ', ', BODY + '//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code'),
+    ),
+    '37': (
+        ('recipient', ', ',
+         BODY + '/x:section[x:code[@code="ORGINFO"]]/x:entry/x:act/x:performer/x:assignedEntity'
+                '/x:representedOrganization/x:id/@root'),
+        ('tnm', ' ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.547"]/@displayName'),
+        ('stage', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.546"]/@displayName'),
+        ('side', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.143"]/@displayName'),
+        ('morph_class', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1486"]/@displayName'),
+        ('clinical_group', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.146"]/@displayName'),
+        ('how_discover', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.129"]/@displayName'),
+        ('gem_limph_class', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.901"]/@displayName'),
+        ('topograph', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1487"]/@displayName'),
+        ('loc_met', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1477"]/@displayName'),
+        ('loc_far_met', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:value[@codeSystem="1.2.643.5.1.13.13.99.2.127"]/@displayName'),
+        ('tumor_number', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]/'
+                '/x:*[x:code[@code="12298"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value'),
+        ('tumor_main', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]/'
+                '/x:*[x:code[@code="12299"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value'),
+        ('plural', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.141"]/@displayName'),
+        ('tumor_state', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.583"]/@displayName'),
+        ('blast_form', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.761"]/@displayName'),
+        ('miel_phase', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.760"]/@displayName'),
+        ('method', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.128"]/@displayName'),
+        ('refined_method', ', ',
+         BODY + '/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1117"]/@displayName'),
+    ),
+}
+CONTENT_XPATHS = {
+    document_type: tuple(
+        (name, separator, compile_xpath(path), path.endswith('text()')) for name, separator, path in fields
+    )
+    for document_type, fields in CONTENT_FIELDS.items()
+}
+# Content of other document types is not analyzed
+CONTENT_NOT_ANALYZED = 'Анализ не проводился.'
+# Text fields shorter than this are treated as not filled
+INDICATOR_MIN_LENGTH = 5
+
+# Child nodes are found by tag, it is cheaper than XPath evaluation for every node
+TAG_CODE = '{urn:hl7-org:v3}code'
+TAG_EFFECTIVE_TIME = '{urn:hl7-org:v3}effectiveTime'
+TAG_LOW = '{urn:hl7-org:v3}low'
+TAG_OBSERVATION = '{urn:hl7-org:v3}observation'
+TAG_VALUE = '{urn:hl7-org:v3}value'
+TAG_ANY = '{urn:hl7-org:v3}*'
+
+
+class CdaCodeNode(NamedTuple):
+    code: str | None
+    display_name: str | None
+    code_system: str | None
+    code_system_version: str | None
+    code_system_name: str | None
+
+
+class CdaDiagnosis(NamedTuple):
+    mkb10: str
+    name: str | None
+    date: date | None
+    parent_node_name: str
+    parent_node_class_code: str | None
+    parent_node_code_node: CdaCodeNode
+    code_node: CdaCodeNode
+
+
+class CdaService(NamedTuple):
+    code: str
+    date: date | None
+
+
+class CdaDocument(NamedTuple):
+    nsi_doc_type: str
+    author_mo_oid: str
+    author_snils: str
+    author_post: str
+    effective_date: date | None
+    diagnoses: Tuple[CdaDiagnosis, ...]
+    services: Tuple[CdaService, ...]
+    instrumental_diagnostics: Tuple[CdaService, ...]
+    content: dict | str | None
+
+
+EMPTY_CODE_NODE = CdaCodeNode(None, None, None, None, None)
+
+
+def parse_cda(payload: str | bytes) -> etree._Element:
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    return etree.fromstring(payload, PARSER)
+
+
+def extract_cda(payload: str | bytes, document_type: str | None = None) -> CdaDocument:
+    """
+        Parse ClinicalDocument once and extract header fields, diagnoses, services, instrumental diagnostics
+        and content of document type
+    """
+    root = parse_cda(payload)
+
+    # Coded nodes of body in document order
+    diagnosis_values = list()
+    service_codes = list()
+    instrumental_diagnostic_codes = list()
+    for component in XPATH_BODY_COMPONENTS(root):
+        for node in component.iter(TAG_ANY):
+            code_system = node.get('codeSystem')
+            if code_system is None:
+                continue
+            # Parent of coded node must be inside of component
+            parent = node.getparent()
+            if parent is component or node is component:
+                continue
+            if code_system == CODE_SYSTEM_DIAGNOSES:
+                # Parent of diagnosis is grandparent of observation
+                if node.tag != TAG_VALUE or parent.tag != TAG_OBSERVATION:
+                    continue
+                entry = parent.getparent()
+                if entry is component or entry.getparent() is component:
+                    continue
+                diagnosis_values.append(node)
+            elif code_system == CODE_SYSTEM_SERVICES:
+                service_codes.append(node)
+            elif code_system == CODE_SYSTEM_INSTRUMENTAL_DIAGNOSTICS:
+                instrumental_diagnostic_codes.append(node)
+
+    return CdaDocument(
+        nsi_doc_type=','.join(XPATH_NSI_DOC_TYPE_592(root)) or ','.join(XPATH_NSI_DOC_TYPE_1522(root)),
+        author_mo_oid=' '.join(XPATH_AUTHOR_MO_OID(root)),
+        author_snils=' '.join(XPATH_AUTHOR_SNILS(root)),
+        author_post=' '.join(XPATH_AUTHOR_POST(root)),
+        effective_date=parse_date(','.join(XPATH_EFFECTIVE_TIME(root))),
+        diagnoses=extract_diagnoses(diagnosis_values),
+        services=extract_services(service_codes),
+        instrumental_diagnostics=extract_services(instrumental_diagnostic_codes),
+        content=extract_content(root, document_type),
+    )
+
+
+def parse_date(value: str | None) -> date | None:
+    # HL7 time 'YYYYMMDD...' to date
+    if not isinstance(value, str) or len(value) < 8:
+        return None
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        return None
+
+
+def unescape_value(value: str | None) -> str | None:
+    # Some display names are escaped twice in SEMDs
+    return unescape(value) if isinstance(value, str) else None
+
+
+def extract_code_node(node: etree._Element) -> CdaCodeNode:
+    code = node.find(TAG_CODE)
+    if code is None:
+        return EMPTY_CODE_NODE
+    return CdaCodeNode(
+        code.get('code'),
+        unescape_value(code.get('displayName')),
+        code.get('codeSystem'),
+        code.get('codeSystemVersion'),
+        unescape_value(code.get('codeSystemName')),
+    )
+
+
+def extract_effective_date(node: etree._Element, is_low_allowed: bool = True) -> date | None:
+    effective_time = node.find(TAG_EFFECTIVE_TIME)
+    if effective_time is None:
+        return None
+    value = effective_time.get('value')
+    if value is None and is_low_allowed:
+        low = effective_time.find(TAG_LOW)
+        value = low.get('value') if low is not None else None
+    return parse_date(value)
+
+
+def extract_diagnoses(values: List[etree._Element]) -> Tuple[CdaDiagnosis, ...]:
+    diagnoses = dict()
+    parents = dict()
+    observations = set()
+    for value in values:
+        observation = value.getparent()
+        # Only the first diagnosis value of observation is used
+        if observation in observations or not value.get('code'):
+            continue
+        observations.add(observation)
+
+        parent = observation.getparent().getparent()
+        parent_nodes = parents.get(parent, None)
+        if parent_nodes is None:
+            parent_nodes = parents[parent] = (
+                etree.QName(parent).localname,
+                parent.get('classCode'),
+                extract_code_node(parent),
+            )
+
+        diagnosis = CdaDiagnosis(
+            value.get('code'),
+            unescape_value(value.get('displayName')),
+            extract_effective_date(observation, is_low_allowed=False),
+            *parent_nodes,
+            extract_code_node(observation),
+        )
+        diagnoses[diagnosis] = None
+
+    return tuple(diagnoses)
+
+
+def extract_services(nodes: List[etree._Element]) -> Tuple[CdaService, ...]:
+    services = dict()
+    parents = set()
+    for node in nodes:
+        # Only the first coded node of parent is used
+        parent = node.getparent()
+        if parent in parents:
+            continue
+        parents.add(parent)
+
+        code = node.get('code')
+        if code:
+            services[CdaService(code, extract_effective_date(parent))] = None
+
+    return tuple(services)
+
+
+def extract_cda_content(payload: str | bytes, document_type: str | None) -> dict | str:
+    """
+        Parse ClinicalDocument and extract only content of document type
+    """
+    return extract_content(parse_cda(payload), document_type)
+
+
+def extract_content(root: etree._Element, document_type: str | None) -> dict | str:
+    """
+        Content of document by document type: values of fields or CONTENT_NOT_ANALYZED
+    """
+    fields = CONTENT_XPATHS.get(document_type, None)
+    if fields is None:
+        return CONTENT_NOT_ANALYZED
+
+    values = dict()
+    for name, separator, xpath, is_text in fields:
+        value = separator.join(xpath(root))
+        values[name] = value.replace('\n', ' ') if is_text else value
+
+    return build_content(document_type, values)
+
+
+def format_hl7_date(value: str) -> str:
+    # HL7 time 'YYYYMMDD...' to 'YYYY-MM-DD'
+    return value[0:4] + '-' + value[4:6] + '-' + value[6:8]
+
+
+def get_indicator(value: str) -> str:
+    return value if len(value) >= INDICATOR_MIN_LENGTH else ''
+
+
+def build_content(document_type: str, values: dict) -> dict:
+    if document_type in ('2', '20'):
+        return {
+            'protocol': get_indicator(values['protocol']),
+            'conclusion': get_indicator(values['conclusion']),
+            'recommendation': get_indicator(values['recommendation']),
+        }
+
+    if document_type == '5':
+        return {
+            'protocol': get_indicator(values['protocol'] + values['protocol2']),
+            'conclusion': get_indicator(values['conclusion'] + values['conclusion2']),
+            'recommendation': get_indicator(values['recommendation']),
+        }
+
+    if document_type == '6':
+        return {
+            'date': format_hl7_date(values['date'] or values['date2']),
+            'number': values['number'] + values['number2'],
+            'purpose': values['purpose'],
+            'form': values['form'],
+            'conclusion': values['conclusion'],
+            'diagnostics': '',
+            'laboratory_tests': '',
+            'treatments': ''
+        }
+
+    if document_type == '8':
+        content = {
+            'date_start': format_hl7_date(values['date_start'] or values['date_start2'].split(';')[0]),
+            'date_end': format_hl7_date(values['date_end'] or values['date_end2'].split(';')[-1]),
+            'stateadm': values['stateadm'].split(';')[0],
+            'statedis': values['statedis'].split(';')[0],
+        }
+        for name in ('urgency', 'result', 'consultations', 'diagnostics', 'laboratory_tests', 'morphology_tests',
+                     'sum_drug', 'ray_therapy', 'chemo_therapy', 'hormone_therapy', 'sur'):
+            content[name] = values[name]
+        return content
+
+    if document_type == '12':
+        return {
+            **values,
+            'date_start': format_hl7_date(values['date_start']),
+            'date_end': format_hl7_date(values['date_end']),
+        }
+
+    return values
@@ -0,0 +1,187 @@
+import io
+import json
+import time
+from datetime import date, datetime
+from typing import Iterable, Type
+
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from api.models.semd_models import OncorSettings, SemdDiagnosis, SemdService
+from backend.settings import CUBES_LOAD_BATCH_SIZE, CUBES_LOAD_MEMORY_CAP_MB
+
+# Columns of cube rows which are loaded by bulk loader
+SEMD_DIAGNOSIS_COLUMNS = (
+    'ptn_id', 'ptn_code', 'ptn_mo_oid', 'ptn_tags', 'rc_id', 'time_rc', 'document_type', 'nsi_doc_type', 'profile',
+    'author_mo_oid', 'author_snils', 'author_post', 'internal_message_id',
+    'diagnosis_mkb10', 'diagnosis_date', 'diagnosis_code1379', 'diagnosis_code1076', 'diagnosis_code1077',
+    'diagnosis_name', 'diagnosis_code1076_name', 'diagnosis_code1077_name', 'parent_node_name',
+    'parent_node_class_code',
+)
+SEMD_SERVICE_COLUMNS = (
+    'ptn_id', 'ptn_code', 'ptn_mo_oid', 'ptn_tags', 'rc_id', 'time_rc', 'document_type', 'nsi_doc_type', 'profile',
+    'author_mo_oid', 'author_snils', 'author_post', 'internal_message_id',
+    'service_code', 'service_date', 'instrumental_diagnostics_code',
+)
+
+# Methods of writing batches
+LOAD_METHOD_COPY = 'copy'
+LOAD_METHOD_BULK_CREATE = 'bulk_create'
+LOAD_METHODS = (LOAD_METHOD_COPY, LOAD_METHOD_BULK_CREATE)
+
+# Code of setting with definitions of indexes dropped for bulk load, they are recreated by the next load
+# if the previous one was interrupted
+CUBES_DEFERRED_INDEXES_CODE = 'cubes_deferred_indexes'
+
+# Escaping of values in text format of COPY
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def encode_copy_value(value) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CubeBulkLoader:
+    """
+        Buffered loader of cube rows (tuples of values of columns). Buffer is written to table by one COPY FROM STDIN
+        (or one bulk_create) when it has batch size rows or its text exceeds memory cap.
+    """
+
+    def __init__(self, model: Type[models.Model], columns: tuple, method: str = LOAD_METHOD_COPY,
+                 batch_size: int = CUBES_LOAD_BATCH_SIZE, memory_cap: int = CUBES_LOAD_MEMORY_CAP_MB * 2 ** 20):
+        if method not in LOAD_METHODS:
+            raise ValueError(f"Load method {method} is not valid, valid methods: {', '.join(LOAD_METHODS)}")
+
+        self.model = model
+        self.columns = columns
+        self.method = method
+        self.batch_size = batch_size
+        self.memory_cap = memory_cap
+        self.copy_sql = 'COPY ' + model._meta.db_table + ' (' + ', '.join(columns) + ') FROM STDIN'
+
+        self.rows = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+        self._buffer = list()
+        self._buffer_size = 0
+
+    def add(self, row: tuple):
+        line = '\t'.join(encode_copy_value(value) for value in row) + '\n'
+        self._buffer.append(line if self.method == LOAD_METHOD_COPY else row)
+        self._buffer_size += len(line)
+        if len(self._buffer) >= self.batch_size or self._buffer_size >= self.memory_cap:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        start = time.perf_counter()
+        if self.method == LOAD_METHOD_COPY:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(self.copy_sql, io.StringIO(''.join(self._buffer)))
+        else:
+            self.model.objects.bulk_create(
+                [self.model(**dict(zip(self.columns, row))) for row in self._buffer], batch_size=self.batch_size
+            )
+        self.elapsed += time.perf_counter() - start
+
+        self.rows += len(self._buffer)
+        self.batches += 1
+        self._buffer = list()
+        self._buffer_size = 0
+
+    def close(self):
+        self.flush()
+
+    def stats(self) -> str:
+        rate = self.rows / self.elapsed if self.elapsed else 0.0
+        return f"{self.model._meta.db_table}: {self.rows} rows in {self.batches} batches, " \
+               f"{self.elapsed:.3f}s, {rate:.0f} rows/s"
+
+
+def get_secondary_indexes(table: str) -> dict:
+    """
+        Definitions of indexes of table which are not constraints (name -> CREATE INDEX statement)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT
+                indexname, indexdef
+            FROM
+                pg_indexes
+            WHERE
+                schemaname = current_schema() AND
+                tablename = %s AND
+                indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)
+        """, [table, table])
+        return dict(cursor.fetchall())
+
+
+def restore_deferred_indexes() -> int:
+    """
+        Recreate indexes dropped by interrupted bulk load. Returns count of recreated indexes.
+    """
+    try:
+        definitions = OncorSettings.objects.get(code=CUBES_DEFERRED_INDEXES_CODE).value or dict()
+    except OncorSettings.DoesNotExist:
+        return 0
+
+    with connection.cursor() as cursor:
+        for definition in definitions.values():
+            cursor.execute(definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1))
+    OncorSettings.objects.filter(code=CUBES_DEFERRED_INDEXES_CODE).delete()
+
+    return len(definitions)
+
+
+def start_cube_bulk_load(cube_models: Iterable[Type[models.Model]], defer_indexes: bool = False):
+    """
+        Start bulk load of cubes: if defer indexes, secondary indexes of cubes are dropped until the end of load
+        (their definitions are kept in settings), else indexes dropped by interrupted load are recreated
+    """
+    if defer_indexes and OncorSettings.objects.filter(code=CUBES_DEFERRED_INDEXES_CODE).exists():
+        print("    Indexes of cubes are already dropped by interrupted load")
+        return
+    restore_deferred_indexes()
+    if not defer_indexes:
+        return
+
+    definitions = dict()
+    for model in cube_models:
+        definitions.update(get_secondary_indexes(model._meta.db_table))
+    with transaction.atomic():
+        OncorSettings.objects.update_or_create(code=CUBES_DEFERRED_INDEXES_CODE, defaults={'value': definitions})
+        with connection.cursor() as cursor:
+            for name in definitions:
+                cursor.execute('DROP INDEX IF EXISTS "' + name + '"')
+    print(f"    {len(definitions)} indexes of cubes were dropped until the end of load")
+
+
+def finish_cube_bulk_load(cube_models: Iterable[Type[models.Model]]):
+    """
+        Finish bulk load of cubes: deferred indexes are recreated and cubes are analyzed
+    """
+    start = time.perf_counter()
+    indexes = restore_deferred_indexes()
+    with connection.cursor() as cursor:
+        for model in cube_models:
+            cursor.execute('ANALYZE ' + model._meta.db_table)
+    print(f"    {indexes} indexes of cubes were recreated and cubes were analyzed "
+          f"in {time.perf_counter() - start:.3f}s")
+
+
+def get_semd_cubes_loaders(method: str = LOAD_METHOD_COPY) -> (CubeBulkLoader, CubeBulkLoader):
+    return (CubeBulkLoader(SemdDiagnosis, SEMD_DIAGNOSIS_COLUMNS, method=method),
+            CubeBulkLoader(SemdService, SEMD_SERVICE_COLUMNS, method=method))
@@ -1,52 +1,229 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
 from collections import OrderedDict
+from typing import List, Tuple
 
 from django.db import connections
 
+from api.utils.directory_snapshot_utils import DirectorySnapshot, SnapshotDirectoryIndex
+from backend.settings import DIRECTORY_CACHE_CHECK_INTERVAL, DIRECTORY_SNAPSHOT_PATH
 
-def expand_diagnoses(diagnoses_str: str) -> set:
-    result_set = set()
+# Passports of NSI directories
+MKB10_PASSPORT_OID = '1.2.643.5.1.13.13.11.1005'
+SERVICES_PASSPORT_OID = '1.2.643.5.1.13.13.11.1070'
+MOS_PASSPORT_OID = '1.2.643.5.1.13.13.11.1461'
+INSTRUMENTAL_DIAGNOSTICS_PASSPORT_OID = '1.2.643.5.1.13.13.11.1471'
+MO_DEPARTMENTS_PASSPORT_OID = '1.2.643.5.1.13.13.99.2.114'
 
-    diagnoses = diagnoses_str.split(',')
-    for diagnosis in diagnoses:
-        diagnosis = diagnosis.strip()
-        if not diagnosis:
-            continue
+# Passport -> key of directory json which value is kept in cache (None if json is not needed)
+DIRECTORY_PASSPORTS = OrderedDict([
+    (MKB10_PASSPORT_OID, None),
+    (SERVICES_PASSPORT_OID, None),
+    (MOS_PASSPORT_OID, 'areaName'),
+    (INSTRUMENTAL_DIAGNOSTICS_PASSPORT_OID, 'NMU'),
+    (MO_DEPARTMENTS_PASSPORT_OID, None),
+])
 
-        diagnosis_from_to = diagnosis.split('-')
-        if len(diagnosis_from_to) == 1:
-            diagnosis_from = diagnosis_from_to[0].strip()
-            diagnosis_to = diagnosis_from + 'я'
-        else:
-            diagnosis_from = diagnosis_from_to[0].strip()
-            diagnosis_to = diagnosis_from_to[1].strip()
 
-        query_body = """
-            SELECT
-                code,
-                name
-            FROM 
-                directory
-            WHERE
-                passport_oid='1.2.643.5.1.13.13.11.1005' AND
-                NOT code like '%-%' AND
-                code>='""" + diagnosis_from + """' AND
-                code<'""" + diagnosis_to + "'"
-        with connections['rosminzdrav-directories'].cursor() as cursor:
-            cursor.execute(query_body)
-            directory_diagnoses = cursor.fetchall()
+class DirectoryIndex:
+    """
+        Immutable index of all records of one directory passport (of all versions, later versions override
+        earlier ones in lookups by id and oid)
+    """
 
-        for directory_diagnosis in directory_diagnoses:
-            if directory_diagnosis[0]:
-                result_set = result_set.union({(directory_diagnosis[0], directory_diagnosis[1])})
+    def __init__(self, passport_oid: str, signature: str | None, rows: List[tuple]):
+        self.passport_oid = passport_oid
+        self.signature = signature
+        self.size = len(rows)
+
+        # Sorted distinct (code, name) pairs as parallel arrays for range lookups
+        pairs = sorted({(code, name) for _, code, _, name, _ in rows if code})
+        self.codes = [code for code, _ in pairs]
+        self.names = [name for _, name in pairs]
+
+        self.by_oid = dict()
+        self.by_id = dict()
+        for row_id, _, oid, name, value in rows:
+            if oid:
+                self.by_oid[oid] = (name, value)
+            self.by_id[row_id] = value
+
+    def get_range(self, code_from: str, code_to: str) -> List[Tuple[str, str]]:
+        """
+            (code, name) pairs of codes from code_from inclusive to code_to exclusive
+        """
+        lo = bisect_left(self.codes, code_from)
+        hi = bisect_left(self.codes, code_to, lo)
+        return list(zip(self.codes[lo:hi], self.names[lo:hi]))
+
+    def get_codes(self, codes: set) -> List[Tuple[str, str]]:
+        """
+            (code, name) pairs of codes
+        """
+        result = list()
+        for code in codes:
+            idx = bisect_left(self.codes, code)
+            while idx < len(self.codes) and self.codes[idx] == code:
+                result.append((code, self.names[idx]))
+                idx += 1
+        return result
+
+    def get_by_oid(self, oid: str | None) -> Tuple[str | None, str | None] | None:
+        """
+            (name, json value) of record with oid
+        """
+        return self.by_oid.get(oid, None)
+
+    def get_by_id(self, row_id: str | None) -> str | None:
+        """
+            json value of record with id
+        """
+        return self.by_id.get(row_id, None)
+
+
+class DirectoryCache:
+    """
+        Process-wide cache of NSI directories of rosminzdrav-directories database.
+        Every passport is loaded by one query on first request and reloaded only when its versions are changed.
+        Versions of all passports are checked by one query not more often than once in check interval.
+        If snapshot path is set, passports of the same versions are taken from memory-mapped snapshot file
+        instead of loading.
+    """
 
-    return result_set
+    def __init__(self, check_interval: float = 300, snapshot_path: str = ''):
+        self.check_interval = check_interval
+        self.snapshot_path = snapshot_path
+        self.version = None
+        self.loads = 0
+
+        self._lock = threading.Lock()
+        self._signatures = None
+        self._checked_at = 0.0
+        self._indexes = dict()
+        self._snapshot = None
+
+    def _check(self):
+        if self._signatures is not None and time.monotonic() - self._checked_at <= self.check_interval:
+            return
+
+        self._signatures = get_directory_signatures()
+        self.version = hashlib.sha1(json.dumps(self._signatures, sort_keys=True).encode('utf-8')).hexdigest()
+        self._checked_at = time.monotonic()
+
+    def _get_snapshot(self) -> DirectorySnapshot | None:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        # Snapshot file could be rebuilt after it was mapped
+        if self._snapshot is None or self._snapshot.mtime != os.stat(self.snapshot_path).st_mtime:
+            try:
+                self._snapshot = DirectorySnapshot(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                print(f"Directory snapshot error: {str(e)}")
+                self._snapshot = None
+        return self._snapshot
+
+    def _load(self, passport_oid: str) -> DirectoryIndex:
+        rows = load_directory_rows(passport_oid)
+        self.loads += 1
+        return DirectoryIndex(passport_oid, self._signatures.get(passport_oid, None), rows)
+
+    def get(self, passport_oid: str) -> DirectoryIndex | SnapshotDirectoryIndex:
+        with self._lock:
+            self._check()
+            signature = self._signatures.get(passport_oid, None)
+            index = self._indexes.get(passport_oid, None)
+            if index is None or index.signature != signature:
+                snapshot = self._get_snapshot()
+                if snapshot is not None and snapshot.signatures.get(passport_oid, '') == signature:
+                    index = snapshot.indexes[passport_oid]
+                else:
+                    index = self._load(passport_oid)
+                self._indexes[passport_oid] = index
+            return index
+
+    def get_version(self) -> str | None:
+        """
+            Version of all directories (hash of versions of passports)
+        """
+        with self._lock:
+            self._check()
+            return self.version
+
+    def invalidate(self):
+        """
+            Drop all directories, they will be loaded on next request
+        """
+        with self._lock:
+            self._signatures = None
+            self._indexes = dict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'version': self.version,
+                'passports': {passport_oid: index.size for passport_oid, index in self._indexes.items()},
+                'age': None if self._signatures is None else time.monotonic() - self._checked_at,
+                'loads': self.loads,
+            }
+
+
+def get_directory_signatures() -> dict:
+    """
+        Signatures of passports: versions and count of records
+    """
+    query_body = """
+        SELECT
+            passport_oid,
+            string_agg(DISTINCT version, ',' ORDER BY version) || ':' || COUNT(*)
+        FROM
+            directory
+        WHERE
+            passport_oid IN (""" + ','.join(["'" + passport_oid + "'" for passport_oid in DIRECTORY_PASSPORTS]) + """)
+        GROUP BY
+            passport_oid
+    """
+    with connections['rosminzdrav-directories'].cursor() as cursor:
+        cursor.execute(query_body)
+        return dict(cursor.fetchall())
 
 
-def expand_diagnoses_only_codes(diagnoses_str: str) -> set:
-    result_set = set()
+def load_directory_rows(passport_oid: str) -> List[tuple]:
+    """
+        Records (id, code, oid, name, json value) of passport ordered by version
+    """
+    json_key = DIRECTORY_PASSPORTS[passport_oid]
+    query_body = """
+        SELECT
+            id,
+            code,
+            oid,
+            name,
+            """ + ("json->>'" + json_key + "'" if json_key else 'NULL') + """
+        FROM
+            directory
+        WHERE
+            passport_oid='""" + passport_oid + """'
+        ORDER BY
+            version
+    """
+    with connections['rosminzdrav-directories'].cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+directory_cache = DirectoryCache(check_interval=DIRECTORY_CACHE_CHECK_INTERVAL, snapshot_path=DIRECTORY_SNAPSHOT_PATH)
 
-    diagnoses = diagnoses_str.split(',')
-    for diagnosis in diagnoses:
+
+def get_diagnoses_ranges(diagnoses_str: str) -> List[Tuple[str, str]]:
+    """
+        Ranges of diagnoses template: 'C50, D00-D09' -> [('C50', 'C50я'), ('D00', 'D09')]
+    """
+    ranges = list()
+    for diagnosis in diagnoses_str.split(','):
         diagnosis = diagnosis.strip()
         if not diagnosis:
             continue
@@ -58,93 +235,39 @@ def expand_diagnoses_only_codes(diagnoses_str: str) -> set:
         else:
             diagnosis_from = diagnosis_from_to[0].strip()
             diagnosis_to = diagnosis_from_to[1].strip()
+        ranges.append((diagnosis_from, diagnosis_to))
 
-        query_body = """
-            SELECT
-                code
-            FROM 
-                directory
-            WHERE
-                passport_oid='1.2.643.5.1.13.13.11.1005' AND
-                NOT code like '%-%' AND
-                code>='""" + diagnosis_from + """' AND
-                code<'""" + diagnosis_to + "'"
-        with connections['rosminzdrav-directories'].cursor() as cursor:
-            cursor.execute(query_body)
-            directory_diagnoses = cursor.fetchall()
-
-        for directory_diagnosis in directory_diagnoses:
-            if directory_diagnosis[0]:
-                result_set = result_set.union({directory_diagnosis[0]})
-
-    return result_set
+    return ranges
 
 
-def expand_services(services: list) -> set:
-    result_set = set()
+def expand_diagnoses(diagnoses_str: str) -> set:
+    index = directory_cache.get(MKB10_PASSPORT_OID)
+    return {
+        (code, name)
+        for diagnosis_from, diagnosis_to in get_diagnoses_ranges(diagnoses_str)
+        for code, name in index.get_range(diagnosis_from, diagnosis_to)
+        if '-' not in code
+    }
 
-    quoted_services = ["'" + service.strip() + "'" for service in services]
 
-    query_body = """
-        SELECT
-            code,
-            name
-        FROM 
-            directory
-        WHERE
-            passport_oid='1.2.643.5.1.13.13.11.1070' AND
-            code in (""" + ','.join(quoted_services) + ')'
-    with connections['rosminzdrav-directories'].cursor() as cursor:
-        cursor.execute(query_body)
-        directory_services = cursor.fetchall()
+def expand_diagnoses_only_codes(diagnoses_str: str) -> set:
+    return {code for code, name in expand_diagnoses(diagnoses_str)}
 
-    for directory_service in directory_services:
-        if directory_service[0]:
-            result_set = result_set.union({(directory_service[0], directory_service[1])})
 
-    return result_set
+def expand_services(services: list) -> set:
+    return set(directory_cache.get(SERVICES_PASSPORT_OID).get_codes({service.strip() for service in services}))
 
 
 def expand_services_only_codes(services: list) -> set:
-    result_set = set()
-
-    quoted_services = ["'" + service.strip() + "'" for service in services]
-
-    query_body = """
-        SELECT
-            code
-        FROM 
-            directory
-        WHERE
-            passport_oid='1.2.643.5.1.13.13.11.1070' AND
-            code in (""" + ','.join(quoted_services) + ')'
-    with connections['rosminzdrav-directories'].cursor() as cursor:
-        cursor.execute(query_body)
-        directory_services = cursor.fetchall()
-
-    for directory_service in directory_services:
-        if directory_service[0]:
-            result_set = result_set.union({directory_service[0]})
-
-    return result_set
+    return {code for code, name in expand_services(services)}
 
 
 def expand_mos(mo_oids: set) -> list:
-    query_body = """
-        SELECT
-            oid,
-            name
-        FROM 
-            directory
-        WHERE
-            passport_oid='1.2.643.5.1.13.13.11.1461' AND
-            oid in (""" + ','.join(["'" + mo_oid + "'" for mo_oid in mo_oids]) + """)
-        ORDER BY
-            name
-    """
-    with connections['rosminzdrav-directories'].cursor() as cursor:
-        cursor.execute(query_body)
-        directory_mos = cursor.fetchall()
+    index = directory_cache.get(MOS_PASSPORT_OID)
+    directory_mos = sorted(
+        [(mo_oid, mo[0]) for mo_oid, mo in ((mo_oid, index.get_by_oid(mo_oid)) for mo_oid in mo_oids) if mo],
+        key=lambda x: (x[1], x[0])
+    )
 
     result = [
         OrderedDict([
@@ -157,3 +280,20 @@ def expand_mos(mo_oids: set) -> list:
     return result
 
 
+def get_mo(mo_oid: str | None) -> Tuple[str | None, str | None]:
+    """
+        (name, area name) of medical organization, (None, None) if it is not found
+    """
+    return directory_cache.get(MOS_PASSPORT_OID).get_by_oid(mo_oid) or (None, None)
+
+
+def get_mo_department_name(department_oid: str | None) -> str | None:
+    return (directory_cache.get(MO_DEPARTMENTS_PASSPORT_OID).get_by_oid(department_oid) or (None, None))[0]
+
+
+def get_instrumental_diagnostic_services(instrumental_diagnostic_id: str) -> List[str]:
+    """
+        Codes of services (НМУ) of instrumental diagnostic
+    """
+    services = directory_cache.get(INSTRUMENTAL_DIAGNOSTICS_PASSPORT_OID).get_by_id(instrumental_diagnostic_id)
+    return services.split('; ') if services else list()
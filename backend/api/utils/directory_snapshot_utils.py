@@ -0,0 +1,190 @@
+import json
+import mmap
+import os
+import struct
+from bisect import bisect_left
+from typing import List, Tuple
+
+# Snapshot file layout (all integers are little-endian uint32):
+#   magic, length of header, header (json: passports with signatures and offsets of their tables, strings blob),
+#   tables of records (key, value 1, value 2 as (offset, length) in strings blob), strings blob.
+# Records of every table are sorted by key, so lookups are binary searches over mapped file.
+SNAPSHOT_MAGIC = b'ONCNSI01'
+SNAPSHOT_RECORD = struct.Struct('<6I')
+SNAPSHOT_LENGTH = struct.Struct('<I')
+# Length of None string
+SNAPSHOT_NULL = 0xFFFFFFFF
+
+
+class SnapshotTable:
+    """
+        Sorted table of mapped snapshot: keys are accessed by index, so the table can be searched by bisect
+    """
+
+    def __init__(self, snapshot: 'DirectorySnapshot', offset: int, count: int):
+        self._snapshot = snapshot
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, idx: int) -> str:
+        return self.get_record(idx)[0]
+
+    def get_record(self, idx: int) -> Tuple[str | None, str | None, str | None]:
+        if idx < 0 or idx >= self._count:
+            raise IndexError(idx)
+        values = SNAPSHOT_RECORD.unpack_from(self._snapshot.buffer, self._offset + idx * SNAPSHOT_RECORD.size)
+        return tuple(self._snapshot.get_string(values[i], values[i + 1]) for i in range(0, 6, 2))
+
+    def find(self, key: str) -> Tuple[str | None, str | None, str | None] | None:
+        idx = bisect_left(self, key)
+        if idx < self._count:
+            record = self.get_record(idx)
+            if record[0] == key:
+                return record
+        return None
+
+
+class SnapshotDirectoryIndex:
+    """
+        Directory index of one passport in mapped snapshot (the same lookups as DirectoryIndex)
+    """
+
+    def __init__(self, snapshot: 'DirectorySnapshot', passport_oid: str, passport: dict):
+        self.passport_oid = passport_oid
+        self.signature = passport['signature']
+        self.size = passport['size']
+        self._codes = SnapshotTable(snapshot, *passport['codes'])
+        self._oids = SnapshotTable(snapshot, *passport['oids'])
+        self._ids = SnapshotTable(snapshot, *passport['ids'])
+
+    def get_range(self, code_from: str, code_to: str) -> List[Tuple[str, str]]:
+        lo = bisect_left(self._codes, code_from)
+        hi = bisect_left(self._codes, code_to, lo)
+        return [self._codes.get_record(idx)[:2] for idx in range(lo, hi)]
+
+    def get_codes(self, codes: set) -> List[Tuple[str, str]]:
+        result = list()
+        for code in codes:
+            idx = bisect_left(self._codes, code)
+            while idx < len(self._codes):
+                record = self._codes.get_record(idx)
+                if record[0] != code:
+                    break
+                result.append(record[:2])
+                idx += 1
+        return result
+
+    def get_by_oid(self, oid: str | None) -> Tuple[str | None, str | None] | None:
+        record = self._oids.find(oid) if oid else None
+        return None if record is None else record[1:]
+
+    def get_by_id(self, row_id: str | None) -> str | None:
+        record = self._ids.find(row_id) if row_id else None
+        return None if record is None else record[1]
+
+
+class DirectorySnapshot:
+    """
+        Read-only snapshot of directories mapped to memory: all processes share one copy of file in page cache
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self.buffer.close()
+            raise ValueError(f"File {path} is not directory snapshot")
+        header_length, = SNAPSHOT_LENGTH.unpack_from(self.buffer, len(SNAPSHOT_MAGIC))
+        header_offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_LENGTH.size
+        header = json.loads(self.buffer[header_offset:header_offset + header_length].decode('utf-8'))
+
+        self.strings_offset = header['strings']
+        self.signatures = {passport_oid: passport['signature'] for passport_oid, passport in header['passports'].items()}
+        self.indexes = {
+            passport_oid: SnapshotDirectoryIndex(self, passport_oid, passport)
+            for passport_oid, passport in header['passports'].items()
+        }
+        self.mtime = os.stat(path).st_mtime
+
+    def get_string(self, offset: int, length: int) -> str | None:
+        if length == SNAPSHOT_NULL:
+            return None
+        start = self.strings_offset + offset
+        return self.buffer[start:start + length].decode('utf-8')
+
+    def close(self):
+        self.buffer.close()
+
+
+def write_directory_snapshot(path: str, indexes: dict) -> int:
+    """
+        Write snapshot of directory indexes (passport -> DirectoryIndex) to file, file is replaced atomically.
+        Returns size of snapshot.
+    """
+    strings = bytearray()
+    string_offsets = dict()
+
+    def add_string(value: str | None) -> Tuple[int, int]:
+        if value is None:
+            return 0, SNAPSHOT_NULL
+        if value not in string_offsets:
+            encoded = value.encode('utf-8')
+            string_offsets[value] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_offsets[value]
+
+    tables = list()
+    passports = dict()
+    for passport_oid, index in indexes.items():
+        passport = {'signature': index.signature, 'size': index.size}
+        for table, records in (
+            ('codes', list(zip(index.codes, index.names, [None] * len(index.codes)))),
+            ('oids', [(oid, name, value) for oid, (name, value) in sorted(index.by_oid.items())]),
+            ('ids', sorted((row_id, value, None) for row_id, value in index.by_id.items() if row_id is not None)),
+        ):
+            packed = b''.join(
+                SNAPSHOT_RECORD.pack(*add_string(key), *add_string(value1), *add_string(value2))
+                for key, value1, value2 in records
+            )
+            passport[table] = [len(tables), len(records)]
+            tables.append(packed)
+        passports[passport_oid] = passport
+
+    # Offsets of tables depend on length of header, so header is padded to its length with the largest offsets
+    def get_header(offsets: List[int], strings_offset: int) -> bytes:
+        header = {
+            'passports': {
+                passport_oid: dict(passport, **{
+                    table: [offsets[passport[table][0]], passport[table][1]] for table in ('codes', 'oids', 'ids')
+                })
+                for passport_oid, passport in passports.items()
+            },
+            'strings': strings_offset,
+        }
+        return json.dumps(header).encode('utf-8')
+
+    data_offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_LENGTH.size + \
+        len(get_header([10 ** 12] * len(tables), 10 ** 12))
+    offsets = list()
+    offset = data_offset
+    for packed in tables:
+        offsets.append(offset)
+        offset += len(packed)
+    header = get_header(offsets, offset).ljust(data_offset - len(SNAPSHOT_MAGIC) - SNAPSHOT_LENGTH.size)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(SNAPSHOT_LENGTH.pack(len(header)))
+        f.write(header)
+        for packed in tables:
+            f.write(packed)
+        f.write(strings)
+    os.replace(tmp_path, path)
+
+    return offset + len(strings)
@@ -0,0 +1,220 @@
+from datetime import date, datetime
+from typing import List, Tuple
+
+from api.models.orientdb_engine import orient_db_pool
+from api.models.semd_models import OncorSettings, SemdExtraction
+from api.utils.directories_utils import get_instrumental_diagnostic_services
+from api.utils.semd_extraction_utils import extract_semds
+from backend.settings import SERVICE_BY_POST
+
+# Code of setting with ledger of fill cubes run: chunks of patients and indexes of chunks already loaded to cubes
+FILL_CUBES_LEDGER_CODE = 'fill_cubes_ledger'
+
+
+def parse_rid(rid: str) -> Tuple[int, int]:
+    """
+        (cluster, position) of OrientDB record id '#cluster:position'
+    """
+    cluster, position = rid.lstrip('#').split(':')
+    return int(cluster), int(position)
+
+
+def get_patients_chunks(chunk_size: int) -> List[List[str]]:
+    """
+        Ranges [first rid, last rid] of patients split by chunks of chunk size patients in order of rids
+    """
+    rids = sorted(
+        {str(patient.oRecordData.get('rid', None)) for patient in orient_db_pool.query('SELECT @rid FROM ptn', -1)
+         if patient.oRecordData.get('rid', None)},
+        key=parse_rid
+    )
+    return [[rids[k], rids[min(k + chunk_size, len(rids)) - 1]] for k in range(0, len(rids), chunk_size)]
+
+
+def get_fill_cubes_ledger() -> dict | None:
+    try:
+        return OncorSettings.objects.get(code=FILL_CUBES_LEDGER_CODE).value
+    except OncorSettings.DoesNotExist:
+        return None
+
+
+def set_fill_cubes_ledger(ledger: dict | None):
+    if ledger is None:
+        OncorSettings.objects.filter(code=FILL_CUBES_LEDGER_CODE).delete()
+    else:
+        OncorSettings.objects.update_or_create(code=FILL_CUBES_LEDGER_CODE, defaults={'value': ledger})
+
+
+def new_fill_cubes_ledger(watermark: datetime | None, erase_cubes: bool, chunks: List[List[str]]) -> dict:
+    ledger = {
+        'watermark': watermark.isoformat() if watermark else None,
+        'erase_cubes': erase_cubes,
+        'chunks': chunks,
+        'done': list(),
+    }
+    set_fill_cubes_ledger(ledger)
+    return ledger
+
+
+def mark_fill_cubes_chunk_done(ledger: dict, idx: int):
+    """
+        Mark chunk as loaded, it must be called in transaction of writing rows of chunk
+    """
+    ledger['done'].append(idx)
+    set_fill_cubes_ledger(ledger)
+
+
+def init_fill_cubes_worker():
+    """
+        Initializer of forked worker process: OrientDB connections of parent process must not be used by worker
+        (Django connections are closed by parent before fork)
+    """
+    orient_db_pool.reset_after_fork()
+
+
+def query_patients(condition: str) -> dict:
+    """
+        Patients with condition: ptn_id -> (ptn_id, ptn_code, ptn_mo_oid, ptn_tags)
+    """
+    query_body = """
+        SELECT
+            @rid,
+            person.code as code,
+            observer.nsiMedOrg.oid as mo_oid,
+            tags.tags.tag as tags
+        FROM
+            ptn
+        WHERE
+            """ + condition + """
+    """
+    patients = dict()
+    for patient in orient_db_pool.query(query_body, -1):
+        ptn_id = str(patient.oRecordData.get('rid', None))
+        if not ptn_id:
+            continue
+        ptn_tags = [] \
+            if patient.oRecordData.get('tags', None) is None \
+            else [str(rid) for rid in patient.oRecordData.get('tags', None)]
+        patients[ptn_id] = (ptn_id, patient.oRecordData.get('code', None), patient.oRecordData.get('mo_oid', None),
+                            ptn_tags)
+
+    return patients
+
+
+def process_patients_chunk(chunk: Tuple[int, str, str]) -> Tuple[int, int, int, list, list]:
+    """
+        Rows of cubes of patients of chunk (idx, first rid, last rid).
+        Returns (idx, count of patients, count of SEMDs, diagnoses rows, services rows).
+    """
+    idx, first_rid, last_rid = chunk
+
+    # Get patients of chunk
+    patients = query_patients('@rid >= ' + first_rid + ' AND @rid <= ' + last_rid)
+
+    if not patients:
+        return idx, 0, 0, list(), list()
+
+    # Get records of all patients of chunk by one query
+    query_body = f"""
+        SELECT
+            @rid,
+            ehr.patient.@rid as ptn_rid,
+            internalMessageId
+        FROM
+            (
+                SELECT
+                    EXPAND(records)
+                FROM
+                    ptn
+                WHERE
+                    @rid IN [{','.join(patients)}]
+            )
+        WHERE
+            @class="RcSMS"
+    """
+    records = orient_db_pool.query(query_body, -1)
+
+    rc_ids = dict()
+    for record in records:
+        internal_message_id = record.oRecordData.get('internalMessageId', None)
+        ptn_id = str(record.oRecordData.get('ptn_rid', None))
+        if internal_message_id and ptn_id in patients:
+            rc_ids[internal_message_id] = (patients[ptn_id], record.oRecordData.get('rid', None))
+
+    # Get SEMDs, each payload is parsed only once and kept in extraction table
+    diagnoses_rows = list()
+    services_rows = list()
+    for internal_message_id, semd in extract_semds(list(rc_ids)).items():
+        ptn, rc_id = rc_ids[internal_message_id]
+        semd_diagnoses_rows, semd_services_rows = get_semd_cubes_rows(ptn, str(rc_id), semd)
+        diagnoses_rows += semd_diagnoses_rows
+        services_rows += semd_services_rows
+
+    return idx, len(patients), len(records), diagnoses_rows, services_rows
+
+
+def get_semd_cubes_rows(ptn: tuple, rc_id: str, semd: SemdExtraction) -> Tuple[list, list]:
+    """
+        Rows of Patient-SEMD-diagnosis and Patient-SEMD-service cubes of SEMD of patient
+        (ptn_id, ptn_code, ptn_mo_oid, ptn_tags), rows have columns of cube loaders
+    """
+    time_rc = semd.time_rc
+    document_type = semd.document_type
+    author_post = semd.author_post
+
+    # Calculate diagnoses set
+    diagnoses = set()
+    for diagnosis in semd.diagnoses:
+        parent_node_code_node = diagnosis['parent_node_code_node']
+        node_code_node = diagnosis['code_node']
+        is_code1076 = parent_node_code_node['code_system'] == '1.2.643.5.1.13.13.11.1076'
+        is_code1077 = node_code_node['code_system'] == '1.2.643.5.1.13.13.11.1077'
+        diagnoses.add(
+            (
+                diagnosis['mkb10'],
+                date.fromisoformat(diagnosis['date']) if diagnosis['date'] else None,
+                None,
+                parent_node_code_node['code'] if is_code1076 else None,
+                node_code_node['code'] if is_code1077 else None,
+                diagnosis['name'],
+                parent_node_code_node['display_name'] if is_code1076 else None,
+                node_code_node['display_name'] if is_code1077 else None,
+                diagnosis['parent_node_name'],
+                diagnosis['parent_node_class_code']
+            )
+        )
+
+    # Calculate services set
+    services = set()
+    for service in semd.services:
+        row_service_date = date.fromisoformat(service['date']) if service['date'] else None
+        if not row_service_date and document_type == '5':
+            row_service_date = time_rc.date()
+        services.add((service['code'], row_service_date, None))
+
+    # Calculate instrumental_diagnostics set if services set is empty
+    if not services:
+        instrumental_diagnostics = set()
+        for instrumental_diagnostic in semd.instrumental_diagnostics:
+            row_instrumental_diagnostics_date = \
+                date.fromisoformat(instrumental_diagnostic['date']) if instrumental_diagnostic['date'] \
+                else None
+            if not row_instrumental_diagnostics_date and document_type == '5':
+                row_instrumental_diagnostics_date = time_rc.date()
+            instrumental_diagnostics.add(
+                (instrumental_diagnostic['code'], row_instrumental_diagnostics_date)
+            )
+
+        for instrumental_diagnostic in instrumental_diagnostics:
+            for ins_diag_service in get_instrumental_diagnostic_services(instrumental_diagnostic[0]):
+                services.add((ins_diag_service, instrumental_diagnostic[1], instrumental_diagnostic[0]))
+
+        if not services and document_type == '20':
+            row_service_code = SERVICE_BY_POST.get(author_post, None)
+            if row_service_code:
+                services.add((row_service_code, time_rc.date(), None))
+
+    semd_columns = tuple(ptn) + (rc_id, time_rc, document_type, semd.nsi_doc_type, semd.profile, semd.author_mo_oid,
+                                 semd.author_snils, author_post, semd.internal_message_id)
+
+    return [semd_columns + diagnosis for diagnosis in diagnoses], [semd_columns + service for service in services]
@@ -0,0 +1,67 @@
+from django.db import connection, transaction
+
+# Milestone facts of Patient-Diagnosis cube: keys of diagnosis_milestones are 'order|rule|services:kind'
+MILESTONE_FACTS_QUERY = """
+    INSERT INTO
+        api_patientdiagnosismilestonefact (patient_diagnosis_id, code, kind, days)
+    SELECT
+        pdm.id,
+        regexp_replace(m.key, ':[^:]*$', ''),
+        substring(m.key FROM ':([^:]*)$'),
+        CASE WHEN jsonb_typeof(m.value) = 'number' THEN (m.value #>> '{}')::numeric::int END
+    FROM
+        api_patientdiagnosismilestones pdm
+        CROSS JOIN LATERAL jsonb_each(
+            CASE
+                WHEN jsonb_typeof(pdm.diagnosis_milestones) = 'object' THEN pdm.diagnosis_milestones
+                ELSE '{}'::jsonb
+            END
+        ) AS m
+    WHERE
+        m.key LIKE '%:%'
+"""
+
+
+def clear_milestone_facts():
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM api_patientdiagnosismilestonefact')
+
+
+def build_milestone_facts() -> int:
+    """
+        Rebuild milestone facts from Patient-Diagnosis cube. Returns count of facts.
+    """
+    with transaction.atomic():
+        clear_milestone_facts()
+        with connection.cursor() as cursor:
+            cursor.execute(MILESTONE_FACTS_QUERY)
+            rows = cursor.rowcount
+
+    return rows
+
+
+def clear_patients_milestone_facts(ptn_ids: list):
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            DELETE FROM
+                api_patientdiagnosismilestonefact
+            WHERE
+                patient_diagnosis_id IN (
+                    SELECT
+                        id
+                    FROM
+                        api_patientdiagnosismilestones
+                    WHERE
+                        ptn_id IN (""" + ','.join(["'" + ptn_id + "'" for ptn_id in ptn_ids]) + """)
+                )
+        """)
+
+
+def build_patients_milestone_facts(ptn_ids: list) -> int:
+    """
+        Build milestone facts of patients (their previous facts must be cleared). Returns count of facts.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(MILESTONE_FACTS_QUERY.rstrip() + """ AND
+        pdm.ptn_id IN (""" + ','.join(["'" + ptn_id + "'" for ptn_id in ptn_ids]) + ')')
+        return cursor.rowcount
@@ -0,0 +1,133 @@
+import hashlib
+from collections import OrderedDict
+from typing import Iterable
+
+from django.db import connection, transaction
+
+from api.utils.orders_rules_utils import orders_rules_cache
+
+# Lower bounds of milestone days buckets: every day of the first month, then wider buckets,
+# the last bucket holds all days from its lower bound
+MILESTONE_DAYS_BUCKETS = tuple(range(0, 31)) + (35, 40, 45, 50, 60, 75, 90, 120, 150, 180, 270, 365)
+
+# Bucket of milestone days (days must be not negative)
+MILESTONE_DAYS_BUCKET_EXPRESSION = \
+    "width_bucket({days}, ARRAY[" + ','.join(str(bound) for bound in MILESTONE_DAYS_BUCKETS) + "]) - 1"
+
+# Daily histograms of milestone facts by services group: patient-diagnosis is counted once by the first
+# milestone of any order|rule|services code of group
+MILESTONES_HISTOGRAM_QUERY = """
+    WITH
+        services_groups (codes_key, code) AS (
+            VALUES {services_groups}
+        ),
+        first_milestones AS (
+            SELECT
+                pdm.diagnosis_date,
+                sg.codes_key,
+                f.kind,
+                pdm.ptn_mo_oid,
+                MIN(f.days) AS days
+            FROM
+                api_patientdiagnosismilestonefact f
+                JOIN services_groups sg ON sg.code = f.code
+                JOIN api_patientdiagnosismilestones pdm ON pdm.id = f.patient_diagnosis_id
+            WHERE
+                f.days >= 0 AND
+                pdm.diagnosis_date IS NOT NULL
+            GROUP BY
+                pdm.id, pdm.diagnosis_date, sg.codes_key, f.kind, pdm.ptn_mo_oid
+        )
+    INSERT INTO
+        api_patientdiagnosismilestoneshistogram (diagnosis_date, codes_key, kind, ptn_mo_oid, bucket, patients_count)
+    SELECT
+        diagnosis_date,
+        codes_key,
+        kind,
+        ptn_mo_oid,
+        """ + MILESTONE_DAYS_BUCKET_EXPRESSION.format(days='days') + """,
+        COUNT(*)
+    FROM
+        first_milestones
+    GROUP BY
+        1, 2, 3, 4, 5
+"""
+
+# Percentiles of days distribution
+PERCENTILES = (('median', 0.5), ('p75', 0.75), ('p90', 0.9))
+
+
+def get_codes_key(codes: Iterable[str]) -> str:
+    """
+        Key of services group histograms: hash of order|rule|services codes of group
+    """
+    return hashlib.md5('\n'.join(sorted(set(codes))).encode('utf-8')).hexdigest()
+
+
+def get_services_groups_codes() -> list:
+    """
+        Codes of services groups of all orders (items are grouped by services as report rows are)
+    """
+    groups = dict()
+    for item in orders_rules_cache.get().items:
+        if item.code is None:
+            continue
+        groups.setdefault(item.service_codes, set()).add(item.code)
+    return list(groups.values())
+
+
+def build_milestones_histogram() -> int:
+    """
+        Rebuild daily histograms from milestone facts. Returns count of histogram rows.
+    """
+    services_groups = ','.join([
+        "('" + get_codes_key(codes) + "', '" + code + "')"
+        for codes in get_services_groups_codes()
+        for code in sorted(codes)
+    ])
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM api_patientdiagnosismilestoneshistogram')
+            if not services_groups:
+                return 0
+            cursor.execute(MILESTONES_HISTOGRAM_QUERY.format(services_groups=services_groups))
+            rows = cursor.rowcount
+
+    return rows
+
+
+def get_empty_histogram() -> list:
+    return [0] * len(MILESTONE_DAYS_BUCKETS)
+
+
+def get_histogram_percentile(histogram: list, q: float) -> float | None:
+    """
+        Percentile of days estimated by merged histogram (linear interpolation between the first and
+        the last day of bucket, lower bound for the last bucket)
+    """
+    total = sum(histogram)
+    if total == 0:
+        return None
+
+    rank = q * total
+    cumulative = 0
+    for bucket, count in enumerate(histogram):
+        if count and cumulative + count >= rank:
+            lower = MILESTONE_DAYS_BUCKETS[bucket]
+            if bucket + 1 == len(MILESTONE_DAYS_BUCKETS):
+                return float(lower)
+            upper = MILESTONE_DAYS_BUCKETS[bucket + 1]
+            return round(lower + (upper - 1 - lower) * (rank - cumulative) / count, 1)
+        cumulative += count
+
+    return float(MILESTONE_DAYS_BUCKETS[-1])
+
+
+def get_histogram_statistics(histogram: list) -> OrderedDict:
+    statistics = OrderedDict([('count', sum(histogram))])
+    for name, q in PERCENTILES:
+        statistics[name] = get_histogram_percentile(histogram, q)
+    statistics['histogram'] = histogram
+
+    return statistics
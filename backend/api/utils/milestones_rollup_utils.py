@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from api.models.semd_models import OncorSettings
+
+# Code of setting with state of milestones rollup
+MILESTONES_ROLLUP_CODE = 'milestones_rollup'
+# State of rollup is read from settings not more often than once in this period (seconds)
+MILESTONES_ROLLUP_CACHE_TIMEOUT = 60
+
+# Kinds of rollup rows
+ROLLUP_KIND_PATIENTS = ''
+ROLLUP_KIND_REFERRALS = 'нап'
+ROLLUP_KIND_PROTOCOLS = 'исп'
+
+# Rollup rows of Patient-Diagnosis cube
+MILESTONES_ROLLUP_QUERY = """
+    INSERT INTO
+        api_patientdiagnosismilestonesrollup
+            (diagnosis_date, diagnosis_mkb10, ptn_mo_oid, kind, milestone_codes, patients_count)
+    SELECT
+        diagnosis_date, diagnosis_mkb10, ptn_mo_oid, '""" + ROLLUP_KIND_PATIENTS + """', '{}'::varchar[], COUNT(*)
+    FROM
+        api_patientdiagnosismilestones
+    WHERE
+        diagnosis_date IS NOT NULL
+    GROUP BY
+        diagnosis_date, diagnosis_mkb10, ptn_mo_oid
+    UNION ALL
+    SELECT
+        pdm.diagnosis_date, pdm.diagnosis_mkb10, pdm.ptn_mo_oid, m.kind, m.milestone_codes, COUNT(*)
+    FROM
+        api_patientdiagnosismilestones pdm
+        CROSS JOIN LATERAL (
+            SELECT
+                substring(milestone FROM ':([^:]*)$') AS kind,
+                array_agg(regexp_replace(milestone, ':[^:]*$', '') ORDER BY milestone)::varchar[] AS milestone_codes
+            FROM
+                jsonb_object_keys(
+                    CASE
+                        WHEN jsonb_typeof(pdm.diagnosis_milestones) = 'object' THEN pdm.diagnosis_milestones
+                        ELSE '{}'::jsonb
+                    END
+                ) AS milestone
+            GROUP BY
+                1
+        ) AS m
+    WHERE
+        pdm.diagnosis_date IS NOT NULL AND
+        m.kind IN ('""" + ROLLUP_KIND_REFERRALS + """', '""" + ROLLUP_KIND_PROTOCOLS + """')
+    GROUP BY
+        pdm.diagnosis_date, pdm.diagnosis_mkb10, pdm.ptn_mo_oid, m.kind, m.milestone_codes
+"""
+
+
+def get_milestones_rollup_state() -> dict | None:
+    """
+        State of milestones rollup: {'built_at': ..., 'rows': ...}.
+        None means that rollup is stale: Patient-Diagnosis cube was changed after the rollup was built.
+    """
+    state = cache.get(MILESTONES_ROLLUP_CODE, '')
+    if state == '':
+        try:
+            state = OncorSettings.objects.get(code=MILESTONES_ROLLUP_CODE).value
+        except OncorSettings.DoesNotExist:
+            state = None
+        cache.set(MILESTONES_ROLLUP_CODE, state, MILESTONES_ROLLUP_CACHE_TIMEOUT)
+    return state
+
+
+def is_milestones_rollup_fresh() -> bool:
+    return get_milestones_rollup_state() is not None
+
+
+def invalidate_milestones_rollup():
+    """
+        Mark rollup as stale, it must be called before any change of Patient-Diagnosis cube
+    """
+    OncorSettings.objects.filter(code=MILESTONES_ROLLUP_CODE).delete()
+    cache.delete(MILESTONES_ROLLUP_CODE)
+
+
+def build_milestones_rollup() -> int:
+    """
+        Rebuild rollup from Patient-Diagnosis cube and mark it as fresh. Returns count of rollup rows.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM api_patientdiagnosismilestonesrollup')
+            cursor.execute(MILESTONES_ROLLUP_QUERY)
+            rows = cursor.rowcount
+        OncorSettings.objects.update_or_create(
+            code=MILESTONES_ROLLUP_CODE,
+            defaults={'value': {'built_at': datetime.now(timezone.utc).isoformat(sep=' '), 'rows': rows}}
+        )
+    cache.delete(MILESTONES_ROLLUP_CODE)
+
+    return rows
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import date, datetime
+from typing import NamedTuple, Tuple, List
+
+from django.utils import formats, translation
+
+from api.models.semd_models import OncorSettings
+from api.utils.directories_utils import expand_diagnoses, expand_services, directory_cache
+from backend.settings import ORDERS_RULES_CHECK_INTERVAL
+
+# Code of setting with orders rules
+ORDERS_RULES_CODE = 'orders_rules'
+
+
+class CompiledRuleServices(NamedTuple):
+    """
+        Mandatory services item of order rule with expanded by directories diagnoses and services
+    """
+    order_code: str | None
+    order_name: str | None
+    order_author: str | None
+    # Values of order validity as they are in settings and parsed validity interval
+    order_valid_from_value: str | None
+    order_valid_to_value: str | None
+    order_valid_from: date | None
+    order_valid_to: date | None
+    rule_code: str | None
+    rule_name: str | None
+    rule_text: str | None
+    rule_diagnoses: str
+    rule_services_code: str | None
+    services_group: str | None
+    services_period: int | None
+    services_name: str | None
+    # Sets of (code, name)
+    diagnoses: frozenset
+    services: frozenset
+    # Sets of codes
+    diagnosis_codes: frozenset
+    service_codes: frozenset
+
+    @property
+    def code(self) -> str | None:
+        """
+            order|rule|services code (None if any of codes is not defined)
+        """
+        if not all(isinstance(c, str) and c for c in (self.order_code, self.rule_code, self.rule_services_code)):
+            return None
+        return self.order_code + '|' + self.rule_code + '|' + self.rule_services_code
+
+    def is_valid_in_period(self, date_from: date, date_to: date) -> bool:
+        if self.order_valid_from is None or self.order_valid_from > date_to:
+            return False
+        return self.order_valid_to is None or self.order_valid_to >= date_from
+
+
+class OrdersRulesIndex:
+    """
+        Immutable index of compiled orders rules for one version of settings
+    """
+
+    def __init__(self, version: str | None, items: Tuple[CompiledRuleServices, ...]):
+        self.version = version
+        self.items = items
+
+        # Items grouped by services group and services
+        groups = dict()
+        for item in items:
+            groups.setdefault((item.services_group, item.service_codes), list()).append(item)
+        self.groups_by_services_group = {key: tuple(group) for key, group in groups.items()}
+
+    def valid_in_period(self, date_from: date, date_to: date) -> List[CompiledRuleServices]:
+        return [item for item in self.items if item.is_valid_in_period(date_from, date_to)]
+
+    def valid_at(self, check_date: date) -> List[CompiledRuleServices]:
+        return self.valid_in_period(check_date, check_date)
+
+
+def get_orders_rules_version(orders, directories_version: str | None = None) -> str:
+    """
+        Version of compiled rules: hash of settings and version of directories rules are expanded by
+    """
+    return hashlib.sha1(
+        json.dumps([orders, directories_version], sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+
+
+def parse_order_date(value, date_formats: List[str]) -> date | None:
+    if not value or not isinstance(value, str):
+        return None
+    for date_format in date_formats:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def compile_orders_rules(orders, version: str | None = None) -> OrdersRulesIndex:
+    """
+        Parse orders rules settings and expand their diagnoses and services by directories.
+        Every distinct diagnoses template and services list is expanded only once.
+    """
+    if not orders or not isinstance(orders, list):
+        return OrdersRulesIndex(version, tuple())
+
+    date_formats = list(formats.get_format("DATE_INPUT_FORMATS", lang=translation.get_language()))
+    date_formats.append('%d.%m.%Y')
+
+    expanded_diagnoses = dict()
+    expanded_services = dict()
+
+    items = list()
+    for order in orders:
+        if not isinstance(order, dict):
+            continue
+
+        order_valid = order.get('действителен', None)
+        if order_valid and isinstance(order_valid, dict):
+            order_valid_from = order_valid.get('от', None)
+            order_valid_to = order_valid.get('до', None)
+        else:
+            order_valid_from = None
+            order_valid_to = None
+
+        rules = order.get('правила', None)
+        if not rules or not isinstance(rules, list):
+            continue
+
+        order_params = (
+            order.get('code', None),
+            order.get('наименование', None),
+            order.get('автор', None),
+            order_valid_from,
+            order_valid_to,
+            parse_order_date(order_valid_from, date_formats),
+            parse_order_date(order_valid_to, date_formats),
+        )
+
+        for rule in rules:
+            if not isinstance(rule, dict):
+                continue
+
+            rule_diagnoses = rule.get('диагнозы', None)
+            if not rule_diagnoses or not isinstance(rule_diagnoses, str):
+                continue
+
+            rule_mandatory_services = rule.get('обязательныеУслуги', None)
+            if not rule_mandatory_services or not isinstance(rule_mandatory_services, list):
+                continue
+
+            if rule_diagnoses not in expanded_diagnoses:
+                expanded_diagnoses[rule_diagnoses] = frozenset(expand_diagnoses(rule_diagnoses))
+            rule_expanded_diagnoses = expanded_diagnoses[rule_diagnoses]
+
+            for rule_mandatory_service in rule_mandatory_services:
+                if not rule_mandatory_service or not isinstance(rule_mandatory_service, dict):
+                    continue
+
+                rule_services = rule_mandatory_service.get('услуги', None)
+                if not rule_services or not isinstance(rule_services, list):
+                    continue
+
+                services_key = tuple(sorted(set(service.strip() for service in rule_services)))
+                if services_key not in expanded_services:
+                    expanded_services[services_key] = frozenset(expand_services(list(services_key)))
+                rule_expanded_services = expanded_services[services_key]
+                if not rule_expanded_services:
+                    continue
+
+                items.append(CompiledRuleServices(
+                    *order_params,
+                    rule_code=rule.get('code', None),
+                    rule_name=rule.get('наименование', None),
+                    rule_text=rule.get('текст', None),
+                    rule_diagnoses=rule_diagnoses,
+                    rule_services_code=rule_mandatory_service.get('code', None),
+                    services_group=rule_mandatory_service.get('группа', None),
+                    services_period=rule_mandatory_service.get('срокРабочихДней', None),
+                    services_name=rule_mandatory_service.get('наименование', None),
+                    diagnoses=rule_expanded_diagnoses,
+                    services=rule_expanded_services,
+                    diagnosis_codes=frozenset(code for code, name in rule_expanded_diagnoses),
+                    service_codes=frozenset(code for code, name in rule_expanded_services),
+                ))
+
+    return OrdersRulesIndex(version, tuple(items))
+
+
+class OrdersRulesCache:
+    """
+        Process-wide cache of compiled orders rules.
+        Index is compiled once per version of settings (hash of its value and of directories version). Saving of
+        settings invalidates cache of the process, other processes check version of settings not more often than
+        once in check interval.
+    """
+
+    def __init__(self, check_interval: float = 30):
+        self.check_interval = check_interval
+        self.compilations = 0
+
+        self._lock = threading.Lock()
+        self._index = None
+        self._checked_at = 0.0
+
+    def get(self) -> OrdersRulesIndex:
+        with self._lock:
+            if self._index is None or time.monotonic() - self._checked_at > self.check_interval:
+                try:
+                    orders = OncorSettings.objects.get(code=ORDERS_RULES_CODE).value
+                except OncorSettings.DoesNotExist:
+                    orders = None
+                version = get_orders_rules_version(orders, directory_cache.get_version())
+                if self._index is None or self._index.version != version:
+                    self._index = compile_orders_rules(orders, version)
+                    self.compilations += 1
+                self._checked_at = time.monotonic()
+            return self._index
+
+    def invalidate(self):
+        """
+            Drop index, it will be compiled on next request
+        """
+        with self._lock:
+            self._index = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'version': None if self._index is None else self._index.version,
+                'size': 0 if self._index is None else len(self._index.items),
+                'age': None if self._index is None else time.monotonic() - self._checked_at,
+                'compilations': self.compilations,
+            }
+
+
+orders_rules_cache = OrdersRulesCache(check_interval=ORDERS_RULES_CHECK_INTERVAL)
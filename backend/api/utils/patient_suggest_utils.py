@@ -0,0 +1,229 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List
+
+from django.db import connection
+
+from api.models.orientdb_engine import normalize_name, normalize_snils
+from backend.settings import PATIENTS_SUGGEST_REFRESH_INTERVAL, PATIENTS_SUGGEST_REBUILD_INTERVAL
+
+NGRAM_SIZE = 3
+
+
+class PatientSuggestSnapshot:
+    """
+        Tokens of patients loaded from the patient search index table (api_patient).
+        Rows are only appended to snapshot, changed and deleted patients are dropped by building a new snapshot.
+    """
+
+    def __init__(self):
+        # Patients: rows for response and normalized tokens for search (list index is patient id)
+        self.patients = list()
+        self.patient_tokens = list()
+        # Sorted tokens and parallel array of patient ids (replaced as one tuple on append)
+        self.prefix_index = (list(), array('I'))
+        # N-gram -> ascending array of patient ids
+        self.ngrams = dict()
+        # (cluster, position) of the last loaded rid
+        self.watermark = (-1, -1)
+
+    def load(self):
+        """
+            Append rows of index table after rid watermark
+        """
+        query_body = """
+            SELECT
+                p.rid, p.lastname, p.firstname, p.middlename, p.birthday, p.snils,
+                p.lastname_norm, p.firstname_norm, p.middlename_norm, p.snils_digits,
+                p.rid_cluster, p.rid_position
+            FROM
+                (SELECT
+                     *,
+                     split_part(substr(rid, 2), ':', 1)::int AS rid_cluster,
+                     split_part(rid, ':', 2)::int AS rid_position
+                 FROM
+                     api_patient) AS p
+            WHERE
+                (p.rid_cluster, p.rid_position) > (""" + str(self.watermark[0]) + ', ' + str(self.watermark[1]) + """)
+            ORDER BY
+                p.rid_cluster, p.rid_position
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(query_body)
+            rows = cursor.fetchall()
+
+        if rows:
+            self.append(rows)
+
+    def append(self, rows: list):
+        new_keys = list()
+        for row in rows:
+            patient_id = len(self.patients)
+            tokens = tuple(token for token in row[6:10] if token)
+
+            # Patient must be appended before it can be found by its tokens
+            self.patients.append(
+                OrderedDict([
+                    ('rid', row[0]),
+                    ('lastname', row[1]),
+                    ('firstname', row[2]),
+                    ('middlename', row[3]),
+                    ('birthday', row[4]),
+                    ('snils', row[5]),
+                ])
+            )
+            self.patient_tokens.append(tokens)
+
+            ngrams = set()
+            for token in tokens:
+                new_keys.append((token, patient_id))
+                for i in range(len(token) - NGRAM_SIZE + 1):
+                    ngrams.add(token[i:i + NGRAM_SIZE])
+            for ngram in ngrams:
+                posting = self.ngrams.get(ngram, None)
+                if posting is None:
+                    self.ngrams[ngram] = array('I', [patient_id])
+                else:
+                    posting.append(patient_id)
+
+            self.watermark = (row[10], row[11])
+
+        tokens, patient_ids = self.prefix_index
+        merged = list(heapq.merge(zip(tokens, patient_ids), sorted(new_keys)))
+        self.prefix_index = ([key[0] for key in merged], array('I', [key[1] for key in merged]))
+
+    def find_prefix(self, prefix: str) -> set:
+        tokens, patient_ids = self.prefix_index
+        result = set()
+        i = bisect_left(tokens, prefix)
+        while i < len(tokens) and tokens[i].startswith(prefix):
+            result.add(patient_ids[i])
+            i += 1
+        return result
+
+    def find_infix(self, word: str) -> set:
+        postings = list()
+        for i in range(len(word) - NGRAM_SIZE + 1):
+            posting = self.ngrams.get(word[i:i + NGRAM_SIZE], None)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings = sorted(postings, key=len)
+
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                return result
+
+        # N-grams may be found in different places of token, so check the whole word
+        return {
+            patient_id for patient_id in result
+            if any(word in token for token in self.patient_tokens[patient_id])
+        }
+
+
+class PatientSuggestIndex:
+    """
+        In-process index of patient surname, first name, middle name and SNILS for autocomplete.
+        Short words are searched by prefix in sorted array of tokens, longer words by n-gram posting lists.
+        New rows of the patient search index table (api_patient) are appended in background thread by rid watermark,
+        the whole snapshot is periodically rebuilt off-lock and swapped in, so renamed and deleted patients
+        are refreshed too (one index is shared by all threads of worker process).
+    """
+
+    def __init__(self, refresh_interval: float = 60, rebuild_interval: float = 3600):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._snapshot = PatientSuggestSnapshot()
+        self.loaded_at = None
+        self.built_at = None
+
+    def ensure_started(self):
+        """
+            Load index on first usage and start background refresh
+        """
+        if self._thread is not None:
+            return
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._rebuild()
+            self._thread = threading.Thread(target=self._run, name='patient-suggest-index', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                if time.time() - self.built_at >= self.rebuild_interval:
+                    self._rebuild()
+                else:
+                    self._refresh()
+            except Exception as e:
+                print(f"Patient suggest index refresh error: {str(e)}")
+            finally:
+                connection.close()
+
+    def _refresh(self):
+        # Rows are appended by background thread only, readers never see half-appended patient
+        self._snapshot.load()
+        self.loaded_at = time.time()
+
+    def _rebuild(self):
+        snapshot = PatientSuggestSnapshot()
+        snapshot.load()
+        # Readers keep using the previous snapshot until reference is replaced
+        self._snapshot = snapshot
+        self.loaded_at = self.built_at = time.time()
+
+    def suggest(self, q: str, limit: int = 10) -> List[OrderedDict]:
+        """
+            Patients having all words of query in surname, first name, middle name or SNILS.
+            Patients with words at the start of tokens go first.
+        """
+        self.ensure_started()
+
+        # Formatted SNILS (with spaces and dashes) is searched as one word
+        digits = normalize_snils(q)
+        if digits and len(digits) == len(''.join(q.split()).replace('-', '')):
+            words = [digits]
+        else:
+            words = list()
+            for word in q.split():
+                digits = normalize_snils(word)
+                words.append(digits if digits and len(digits) == len(word.replace('-', '')) else normalize_name(word))
+            words = [word for word in words if word]
+        if not words:
+            return list()
+
+        snapshot = self._snapshot
+
+        candidates = None
+        for word in sorted(words, key=len, reverse=True):
+            found = snapshot.find_prefix(word) if len(word) < NGRAM_SIZE else snapshot.find_infix(word)
+            candidates = found if candidates is None else candidates.intersection(found)
+            if not candidates:
+                return list()
+
+        def rank(patient_id: int) -> tuple:
+            tokens = snapshot.patient_tokens[patient_id]
+            return (
+                -sum(1 for word in words if any(token.startswith(word) for token in tokens)),
+                tokens,
+            )
+
+        return [snapshot.patients[patient_id] for patient_id in sorted(candidates, key=rank)[:limit]]
+
+
+patient_suggest_index = PatientSuggestIndex(refresh_interval=PATIENTS_SUGGEST_REFRESH_INTERVAL,
+                                            rebuild_interval=PATIENTS_SUGGEST_REBUILD_INTERVAL)
@@ -0,0 +1,70 @@
+from typing import List
+
+from django.core.cache import cache
+from django.db import connection
+
+from api.models.semd_models import OncorSettings
+
+# Code of setting with watermarks of patient search index: [cluster, last position] of indexed ptn records
+PATIENTS_INDEX_WATERMARKS_CODE = 'patients_index_watermarks'
+# Watermarks are read from settings not more often than once in this period (seconds)
+PATIENTS_INDEX_WATERMARKS_CACHE_TIMEOUT = 60
+
+
+def get_patients_index_watermarks() -> List[List[int]] | None:
+    """
+        Watermarks of patient search index (api_patient): ptn records with position not greater than
+        the last position of their cluster were indexed by the last fill_patients_records run.
+        None means that index was not filled.
+    """
+    watermarks = cache.get(PATIENTS_INDEX_WATERMARKS_CODE, '')
+    if watermarks == '':
+        try:
+            watermarks = OncorSettings.objects.get(code=PATIENTS_INDEX_WATERMARKS_CODE).value
+        except OncorSettings.DoesNotExist:
+            watermarks = None
+        cache.set(PATIENTS_INDEX_WATERMARKS_CODE, watermarks, PATIENTS_INDEX_WATERMARKS_CACHE_TIMEOUT)
+    return watermarks
+
+
+def set_patients_index_watermarks() -> List[List[int]]:
+    """
+        Store watermarks of patient search index computed by its rows
+    """
+    query_body = """
+        SELECT
+            split_part(substr(rid, 2), ':', 1)::int AS cluster,
+            MAX(split_part(rid, ':', 2)::bigint) AS position
+        FROM
+            api_patient
+        GROUP BY
+            1
+        ORDER BY
+            1
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        watermarks = [[cluster, position] for cluster, position in cursor.fetchall()]
+
+    OncorSettings.objects.update_or_create(code=PATIENTS_INDEX_WATERMARKS_CODE, defaults={'value': watermarks})
+    cache.delete(PATIENTS_INDEX_WATERMARKS_CODE)
+    return watermarks
+
+
+def get_new_patients_condition() -> str | None:
+    """
+        OrientDB condition of ptn records created after the last refresh of patient search index
+        (rids above watermark of their cluster), None if index has no watermarks
+    """
+    watermarks = get_patients_index_watermarks()
+    if not watermarks:
+        return None
+
+    # Records of clusters below the first indexed cluster, after watermark of every indexed cluster
+    # up to the next indexed cluster and after watermark of the last indexed cluster
+    conditions = [f"@rid < #{watermarks[0][0]}:0"]
+    for (cluster, position), (next_cluster, _) in zip(watermarks, watermarks[1:]):
+        conditions.append(f"(@rid > #{cluster}:{position} AND @rid < #{next_cluster}:0)")
+    conditions.append(f"@rid > #{watermarks[-1][0]}:{watermarks[-1][1]}")
+
+    return '(' + ' OR '.join(conditions) + ')'
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+
+from api.models.orientdb_engine import orient_db_pool
+from backend.settings import PTN_TAGS_CACHE_TTL
+
+# Unknown tag rid causes reload of dictionary not more often than once in this period (seconds)
+UNKNOWN_TAG_RELOAD_INTERVAL = 5
+
+
+class PtnTagCache:
+    """
+        Process-wide cache of PtnTag dictionary.
+        The whole dictionary is loaded by one query and reloaded when TTL expires, when unknown tag rid is requested
+        or after explicit invalidation. Every reload increments version of cache.
+    """
+
+    def __init__(self, ttl: float = 600):
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._tags = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        tags = dict()
+        for tag in orient_db_pool.query(
+            '''
+            SELECT 
+                @rid, 
+                name,
+                description 
+            from 
+                PtnTag 
+            ''',
+            -1
+        ):
+            tag_rid = str(tag.oRecordData.get('rid', None))
+            tags[tag_rid] = OrderedDict(
+                [
+                    ('tag_rid', tag_rid),
+                    ('tag_name', tag.oRecordData.get('name', None)),
+                    ('tag_description', tag.oRecordData.get('description', None)),
+                ]
+            )
+
+        self._tags = tags
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    def _get_tags(self, is_reload: bool = False) -> (dict, bool):
+        with self._lock:
+            if is_reload or self._tags is None or time.monotonic() - self._loaded_at > self.ttl:
+                self._load()
+                return self._tags, True
+            return self._tags, False
+
+    def get(self, rid: str) -> OrderedDict | None:
+        """
+            Tag by rid (None if there is no tag with such rid)
+        """
+        tags, is_loaded = self._get_tags()
+        tag = tags.get(rid, None)
+        if tag is None and not is_loaded and time.monotonic() - self._loaded_at > UNKNOWN_TAG_RELOAD_INTERVAL:
+            # Tag could be created after the dictionary was loaded
+            tags, is_loaded = self._get_tags(is_reload=True)
+            tag = tags.get(rid, None)
+
+        with self._lock:
+            if is_loaded:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return tag
+
+    def invalidate(self):
+        """
+            Drop dictionary, it will be reloaded on next request
+        """
+        with self._lock:
+            self._tags = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'version': self.version,
+                'size': 0 if self._tags is None else len(self._tags),
+                'age': None if self._tags is None else time.monotonic() - self._loaded_at,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+ptn_tag_cache = PtnTagCache(ttl=PTN_TAGS_CACHE_TTL)
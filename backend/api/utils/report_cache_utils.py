@@ -0,0 +1,129 @@
+import hashlib
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Callable, List, Tuple
+
+from django.db import connection
+
+from api.models.semd_models import ReportCache
+from api.utils.milestones_rollup_utils import get_milestones_rollup_state
+from api.utils.orders_rules_utils import orders_rules_cache
+from api.utils.semd_cubes_utils import get_semd_cubes_watermark
+from backend.settings import REPORT_SINGLEFLIGHT_TIMEOUT
+
+REPORT_TYPE_F14 = 'F14'
+REPORT_TYPE_F14V2 = 'F14v2'
+# Worker waiting for report computed by another worker polls its lock with this interval (seconds)
+REPORT_SINGLEFLIGHT_POLL_INTERVAL = 0.5
+
+
+def get_report_cube_version(report_type: str) -> str | None:
+    """
+        Load version of cube the report is computed from (None while cube is being loaded)
+    """
+    if report_type == REPORT_TYPE_F14:
+        return get_semd_cubes_watermark()
+    if report_type == REPORT_TYPE_F14V2:
+        state = get_milestones_rollup_state()
+        return state.get('built_at', None) if isinstance(state, dict) else None
+    return None
+
+
+def get_report_cache_key(report_type: str, date_from: date, date_to: date, rules_version: str | None,
+                         cube_version: str, variant: str = '') -> str:
+    return hashlib.sha1(
+        '|'.join([report_type, date_from.isoformat(), date_to.isoformat(), str(rules_version), cube_version]
+                 + ([variant] if variant else []))
+        .encode('utf-8')
+    ).hexdigest()
+
+
+@contextmanager
+def report_singleflight(key: str, timeout: float = REPORT_SINGLEFLIGHT_TIMEOUT):
+    """
+        Only one worker of all processes computes report with the same key, the others wait for it
+        not longer than timeout (seconds) and then compute report without lock
+    """
+    lock_id = int(key[:15], 16)
+    deadline = time.monotonic() + timeout
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [lock_id])
+            is_locked = cursor.fetchone()[0]
+            if is_locked or time.monotonic() >= deadline:
+                break
+            time.sleep(REPORT_SINGLEFLIGHT_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        if is_locked:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [lock_id])
+
+
+def get_cached_report(report_type: str, date_from: date, date_to: date, compute: Callable[[], object],
+                      variant: str = '') -> object:
+    """
+        Report result from cache, report is computed by 'compute' and cached if there is no result in cache.
+        Report is not cached while its cube is being loaded. Variant distinguishes results of the same report
+        computed with other parameters (e.g. granularity of series).
+    """
+    cube_version = get_report_cube_version(report_type)
+    if cube_version is None:
+        return compute()
+    rules_version = orders_rules_cache.get().version
+
+    key = get_report_cache_key(report_type, date_from, date_to, rules_version, cube_version, variant)
+    result = ReportCache.objects.filter(key=key).values_list('result', flat=True).first()
+    if result is not None:
+        return result
+
+    with report_singleflight(key):
+        # Report could be computed by another worker while this one was waiting
+        result = ReportCache.objects.filter(key=key).values_list('result', flat=True).first()
+        if result is not None:
+            return result
+
+        s_all = time.perf_counter()
+        result = compute()
+        elapsed = time.perf_counter() - s_all
+
+        # Results of previous versions are not needed anymore
+        ReportCache.objects.filter(report_type=report_type) \
+            .exclude(rules_version=rules_version, cube_version=cube_version).delete()
+        ReportCache.objects.update_or_create(
+            key=key,
+            defaults={
+                'report_type': report_type,
+                'date_from': date_from,
+                'date_to': date_to,
+                'rules_version': rules_version,
+                'cube_version': cube_version,
+                'result': result,
+                'elapsed': elapsed,
+            }
+        )
+
+    return result
+
+
+def get_common_periods(today: date) -> List[Tuple[date, date]]:
+    """
+        Report periods requested most often: current and previous months, current quarter and current year
+    """
+    month_from = today.replace(day=1)
+    month_to = (month_from + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    previous_month_to = month_from - timedelta(days=1)
+    previous_month_from = previous_month_to.replace(day=1)
+    quarter_from = date(today.year, 3 * ((today.month - 1) // 3) + 1, 1)
+    quarter_to = (quarter_from + timedelta(days=93)).replace(day=1) - timedelta(days=1)
+    year_from = date(today.year, 1, 1)
+    year_to = date(today.year, 12, 31)
+
+    return [
+        (month_from, month_to),
+        (previous_month_from, previous_month_to),
+        (quarter_from, quarter_to),
+        (year_from, year_to),
+    ]
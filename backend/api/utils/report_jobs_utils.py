@@ -0,0 +1,78 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.db import connections
+from django.utils import timezone
+
+from api.models.semd_models import ReportJob
+from backend.settings import REPORT_JOBS_WORKERS, REPORT_JOBS_HEARTBEAT_INTERVAL
+
+
+class ReportJobPool:
+    """
+        Process-wide pool of report job workers.
+        Tasks are executed out of request threads, database connections of worker thread are closed after every task.
+        Heartbeat thread marks running jobs of this process, so jobs of killed processes can be found and re-queued.
+    """
+
+    def __init__(self, workers: int = 2, heartbeat_interval: int = 30):
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_name = socket.gethostname()[:50] + ':' + str(os.getpid())
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._heartbeat = None
+        self._running_jobs = set()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Executor is created in process of worker (not in master process before fork)
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+                self.worker_name = socket.gethostname()[:50] + ':' + str(os.getpid())
+                self._heartbeat = threading.Thread(target=self._beat, name='report-job-heartbeat', daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def submit(self, task: Callable, *args):
+        self._get_executor().submit(self._run, task, *args)
+
+    def start_job(self, job_id):
+        with self._lock:
+            self._running_jobs.add(job_id)
+
+    def finish_job(self, job_id):
+        with self._lock:
+            self._running_jobs.discard(job_id)
+
+    def _beat(self):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            with self._lock:
+                job_ids = list(self._running_jobs)
+            if not job_ids:
+                continue
+            try:
+                ReportJob.objects.filter(id__in=job_ids, status=ReportJob.RUNNING, worker=self.worker_name) \
+                    .update(heartbeat_at=timezone.now())
+            except Exception as e:
+                print(f"Report job heartbeat error: {str(e)}")
+            finally:
+                connections.close_all()
+
+    @staticmethod
+    def _run(task: Callable, *args):
+        try:
+            task(*args)
+        except Exception as e:
+            print(f"Report job task error: {str(e)}")
+        finally:
+            connections.close_all()
+
+
+report_job_pool = ReportJobPool(workers=REPORT_JOBS_WORKERS, heartbeat_interval=REPORT_JOBS_HEARTBEAT_INTERVAL)
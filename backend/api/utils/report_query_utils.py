@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Callable, List
+
+from django.db import connection, OperationalError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from backend.settings import REPORT_QUERY_WORKERS, REPORT_QUERY_TIMEOUT
+
+# SQLSTATE of query cancelled by statement timeout
+QUERY_CANCELED = '57014'
+
+
+class ReportTimeout(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = 'Report was not computed in time.'
+    default_code = 'report_timeout'
+
+
+class ReportQueryPool:
+    """
+        Process-wide pool of threads running independent report queries concurrently.
+        Every thread keeps its own connection to database, so the pool is a pool of connections too.
+    """
+
+    def __init__(self, workers: int = 4, timeout: float = 600):
+        self.workers = workers
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-query')
+            return self._executor
+
+    def fetchall(self, queries: List[str], timeout: float | None = None,
+                 on_done: Callable[[int], None] | None = None) -> List[list]:
+        """
+            Results of queries in the same order. If results are not got in timeout (seconds) for all queries,
+            ReportTimeout is raised. on_done is called with count of done queries after every query.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+
+        executor = self._get_executor()
+        futures = {executor.submit(self._fetchall, query, deadline): idx for idx, query in enumerate(queries)}
+        results = [None] * len(queries)
+        try:
+            for done, future in enumerate(as_completed(futures, timeout=max(deadline - time.monotonic(), 0))):
+                results[futures[future]] = future.result()
+                if on_done is not None:
+                    on_done(done + 1)
+        except (FuturesTimeoutError, ReportTimeout):
+            self._cancel(futures)
+            raise ReportTimeout(f"Report was not computed in {timeout or self.timeout} seconds")
+        except Exception:
+            # Report has failed, queued queries of its other parts are not needed anymore
+            self._cancel(futures)
+            raise
+
+        return results
+
+    @staticmethod
+    def _cancel(futures):
+        for future in futures:
+            future.cancel()
+
+    @staticmethod
+    def _fetchall(query: str, deadline: float) -> list:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ReportTimeout()
+
+        # Connection of thread could be broken while it was idle
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+        with connection.cursor() as cursor:
+            # Query is cancelled by database when report time is out
+            cursor.execute(f"SET statement_timeout = {int(remaining * 1000) + 1}")
+            try:
+                cursor.execute(query)
+                return cursor.fetchall()
+            except OperationalError as e:
+                if getattr(e.__cause__, 'pgcode', None) == QUERY_CANCELED:
+                    raise ReportTimeout()
+                raise
+            finally:
+                cursor.execute("RESET statement_timeout")
+
+
+report_query_pool = ReportQueryPool(workers=REPORT_QUERY_WORKERS, timeout=REPORT_QUERY_TIMEOUT)
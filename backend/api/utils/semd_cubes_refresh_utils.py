@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from django.db import connection, connections, transaction
+
+from api.models.orientdb_engine import orient_db_pool
+from api.models.semd_models import MilestonesDirtyPatient, SemdExtraction
+from api.utils.cube_loader_utils import CubeBulkLoader
+from api.utils.fill_cubes_utils import get_semd_cubes_rows, query_patients
+from api.utils.semd_cubes_utils import get_semd_cubes_unmatched_messages, set_semd_cubes_unmatched_messages
+from api.utils.semd_extraction_utils import EXTRACTION_CHUNK_SIZE, extract_semds
+from backend.settings import CUBES_UNMATCHED_RETRY_DAYS
+
+
+def get_new_messages(after: str, until: datetime) -> List[Tuple[str, datetime]]:
+    """
+        (internal_message_id, date_time) of messages of vimis_sending with date_time after watermark up to until
+        inclusive, in order of date_time
+    """
+    query_body = """
+        SELECT
+            internal_message_id,
+            date_time
+        FROM
+            vimis_sending
+        WHERE
+            internal_message_id IS NOT NULL AND
+            date_time > '""" + after + """' AND
+            date_time <= '""" + until.isoformat(sep=' ') + """'
+        ORDER BY
+            date_time
+    """
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def drop_changed_extractions(messages: List[Tuple[str, datetime]]) -> int:
+    """
+        Delete extractions of messages which were sent again after extraction, they will be extracted again.
+        Returns count of deleted extractions.
+    """
+    # date_time of vimis_sending is stored as UTC time without time zone
+    times = {
+        internal_message_id: date_time if date_time.tzinfo else date_time.replace(tzinfo=timezone.utc)
+        for internal_message_id, date_time in messages
+    }
+    changed = [
+        internal_message_id
+        for internal_message_id, time_rc in SemdExtraction.objects.filter(
+            internal_message_id__in=list(times)
+        ).values_list('internal_message_id', 'time_rc')
+        if time_rc != times[internal_message_id]
+    ]
+    if changed:
+        SemdExtraction.objects.filter(internal_message_id__in=changed).delete()
+    return len(changed)
+
+
+def query_messages_records(internal_message_ids: List[str]) -> dict:
+    """
+        SEMD records of messages: internal_message_id -> (patient rid, record rid)
+    """
+    query_body = """
+        SELECT
+            @rid,
+            ehr.patient.@rid as ptn_rid,
+            internalMessageId
+        FROM
+            RcSMS
+        WHERE
+            internalMessageId IN [""" + ','.join("'" + m + "'" for m in internal_message_ids) + """]
+    """
+    records = dict()
+    for record in orient_db_pool.query(query_body, -1):
+        internal_message_id = record.oRecordData.get('internalMessageId', None)
+        ptn_id = record.oRecordData.get('ptn_rid', None)
+        if internal_message_id and ptn_id:
+            records[internal_message_id] = (str(ptn_id), str(record.oRecordData.get('rid', None)))
+    return records
+
+
+def refresh_semd_cubes_chunk(messages: List[Tuple[str, datetime]], diagnoses_loader: CubeBulkLoader,
+                             services_loader: CubeBulkLoader) -> Tuple[int, set, list]:
+    """
+        Upsert rows of cubes of messages: rows of every message are replaced by rows of its current extraction,
+        so natural key (internal_message_id, code, date) of rows is never duplicated by repeated refresh.
+        Returns (count of SEMDs, patients which rows were changed, messages without SEMD record or patient).
+    """
+    internal_message_ids = [internal_message_id for internal_message_id, _ in messages]
+    drop_changed_extractions(messages)
+
+    records = query_messages_records(internal_message_ids)
+    patients = query_patients('@rid IN [' + ','.join({ptn_id for ptn_id, _ in records.values()}) + ']') \
+        if records else dict()
+    unmatched = [
+        (internal_message_id, date_time) for internal_message_id, date_time in messages
+        if internal_message_id not in records or records[internal_message_id][0] not in patients
+    ]
+
+    # Get SEMDs, each payload is parsed only once and kept in extraction table
+    diagnoses_rows = list()
+    services_rows = list()
+    for internal_message_id, semd in extract_semds(list(records)).items():
+        ptn_id, rc_id = records[internal_message_id]
+        if ptn_id not in patients:
+            continue
+        semd_diagnoses_rows, semd_services_rows = get_semd_cubes_rows(patients[ptn_id], rc_id, semd)
+        diagnoses_rows += semd_diagnoses_rows
+        services_rows += semd_services_rows
+
+    ids = ','.join("'" + m + "'" for m in internal_message_ids)
+    with transaction.atomic():
+        # Patients of replaced rows are changed too (message could be moved to another patient)
+        dirty_patients = set()
+        with connection.cursor() as cursor:
+            for table in ('api_semddiagnosis', 'api_semdservice'):
+                cursor.execute('DELETE FROM ' + table + ' WHERE internal_message_id IN (' + ids + ') RETURNING ptn_id')
+                dirty_patients.update(row[0] for row in cursor.fetchall())
+
+        for row in diagnoses_rows:
+            diagnoses_loader.add(row)
+        for row in services_rows:
+            services_loader.add(row)
+        diagnoses_loader.flush()
+        services_loader.flush()
+
+        dirty_patients.update(row[0] for row in diagnoses_rows + services_rows)
+        mark_milestones_dirty_patients(dirty_patients)
+
+    return len(records), dirty_patients, unmatched
+
+
+def refresh_semd_cubes(after: str, until: datetime, diagnoses_loader: CubeBulkLoader,
+                       services_loader: CubeBulkLoader) -> Tuple[int, int, int]:
+    """
+        Incremental refresh of cubes by messages of vimis_sending with date_time after watermark up to until
+        and by messages which were not matched to patient by previous refreshes. Messages which are not matched
+        again are kept for the next refresh (not longer than CUBES_UNMATCHED_RETRY_DAYS).
+        Returns (count of messages, count of SEMDs, count of changed patients).
+    """
+    messages = get_new_messages(after, until)
+    new_ids = {internal_message_id for internal_message_id, _ in messages}
+    retried = [message for message in get_semd_cubes_unmatched_messages() if message[0] not in new_ids]
+    if retried:
+        print(f"    {len(retried)} messages not matched by previous refreshes are retried")
+    messages = retried + messages
+
+    semds_count = 0
+    dirty_patients = set()
+    unmatched = list()
+    for k in range(0, len(messages), EXTRACTION_CHUNK_SIZE):
+        chunk_semds_count, chunk_dirty_patients, chunk_unmatched = refresh_semd_cubes_chunk(
+            messages[k:k + EXTRACTION_CHUNK_SIZE], diagnoses_loader, services_loader
+        )
+        semds_count += chunk_semds_count
+        dirty_patients.update(chunk_dirty_patients)
+        unmatched += chunk_unmatched
+        print(f"    {min(k + EXTRACTION_CHUNK_SIZE, len(messages))}/{len(messages)} messages, "
+              f"{semds_count} SEMDs, {len(dirty_patients)} patients")
+
+    # date_time of vimis_sending is stored as UTC time without time zone
+    retry_from = until.replace(tzinfo=None) - timedelta(days=CUBES_UNMATCHED_RETRY_DAYS)
+    expired = [m for m, date_time in unmatched if date_time.replace(tzinfo=None) < retry_from]
+    if expired:
+        print(f"    {len(expired)} messages are not matched for {CUBES_UNMATCHED_RETRY_DAYS} days and are not "
+              f"retried any more: {', '.join(expired)}")
+    unmatched = [message for message in unmatched if message[0] not in expired]
+    print(f"    {len(unmatched)} messages without SEMD record or patient are kept for the next refresh")
+    set_semd_cubes_unmatched_messages(unmatched)
+
+    return len(messages), semds_count, len(dirty_patients)
+
+
+def mark_milestones_dirty_patients(ptn_ids: set):
+    time_marked = datetime.now(timezone.utc)
+    MilestonesDirtyPatient.objects.bulk_create(
+        [MilestonesDirtyPatient(ptn_id=ptn_id, time_marked=time_marked) for ptn_id in ptn_ids],
+        update_conflicts=True, unique_fields=['ptn_id'], update_fields=['time_marked']
+    )
+
+
+def get_milestones_dirty_patients() -> Tuple[List[str], datetime | None]:
+    """
+        Patients which milestones must be recomputed and time of the last mark
+    """
+    dirty_patients = list(MilestonesDirtyPatient.objects.values_list('ptn_id', 'time_marked'))
+    return [ptn_id for ptn_id, _ in dirty_patients], max((t for _, t in dirty_patients), default=None)
+
+
+def clear_milestones_dirty_patients(ptn_ids: List[str], marked_until: datetime):
+    """
+        Clear marks of patients which milestones were recomputed (patients marked again later keep their marks)
+    """
+    for k in range(0, len(ptn_ids), EXTRACTION_CHUNK_SIZE):
+        MilestonesDirtyPatient.objects.filter(
+            ptn_id__in=ptn_ids[k:k + EXTRACTION_CHUNK_SIZE], time_marked__lte=marked_until
+        ).delete()
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import List, Tuple
+
+from django.core.cache import cache
+from django.db import connections
+
+from api.models.semd_models import OncorSettings
+
+# Code of setting with watermark of SEMD cubes
+SEMD_CUBES_WATERMARK_CODE = 'semd_cubes_watermark'
+# Watermark is read from settings not more often than once in this period (seconds)
+SEMD_CUBES_WATERMARK_CACHE_TIMEOUT = 60
+# Code of setting with messages which were not matched to patient by incremental refresh: [internal_message_id, time]
+SEMD_CUBES_UNMATCHED_CODE = 'semd_cubes_unmatched_messages'
+
+
+def get_vimis_sending_watermark() -> datetime | None:
+    """
+        Time of the last message in vimis_sending
+    """
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute('SELECT max(date_time) FROM vimis_sending')
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def get_semd_cubes_watermark() -> str | None:
+    """
+        Watermark of SEMD cubes: all messages of vimis_sending with date_time not greater than watermark
+        are already extracted into cubes. None means that cubes are not filled completely.
+    """
+    watermark = cache.get(SEMD_CUBES_WATERMARK_CODE, '')
+    if watermark == '':
+        try:
+            watermark = OncorSettings.objects.get(code=SEMD_CUBES_WATERMARK_CODE).value
+        except OncorSettings.DoesNotExist:
+            watermark = None
+        cache.set(SEMD_CUBES_WATERMARK_CODE, watermark, SEMD_CUBES_WATERMARK_CACHE_TIMEOUT)
+    return watermark
+
+
+def set_semd_cubes_watermark(watermark: datetime | None):
+    if watermark is None:
+        OncorSettings.objects.filter(code=SEMD_CUBES_WATERMARK_CODE).delete()
+    else:
+        OncorSettings.objects.update_or_create(
+            code=SEMD_CUBES_WATERMARK_CODE,
+            defaults={'value': watermark.isoformat(sep=' ')}
+        )
+    cache.delete(SEMD_CUBES_WATERMARK_CODE)
+
+
+def get_semd_cubes_unmatched_messages() -> List[Tuple[str, datetime]]:
+    """
+        Messages of vimis_sending before watermark which have no SEMD record or patient in OrientDB yet,
+        they are retried by the next incremental refresh
+    """
+    try:
+        messages = OncorSettings.objects.get(code=SEMD_CUBES_UNMATCHED_CODE).value or list()
+    except OncorSettings.DoesNotExist:
+        messages = list()
+    return [(internal_message_id, datetime.fromisoformat(date_time)) for internal_message_id, date_time in messages]
+
+
+def set_semd_cubes_unmatched_messages(messages: List[Tuple[str, datetime]]):
+    if not messages:
+        OncorSettings.objects.filter(code=SEMD_CUBES_UNMATCHED_CODE).delete()
+    else:
+        OncorSettings.objects.update_or_create(
+            code=SEMD_CUBES_UNMATCHED_CODE,
+            defaults={'value': [[internal_message_id, date_time.isoformat(sep=' ')]
+                                for internal_message_id, date_time in messages]}
+        )
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List
+
+from django.db import connections
+from lxml import etree
+
+from api.models.semd_models import SemdExtraction
+from api.utils.cda_utils import extract_cda, extract_cda_content, CdaService, CONTENT_XPATHS, CONTENT_NOT_ANALYZED
+
+# Messages are queried from vimis_sending by chunks of this size
+EXTRACTION_CHUNK_SIZE = 500
+
+
+def extract_semds(internal_message_ids: List[str], after: str | None = None) -> dict:
+    """
+        Extracted SEMDs: internal_message_id -> SemdExtraction.
+        SEMDs are immutable, so every payload of vimis_sending is parsed only once and the result is kept
+        in extraction table. If 'after' is given, only messages with date_time after it are returned.
+    """
+    internal_message_ids = list(dict.fromkeys(m for m in internal_message_ids if m))
+    if not internal_message_ids:
+        return dict()
+
+    # Get already extracted SEMDs
+    extractions = {
+        extraction.internal_message_id: extraction
+        for extraction in SemdExtraction.objects.filter(internal_message_id__in=internal_message_ids)
+    }
+    missing = [m for m in internal_message_ids if m not in extractions]
+
+    # Extract the rest of SEMDs, all of them are kept regardless of 'after'
+    new_extractions = list()
+    for k in range(0, len(missing), EXTRACTION_CHUNK_SIZE):
+        for semd in query_semds(missing[k:k + EXTRACTION_CHUNK_SIZE]):
+            new_extractions.append(parse_semd(semd))
+    if new_extractions:
+        SemdExtraction.objects.bulk_create(new_extractions, ignore_conflicts=True)
+        extractions.update({extraction.internal_message_id: extraction for extraction in new_extractions})
+
+    if after is None:
+        return extractions
+
+    after_time_rc = watermark_to_time_rc(after)
+    return {
+        internal_message_id: extraction
+        for internal_message_id, extraction in extractions.items()
+        if extraction.time_rc is not None and extraction.time_rc > after_time_rc
+    }
+
+
+def watermark_to_time_rc(watermark: str) -> datetime:
+    # date_time of vimis_sending is stored as UTC time without time zone
+    time_rc = datetime.fromisoformat(watermark)
+    return time_rc if time_rc.tzinfo else time_rc.replace(tzinfo=timezone.utc)
+
+
+def query_semds(internal_message_ids: List[str]) -> list:
+    query_body = """
+        SELECT
+            internal_message_id,
+            date_time as time_rc,
+            document_type,
+            sms_profile as profile,
+            payload
+        FROM
+            vimis_sending
+        WHERE
+            internal_message_id in (""" + ','.join("'" + m + "'" for m in internal_message_ids) + ')'
+
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute(query_body)
+        return cursor.fetchall()
+
+
+def parse_semd(semd: tuple) -> SemdExtraction:
+    time_rc = semd[1]
+    if time_rc is not None and time_rc.tzinfo is None:
+        time_rc = time_rc.replace(tzinfo=timezone.utc)
+
+    # Content of document type is kept by type (None if payload is not valid)
+    extraction = SemdExtraction(
+        internal_message_id=semd[0],
+        time_rc=time_rc,
+        document_type=semd[2],
+        profile=semd[3],
+        content={semd[2]: None},
+    )
+
+    try:
+        document = extract_cda(semd[4], semd[2])
+    except (etree.XMLSyntaxError, ValueError) as e:
+        print(f"SEMD {semd[0]} payload parse error: {str(e)}")
+        return extraction
+
+    extraction.nsi_doc_type = document.nsi_doc_type
+    extraction.author_mo_oid = document.author_mo_oid
+    extraction.author_snils = document.author_snils
+    extraction.author_post = document.author_post
+    extraction.effective_date = document.effective_date
+    extraction.diagnoses = [
+        OrderedDict([
+            ('mkb10', diagnosis.mkb10),
+            ('name', diagnosis.name),
+            ('date', diagnosis.date.isoformat() if diagnosis.date else None),
+            ('parent_node_name', diagnosis.parent_node_name),
+            ('parent_node_class_code', diagnosis.parent_node_class_code),
+            ('parent_node_code_node', OrderedDict(diagnosis.parent_node_code_node._asdict())),
+            ('code_node', OrderedDict(diagnosis.code_node._asdict())),
+        ])
+        for diagnosis in document.diagnoses
+    ]
+    extraction.services = [service_to_json(service) for service in document.services]
+    extraction.instrumental_diagnostics = [service_to_json(service) for service in document.instrumental_diagnostics]
+    extraction.content = {semd[2]: document.content}
+
+    return extraction
+
+
+def service_to_json(service: CdaService) -> OrderedDict:
+    return OrderedDict([
+        ('code', service.code),
+        ('date', service.date.isoformat() if service.date else None),
+    ])
+
+
+def extract_semd_content(extraction: SemdExtraction, document_type: str) -> dict | str | None:
+    """
+        Content of SEMD for document type which is not kept in its extraction (type of message differs from
+        type of vimis_sending or extraction was made before content was extracted). Result is kept in extraction,
+        None (payload is not valid) too, so payload is parsed once for every type.
+    """
+    if document_type not in CONTENT_XPATHS:
+        return CONTENT_NOT_ANALYZED
+
+    query_body = """
+        SELECT
+            payload
+        FROM
+            vimis_sending
+        WHERE
+            internal_message_id = '""" + extraction.internal_message_id + "'"
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute(query_body)
+        semd = cursor.fetchone()
+
+    content = None
+    if semd:
+        try:
+            content = extract_cda_content(semd[0], document_type)
+        except (etree.XMLSyntaxError, ValueError) as e:
+            print(f"SEMD {extraction.internal_message_id} payload parse error: {str(e)}")
+
+    extraction.content = {**(extraction.content or dict()), document_type: content}
+    extraction.save(update_fields=['content'])
+
+    return content
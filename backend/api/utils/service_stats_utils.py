@@ -0,0 +1,35 @@
+import os
+from typing import List
+
+from api.models.orientdb_engine import orient_db_pool
+from api.utils.directories_utils import directory_cache
+from api.utils.orders_rules_utils import orders_rules_cache
+from api.utils.ptn_tags_utils import ptn_tag_cache
+
+# Process-wide caches: name -> cache with stats() and invalidate()
+PROCESS_CACHES = {
+    'ptn_tags': ptn_tag_cache,
+    'directories': directory_cache,
+    'orders_rules': orders_rules_cache,
+}
+
+
+def get_service_stats() -> dict:
+    """
+        Counters of OrientDB connection pool and process-wide caches of this worker process
+    """
+    stats = {'pid': os.getpid(), 'orientdb_pool': orient_db_pool.stats()}
+    for name, process_cache in PROCESS_CACHES.items():
+        stats[name] = process_cache.stats()
+    return stats
+
+
+def invalidate_caches(names: List[str] | None = None) -> List[str]:
+    """
+        Drop process-wide caches (all caches if names are not given), they are reloaded on next request.
+        Returns names of invalidated caches.
+    """
+    names = list(PROCESS_CACHES) if not names else names
+    for name in names:
+        PROCESS_CACHES[name].invalidate()
+    return names
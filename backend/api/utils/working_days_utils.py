@@ -0,0 +1,111 @@
+from datetime import date
+
+import numpy as np
+from django.db import connection, transaction
+
+from api.models.semd_models import OncorSettings
+
+# Code of setting with working days calendar: {"holidays": ["2024-01-01", ...], "workdays": ["2024-04-27", ...]},
+# workdays are weekends transferred to working days
+WORKING_CALENDAR_CODE = 'working_calendar'
+
+# Public holidays of Russia (month, day), they are used for years which are not in calendar setting
+RUSSIAN_HOLIDAYS = (
+    (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7), (1, 8),
+    (2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4),
+)
+RUSSIAN_HOLIDAYS_YEARS = range(2000, 2101)
+
+# Working days of milestone facts are computed and saved for chunks of this size
+WORKING_DAYS_CHUNK_SIZE = 100000
+
+
+class WorkingCalendar:
+    """
+        Calendar of working days, counts of working days are computed for arrays of dates at once
+    """
+
+    def __init__(self, holidays: list, workdays: list):
+        self.holidays = np.unique(np.array(holidays, dtype='datetime64[D]'))
+        self.workdays = np.unique(np.array(workdays, dtype='datetime64[D]'))
+
+    def count_working_days(self, dates_from: np.ndarray, dates_to: np.ndarray) -> np.ndarray:
+        """
+            Counts of working days after date from up to date to inclusive
+        """
+        begins = dates_from + np.timedelta64(1, 'D')
+        ends = dates_to + np.timedelta64(1, 'D')
+        return np.busday_count(begins, ends, holidays=self.holidays) + \
+            np.searchsorted(self.workdays, ends) - np.searchsorted(self.workdays, begins)
+
+
+def get_working_calendar() -> WorkingCalendar:
+    """
+        Calendar from setting, years which are not in setting get public holidays of Russia
+    """
+    try:
+        value = OncorSettings.objects.get(code=WORKING_CALENDAR_CODE).value or dict()
+    except OncorSettings.DoesNotExist:
+        value = dict()
+
+    holidays = [date.fromisoformat(d) for d in value.get('holidays', list())]
+    workdays = [date.fromisoformat(d) for d in value.get('workdays', list())]
+
+    years = {d.year for d in holidays + workdays}
+    holidays += [date(year, month, day) for year in RUSSIAN_HOLIDAYS_YEARS if year not in years
+                 for month, day in RUSSIAN_HOLIDAYS]
+
+    return WorkingCalendar(holidays, workdays)
+
+
+def fill_milestone_facts_working_days(calendar: WorkingCalendar | None = None, only_missing: bool = False) -> int:
+    """
+        Compute working days from diagnosis set date of all milestone facts (only of facts without working days
+        if only missing). Returns count of updated facts.
+    """
+    if calendar is None:
+        calendar = get_working_calendar()
+
+    rows = 0
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    f.id, pdm.diagnosis_date, f.days
+                FROM
+                    api_patientdiagnosismilestonefact f
+                    JOIN api_patientdiagnosismilestones pdm ON pdm.id = f.patient_diagnosis_id
+                WHERE
+                    f.id > %s AND""" + ("""
+                    f.working_days IS NULL AND""" if only_missing else "") + """
+                    f.days IS NOT NULL AND
+                    pdm.diagnosis_date IS NOT NULL
+                ORDER BY
+                    f.id
+                LIMIT %s
+            """, [last_id, WORKING_DAYS_CHUNK_SIZE])
+            facts = cursor.fetchall()
+        if not facts:
+            return rows
+
+        ids, diagnosis_dates, days = zip(*facts)
+        dates_from = np.array(diagnosis_dates, dtype='datetime64[D]')
+        dates_to = dates_from + np.array(days, dtype='timedelta64[D]')
+        working_days = calendar.count_working_days(dates_from, dates_to)
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE
+                        api_patientdiagnosismilestonefact f
+                    SET
+                        working_days = v.working_days
+                    FROM
+                        unnest(%s::bigint[], %s::int[]) AS v(id, working_days)
+                    WHERE
+                        f.id = v.id
+                """, [list(ids), working_days.tolist()])
+
+        rows += len(facts)
+        last_id = ids[-1]
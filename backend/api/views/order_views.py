@@ -1,17 +1,24 @@
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema, OpenApiParameter
+from drf_spectacular.utils import extend_schema, OpenApiParameter, PolymorphicProxySerializer
 from rest_framework import status
+from rest_framework.decorators import action
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from api.services.order_services.order_F14v2_services import GetF14v2Service
+from api.services.order_services.order_F14v2_drill_down_services import GetF14v2DrillDownService
 from api.utils.base_utils import expand_dict
 from api.models.orientdb_engine import Patient
-from api.permissions.permissions import OnlyListPermission
-from api.serializers.order_serializers import F14ListSerializer, F14Serializer, F14v2Serializer, F14v2ListSerializer
+from api.models.semd_models import ReportJob, PatientDiagnosisMilestones
+from api.permissions.permissions import OnlyListPermission, CreateRetrievePermission
+from api.serializers.order_serializers import F14ListSerializer, F14Serializer, F14v2Serializer, F14v2ListSerializer, \
+    ReportJobSerializer, ReportJobDetailsSerializer, ReportJobCreateSerializer, F14v2DrillDownSerializer, \
+    F14v2DrillDownListSerializer
 from api.serializers.serializers import simple_responses
 from api.services.order_services.order_F14_services import GetF14Service
+from api.services.order_services.order_report_job_services import CreateReportJobService, GetReportJobService, \
+    GetReportJobResultService
 
 
 @extend_schema(tags=['Orders reports'])
@@ -54,6 +61,12 @@ class F14v2ViewSet(ModelViewSet):
                              description='Orders F14 report period date from condition.'),
             OpenApiParameter('date_to', OpenApiTypes.DATE, OpenApiParameter.QUERY,
                              description='Orders F14 report period date to condition.'),
+            OpenApiParameter('granularity', OpenApiTypes.STR, OpenApiParameter.QUERY, enum=['month', 'week'],
+                             description='Granularity of series: counts of every report row and MO are '
+                                         'returned also by months or weeks of report period.'),
+            OpenApiParameter('distribution', OpenApiTypes.BOOL, OpenApiParameter.QUERY, required=False,
+                             description='Return also distributions of days to referral and protocol '
+                                         '(median, p75, p90 and histogram) of every report row and MO.'),
         ],
     )
     def list(self, request: Request, *args, **kwargs):
@@ -62,3 +75,93 @@ class F14v2ViewSet(ModelViewSet):
         """
         f14v2_list = GetF14v2Service.execute(request, self, *args, **kwargs)
         return Response(f14v2_list.data)
+
+
+@extend_schema(tags=['Orders reports'])
+class F14v2DrillDownViewSet(ModelViewSet):
+    queryset = PatientDiagnosisMilestones.objects.all()
+    permission_classes = (OnlyListPermission,)
+    serializer_class = F14v2DrillDownSerializer
+
+    @extend_schema(
+        summary='Retrieve patients of orders F14 v.2 report cell',
+        description='Retrieve patients with diagnosis in period which have no milestone of report cell '
+                    '(referral or protocol of report row), bla-bla-bla...',
+        responses=expand_dict({status.HTTP_200_OK: F14v2DrillDownListSerializer, }, simple_responses),
+        parameters=[
+            OpenApiParameter('date_from', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                             description='Orders F14 report period date from condition.'),
+            OpenApiParameter('date_to', OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                             description='Orders F14 report period date to condition.'),
+            OpenApiParameter('services_group', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description='Medical services group of report row.'),
+            OpenApiParameter('service_code', OpenApiTypes.STR, OpenApiParameter.QUERY, required=False, many=True,
+                             description='Codes of services of report row (required if services group has '
+                                         'several report rows).'),
+            OpenApiParameter('indicator', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             enum=['referrals_count', 'protocols_count'],
+                             description='Indicator of report cell: patients without referral or protocol.'),
+            OpenApiParameter('mo_oid', OpenApiTypes.STR, OpenApiParameter.QUERY, required=False,
+                             description='Medical organization OID of report cell (all MO if it is not set).'),
+            OpenApiParameter('page', OpenApiTypes.INT, OpenApiParameter.QUERY, required=False,
+                             description='Number of page.'),
+        ],
+    )
+    def list(self, request: Request, *args, **kwargs):
+        """
+            Retrieve patients of orders F14 v.2 report cell
+        """
+        f14v2_drill_down_list = GetF14v2DrillDownService.execute(request, self, *args, **kwargs)
+        return Response(f14v2_drill_down_list.data)
+
+
+@extend_schema(tags=['Orders reports'])
+class ReportJobViewSet(ModelViewSet):
+    queryset = ReportJob.objects.all()
+    permission_classes = (CreateRetrievePermission,)
+    serializer_class = ReportJobSerializer
+
+    @extend_schema(
+        summary='Create orders report job',
+        description='Create job of orders F14 or F14 v.2 report, report is computed asynchronously, '
+                    'status and progress of job can be polled by its id, bla-bla-bla...',
+        request=ReportJobCreateSerializer,
+        responses=expand_dict({status.HTTP_202_ACCEPTED: ReportJobDetailsSerializer, }, simple_responses),
+    )
+    def create(self, request: Request, *args, **kwargs):
+        """
+            Create orders report job
+        """
+        report_job = CreateReportJobService.execute(request, self, *args, **kwargs)
+        return Response(report_job.data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        summary='Retrieve status of orders report job',
+        description='Retrieve status and progress of orders report job, bla-bla-bla...',
+        responses=expand_dict({status.HTTP_200_OK: ReportJobDetailsSerializer, }, simple_responses),
+    )
+    def retrieve(self, request: Request, *args, **kwargs):
+        """
+            Retrieve status of orders report job
+        """
+        report_job = GetReportJobService.execute(request, self, *args, **kwargs)
+        return Response(report_job.data)
+
+    @extend_schema(
+        summary='Retrieve result of orders report job',
+        description='Retrieve result of done orders report job (the same as synchronous report), bla-bla-bla...',
+        responses=expand_dict({
+            status.HTTP_200_OK: PolymorphicProxySerializer(
+                component_name='ReportJobResult',
+                serializers=[F14ListSerializer, F14v2ListSerializer],
+                resource_type_field_name=None,
+            ),
+        }, simple_responses),
+    )
+    @action(detail=True)
+    def result(self, request: Request, *args, **kwargs):
+        """
+            Retrieve result of orders report job
+        """
+        report_job_result = GetReportJobResultService.execute(request, self, *args, **kwargs)
+        return Response(report_job_result.data)
@@ -10,9 +10,10 @@ from api.utils.base_utils import expand_dict
 from api.models.orientdb_engine import Patient
 from api.permissions.patient_permission import PatientPermission
 from api.serializers.patient_serializers import PatientSerializer, PatientListSerializer, PatientDetailsSerializer, \
-    PatientListDiagnosisSerializer
+    PatientListDiagnosisSerializer, PatientSuggestListSerializer
 from api.serializers.serializers import simple_responses
-from api.services.patient_services import GetPatientListService, GetPatientDetailsService, GetPatientDiagnosesService
+from api.services.patient_services import GetPatientListService, GetPatientDetailsService, GetPatientDiagnosesService, \
+    GetPatientSuggestService
 
 
 @extend_schema(tags=['Patient'])
@@ -36,6 +37,12 @@ class PatientViewSet(ModelViewSet):
                                          '(by content case insensitive).'),
             OpenApiParameter('page', OpenApiTypes.INT, OpenApiParameter.QUERY,
                              description='A page number within the paginated result set.'),
+            OpenApiParameter('cursor', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description='An opaque cursor of the page (next_cursor of the previous page, '
+                                         'empty for the first page). Is ignored if page parameter is set.'),
+            OpenApiParameter('count', OpenApiTypes.BOOL, OpenApiParameter.QUERY,
+                             description='Recalculate count of items (otherwise cached count is returned, '
+                                         'in cursor mode it may be null).'),
         ],
     )
     def list(self, request: Request, *args, **kwargs):
@@ -70,6 +77,25 @@ class PatientViewSet(ModelViewSet):
         patient_diagnoses = GetPatientDiagnosesService.execute(request, self, *args, **kwargs)
         return Response(patient_diagnoses.data)
 
+    @extend_schema(
+        summary='Retrieve patient autocomplete suggestions',
+        description='Retrieve patient autocomplete suggestions from in-process index, bla-bla-bla...',
+        responses=expand_dict({status.HTTP_200_OK: PatientSuggestListSerializer, }, simple_responses),
+        parameters=[
+            OpenApiParameter('q', OpenApiTypes.STR, OpenApiParameter.QUERY, required=True,
+                             description='Words of patient name or snils (by prefix or content case insensitive).'),
+            OpenApiParameter('limit', OpenApiTypes.INT, OpenApiParameter.QUERY,
+                             description='Maximum number of suggestions (10 by default, 100 at most).'),
+        ],
+    )
+    @action(detail=False)
+    def suggest(self, request, *args, **kwargs):
+        """
+            Retrieve patient autocomplete suggestions
+        """
+        patient_suggest = GetPatientSuggestService.execute(request, self, *args, **kwargs)
+        return Response(patient_suggest.data)
+
     # @extend_schema(
     #     summary='Retrieve medical cards of patient',
     #     description='Retrieve medical cards of patient, bla-bla-bla...',
@@ -103,6 +103,12 @@ class DiagnosisRegistryViewSet(ModelViewSet):
                                          '(by content case insensitive).'),
             OpenApiParameter('page', OpenApiTypes.INT, OpenApiParameter.QUERY,
                              description='A page number within the paginated result set.'),
+            OpenApiParameter('cursor', OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description='An opaque cursor of the page (next_cursor of the previous page, '
+                                         'empty for the first page). Is ignored if page parameter is set.'),
+            OpenApiParameter('count', OpenApiTypes.BOOL, OpenApiParameter.QUERY,
+                             description='Recalculate count of items (otherwise cached count is returned, '
+                                         'in cursor mode it may be null).'),
         ],
     )
     @action(detail=True)
@@ -0,0 +1,56 @@
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.viewsets import ModelViewSet
+
+from api.models.orientdb_engine import Patient
+from api.permissions.permissions import ServicePermission
+from api.serializers.serializers import simple_responses
+from api.serializers.service_serializers import ServiceStatsSerializer, ServiceStatsDetailsSerializer, \
+    ServiceCachesInvalidateSerializer
+from api.services.service_services import GetServiceStatsService, InvalidateServiceCachesService
+from api.utils.base_utils import expand_dict
+from api.utils.service_stats_utils import PROCESS_CACHES
+
+
+@extend_schema(tags=['Service'])
+class ServiceStatsViewSet(ModelViewSet):
+    queryset = Patient.objects.all()    # Fantom model (only for ModelViewSet)
+    permission_classes = (ServicePermission,)
+    serializer_class = ServiceStatsSerializer
+
+    @extend_schema(
+        summary='Retrieve counters of OrientDB connection pool and process-wide caches',
+        description='Retrieve counters of OrientDB connection pool and process-wide caches of worker process which serves request '
+                    '(only for staff users), bla-bla-bla...',
+        responses=expand_dict({status.HTTP_200_OK: ServiceStatsDetailsSerializer, }, simple_responses),
+    )
+    def list(self, request: Request, *args, **kwargs):
+        """
+            Retrieve counters of OrientDB connection pool and process-wide caches
+        """
+        service_stats = GetServiceStatsService.execute(request, self, *args, **kwargs)
+        return Response(service_stats.data)
+
+    @extend_schema(
+        summary='Invalidate process-wide caches',
+        description='Drop process-wide caches of worker process which serves request, they are reloaded on next '
+                    'request (only for staff users), bla-bla-bla...',
+        request=None,
+        responses=expand_dict({status.HTTP_200_OK: ServiceCachesInvalidateSerializer, }, simple_responses),
+        parameters=[
+            OpenApiParameter('cache', OpenApiTypes.STR, OpenApiParameter.QUERY, required=False, many=True,
+                             enum=sorted(PROCESS_CACHES),
+                             description='Cache to invalidate (all caches if it is not set).'),
+        ],
+    )
+    @action(detail=False, methods=['post'])
+    def invalidate(self, request: Request, *args, **kwargs):
+        """
+            Invalidate process-wide caches
+        """
+        service_caches = InvalidateServiceCachesService.execute(request, self, *args, **kwargs)
+        return Response(service_caches.data)
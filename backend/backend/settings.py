@@ -128,6 +128,18 @@ except:
 ORIENTDB_NAME: str = os.environ.get('ORIENTDB_NAME', 'test')
 ORIENTDB_USER: str = os.environ.get('ORIENTDB_USER', 'admin')
 ORIENTDB_PASSWORD: str = os.environ.get('ORIENTDB_PASSWORD', '')
+try:
+    ORIENTDB_POOL_SIZE: int = int(os.environ.get('ORIENTDB_POOL_SIZE', 10))
+except:
+    ORIENTDB_POOL_SIZE = 10
+try:
+    ORIENTDB_POOL_TIMEOUT: float = float(os.environ.get('ORIENTDB_POOL_TIMEOUT', 30))
+except:
+    ORIENTDB_POOL_TIMEOUT = 30
+try:
+    ORIENTDB_POOL_HEALTH_CHECK_INTERVAL: float = float(os.environ.get('ORIENTDB_POOL_HEALTH_CHECK_INTERVAL', 60))
+except:
+    ORIENTDB_POOL_HEALTH_CHECK_INTERVAL = 60
 
 DATABASES = {
     'default': {
@@ -250,6 +262,25 @@ REST_FRAMEWORK = {
 }
 
 PAGE_SIZE: int = int(os.environ.get('PAGE_SIZE', 10))
+PATIENTS_COUNT_CACHE_TIMEOUT: int = int(os.environ.get('PATIENTS_COUNT_CACHE_TIMEOUT', 300))
+PATIENTS_SEARCH_MAX_RIDS: int = int(os.environ.get('PATIENTS_SEARCH_MAX_RIDS', 1000))
+PATIENTS_SUGGEST_REFRESH_INTERVAL: int = int(os.environ.get('PATIENTS_SUGGEST_REFRESH_INTERVAL', 60))
+PATIENTS_SUGGEST_REBUILD_INTERVAL: int = int(os.environ.get('PATIENTS_SUGGEST_REBUILD_INTERVAL', 3600))
+PTN_TAGS_CACHE_TTL: int = int(os.environ.get('PTN_TAGS_CACHE_TTL', 600))
+ORDERS_RULES_CHECK_INTERVAL: int = int(os.environ.get('ORDERS_RULES_CHECK_INTERVAL', 30))
+DIRECTORY_CACHE_CHECK_INTERVAL: int = int(os.environ.get('DIRECTORY_CACHE_CHECK_INTERVAL', 300))
+DIRECTORY_SNAPSHOT_PATH: str = os.environ.get('DIRECTORY_SNAPSHOT_PATH', '')
+REPORT_JOBS_WORKERS: int = int(os.environ.get('REPORT_JOBS_WORKERS', 2))
+REPORT_JOBS_HEARTBEAT_INTERVAL: int = int(os.environ.get('REPORT_JOBS_HEARTBEAT_INTERVAL', 30))
+REPORT_JOBS_STALE_TIMEOUT: int = int(os.environ.get('REPORT_JOBS_STALE_TIMEOUT', 300))
+REPORT_QUERY_WORKERS: int = int(os.environ.get('REPORT_QUERY_WORKERS', 4))
+REPORT_QUERY_TIMEOUT: int = int(os.environ.get('REPORT_QUERY_TIMEOUT', 600))
+REPORT_SINGLEFLIGHT_TIMEOUT: int = int(os.environ.get('REPORT_SINGLEFLIGHT_TIMEOUT', 60))
+CUBES_LOAD_BATCH_SIZE: int = int(os.environ.get('CUBES_LOAD_BATCH_SIZE', 50000))
+CUBES_LOAD_MEMORY_CAP_MB: int = int(os.environ.get('CUBES_LOAD_MEMORY_CAP_MB', 64))
+CUBES_FILL_WORKERS: int = int(os.environ.get('CUBES_FILL_WORKERS', 1))
+CUBES_FILL_CHUNK_SIZE: int = int(os.environ.get('CUBES_FILL_CHUNK_SIZE', 1000))
+CUBES_UNMATCHED_RETRY_DAYS: int = int(os.environ.get('CUBES_UNMATCHED_RETRY_DAYS', 7))
 
 SPECTACULAR_SETTINGS = {
     'TITLE': 'ONCOR Prototypes API',
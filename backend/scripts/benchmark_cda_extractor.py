@@ -0,0 +1,166 @@
+import time
+from datetime import date
+
+import xmltodict
+from django.db import connections
+
+from api.utils.cda_utils import extract_cda
+
+DEFAULT_LIMIT = 500
+
+
+def run(*args):
+    """
+        Compare SEMD extraction paths on the latest messages of vimis_sending:
+        - xmltodict: XPath fragments are selected by Postgres and every fragment is parsed by xmltodict
+        - lxml: payload is selected as is and parsed once by precompiled XPath expressions
+        Usage: python manage.py runscript benchmark_cda_extractor --script-args limit=1000
+    """
+    print("-----------------------------------------------------------------------")
+    print("Benchmark of CDA extractor was started!")
+    limit = DEFAULT_LIMIT
+    for arg in args:
+        if arg.startswith('limit='):
+            limit = int(arg[len('limit='):])
+
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute(f"SELECT internal_message_id FROM vimis_sending ORDER BY date_time DESC LIMIT {limit}")
+        messages = [row[0] for row in cursor.fetchall()]
+    print(f"Found {len(messages)} messages.")
+    if not messages:
+        return
+    messages_condition = 'internal_message_id in (' + ','.join("'" + m + "'" for m in messages) + ')'
+
+    # xmltodict path: query with XPath in database + parsing of fragments
+    start = time.perf_counter()
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute(LEGACY_QUERY + messages_condition)
+        fragments = cursor.fetchall()
+    legacy_query_time = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy_result = {
+        internal_message_id: (
+            legacy_parse_diagnoses(diagnoses),
+            legacy_parse_services(services, '1.2.643.5.1.13.13.11.1070'),
+            legacy_parse_services(instrumental_diagnostics, '1.2.643.5.1.13.13.11.1471'),
+        )
+        for internal_message_id, diagnoses, services, instrumental_diagnostics in fragments
+    }
+    legacy_parse_time = time.perf_counter() - start
+
+    # lxml path: query of payloads + parsing of documents
+    start = time.perf_counter()
+    with connections['egisz-db'].cursor() as cursor:
+        cursor.execute("SELECT internal_message_id, payload FROM vimis_sending WHERE " + messages_condition)
+        payloads = cursor.fetchall()
+    lxml_query_time = time.perf_counter() - start
+    start = time.perf_counter()
+    lxml_result = dict()
+    for internal_message_id, payload in payloads:
+        try:
+            document = extract_cda(payload)
+        except Exception:
+            continue
+        lxml_result[internal_message_id] = (
+            {(d.mkb10, d.date) for d in document.diagnoses},
+            {(s.code, s.date) for s in document.services},
+            {(s.code, s.date) for s in document.instrumental_diagnostics},
+        )
+    lxml_parse_time = time.perf_counter() - start
+
+    mismatches = sum(1 for m in legacy_result if legacy_result[m] != lxml_result.get(m, None))
+
+    n = len(messages)
+    print(f"xmltodict: query {legacy_query_time:.3f}s, parse {legacy_parse_time:.3f}s, "
+          f"{n / (legacy_query_time + legacy_parse_time):.1f} documents/s "
+          f"(parse only {n / max(legacy_parse_time, 1e-9):.1f} documents/s)")
+    print(f"lxml:      query {lxml_query_time:.3f}s, parse {lxml_parse_time:.3f}s, "
+          f"{n / (lxml_query_time + lxml_parse_time):.1f} documents/s "
+          f"(parse only {n / max(lxml_parse_time, 1e-9):.1f} documents/s)")
+    print(f"Documents with different results: {mismatches}")
+    print("-----------------------------------------------------------------------")
+
+
+LEGACY_QUERY = """
+    SELECT
+        internal_message_id,
+        regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[x:observation[x:value[@codeSystem="1.2.643.5.1.13.13.11.1005"]]]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as diagnoses,
+        regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as services,
+        regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[@codeSystem="1.2.643.5.1.13.13.11.1471"]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as instrumental_diagnostics
+    FROM
+        vimis_sending
+    WHERE
+"""
+
+
+def legacy_parse_date(value) -> date | None:
+    if not isinstance(value, str) or len(value) < 8:
+        return None
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        return None
+
+
+def legacy_parse_diagnoses(xml_diagnoses: str | None) -> set:
+    # Fragment walk of xmltodict path (as it was in fill_cubes)
+    diagnoses = set()
+    for xml in (xml_diagnoses or '').split('<new/>'):
+        if not xml:
+            continue
+        try:
+            parent = xmltodict.parse(xml)
+            for parent_key, parent_dict in parent.items():
+                if not isinstance(parent_dict, dict):
+                    continue
+                for key, entry_list in parent_dict.items():
+                    if not isinstance(entry_list, list):
+                        entry_list = [entry_list]
+                    for entry in entry_list:
+                        if not isinstance(entry, dict) or not isinstance(entry.get('observation', None), dict):
+                            continue
+                        observation = entry['observation']
+                        effective_times = observation.get('effectiveTime', None)
+                        diagnosis_date = legacy_parse_date(effective_times.get('@value', None)) \
+                            if isinstance(effective_times, dict) else None
+                        values = observation.get('value', None)
+                        if not isinstance(values, list):
+                            values = [values]
+                        for value in values:
+                            if isinstance(value, dict) and value.get('@codeSystem', '') == '1.2.643.5.1.13.13.11.1005':
+                                if value.get('@code', None):
+                                    diagnoses.add((value['@code'], diagnosis_date))
+                                break
+        except Exception:
+            pass
+
+    return diagnoses
+
+
+def legacy_parse_services(xml_services: str | None, code_system: str) -> set:
+    # Fragment walk of xmltodict path (as it was in fill_cubes)
+    services = set()
+    for xml in (xml_services or '').split('<new/>'):
+        if not xml:
+            continue
+        try:
+            parent = xmltodict.parse(xml)
+            for parent_key, parent_dict in parent.items():
+                if not isinstance(parent_dict, dict):
+                    continue
+                service_date = None
+                effective_times = parent_dict.get('effectiveTime', None)
+                if isinstance(effective_times, dict):
+                    service_date = legacy_parse_date(effective_times.get('@value', None))
+                    if service_date is None and isinstance(effective_times.get('low', None), dict):
+                        service_date = legacy_parse_date(effective_times['low'].get('@value', None))
+                for key, value in parent_dict.items():
+                    if isinstance(value, dict) and value.get('@codeSystem', '') == code_system:
+                        if value.get('@code', None):
+                            services.add((value['@code'], service_date))
+                        break
+        except Exception:
+            pass
+
+    return services
+
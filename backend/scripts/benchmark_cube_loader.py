@@ -0,0 +1,113 @@
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from django.db import connection, transaction
+
+from api.models.semd_models import SemdDiagnosis, SemdService
+from api.utils.cube_loader_utils import LOAD_METHOD_BULK_CREATE, LOAD_METHOD_COPY, SEMD_DIAGNOSIS_COLUMNS, \
+    SEMD_SERVICE_COLUMNS, get_semd_cubes_loaders
+
+DEFAULT_PATIENTS = 20000
+SEMDS_PER_PATIENT = 5
+
+
+def run(*args):
+    """
+        Compare loaders of SEMD cubes in rows/second:
+        - save: every row is saved by its own INSERT in transaction of patient (previous fill_cubes path)
+        - bulk_create: rows are buffered and saved by bulk_create batches
+        - copy: rows are buffered and written by COPY FROM STDIN batches
+        Rows are synthetic and are loaded to temporary tables which hide the real cubes in the benchmark
+        transaction only.
+        Usage: python manage.py runscript benchmark_cube_loader --script-args patients=50000
+    """
+    print("-----------------------------------------------------------------------")
+    print("Benchmark of cube loaders was started!")
+    patients = DEFAULT_PATIENTS
+    for arg in args:
+        if arg.startswith('patients='):
+            patients = int(arg[len('patients='):])
+
+    start = time.perf_counter()
+    rows = get_fixture_rows(patients)
+    diagnoses_count = sum(len(diagnoses) for diagnoses, _ in rows)
+    services_count = sum(len(services) for _, services in rows)
+    print(f"Fixture rows of {patients} patients ({diagnoses_count} diagnoses, {services_count} services) "
+          f"were generated in {time.perf_counter() - start:.3f}s")
+
+    with transaction.atomic():
+        for method, load in (
+            ('save', load_by_save),
+            (LOAD_METHOD_BULK_CREATE, lambda r: load_by_loaders(r, LOAD_METHOD_BULK_CREATE)),
+            (LOAD_METHOD_COPY, lambda r: load_by_loaders(r, LOAD_METHOD_COPY)),
+        ):
+            create_fixture_cubes()
+            start = time.perf_counter()
+            load(rows)
+            elapsed = time.perf_counter() - start
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT (SELECT COUNT(*) FROM api_semddiagnosis), (SELECT COUNT(*) FROM api_semdservice)')
+                counts = cursor.fetchone()
+            status = 'Ok' if counts == (diagnoses_count, services_count) else f"MISMATCH {counts}"
+            print(f"{method:>12}: {elapsed:.3f}s, {(diagnoses_count + services_count) / elapsed:.0f} rows/s, {status}")
+
+    print("Benchmark of cube loaders has finished.")
+
+
+def get_fixture_rows(patients: int) -> list:
+    """
+        Rows of cubes grouped by patient: [(diagnoses rows, services rows)]
+    """
+    rnd = random.Random(1)
+    day = date(2024, 1, 1)
+    result = list()
+    for p in range(patients):
+        ptn = ('#' + str(p), 'P' + str(p), '1.2.643.5.1.13.13.12.' + str(p % 100), ['#7:' + str(p % 10)])
+        diagnoses = list()
+        services = list()
+        for s in range(SEMDS_PER_PATIENT):
+            time_rc = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rnd.randrange(500000))
+            semd = ptn + ('#r' + str(p) + '.' + str(s), time_rc, rnd.choice(('1', '5', '20', '27')), '75', '3',
+                          '1.2.643.5.1.13.13.12.' + str(rnd.randrange(100)), '000-000-000 00', '109',
+                          'msg-' + str(p) + '-' + str(s))
+            diagnoses.append(semd + ('C50.' + str(rnd.randrange(10)), day + timedelta(days=rnd.randrange(365)), None,
+                                     '1', '2', 'Malignant neoplasm\tof breast', 'Final', 'Main', 'Diagnosis', 'OBS'))
+            services.append(semd + ('A06.20.004', day + timedelta(days=rnd.randrange(365)), None))
+        result.append((diagnoses, services))
+    return result
+
+
+def create_fixture_cubes():
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            DROP TABLE IF EXISTS pg_temp.api_semddiagnosis;
+            DROP TABLE IF EXISTS pg_temp.api_semdservice;
+            CREATE TEMPORARY TABLE api_semddiagnosis
+                (LIKE public.api_semddiagnosis INCLUDING ALL)
+                ON COMMIT DROP;
+            CREATE TEMPORARY TABLE api_semdservice
+                (LIKE public.api_semdservice INCLUDING ALL)
+                ON COMMIT DROP;
+        """)
+
+
+def load_by_save(rows: list):
+    for diagnoses, services in rows:
+        with transaction.atomic():
+            for row in diagnoses:
+                SemdDiagnosis(**dict(zip(SEMD_DIAGNOSIS_COLUMNS, row))).save()
+            for row in services:
+                SemdService(**dict(zip(SEMD_SERVICE_COLUMNS, row))).save()
+
+
+def load_by_loaders(rows: list, method: str):
+    diagnoses_loader, services_loader = get_semd_cubes_loaders(method)
+    for diagnoses, services in rows:
+        for row in diagnoses:
+            diagnoses_loader.add(row)
+        for row in services:
+            services_loader.add(row)
+    diagnoses_loader.close()
+    services_loader.close()
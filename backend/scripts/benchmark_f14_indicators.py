@@ -0,0 +1,239 @@
+import time
+from datetime import date
+
+from django.db import connection, transaction
+
+from api.services.order_services.order_F14_services import get_grouped_rule_services, get_report_row_counts_query
+
+DEFAULT_PATIENTS = 200000
+DATE_FROM = date(2024, 1, 1)
+DATE_TO = date(2024, 12, 31)
+
+
+def run(*args):
+    """
+        Verify and compare F14 indicators queries:
+        - correlated: three queries for every report row, the first diagnosis date is recomputed for every service
+        - CTE: one query for every report row, the first diagnosis date is computed once
+        Counts of every report row must be equal. By default queries are run on synthetic fixture dataset
+        (temporary tables which hide the real cubes in the benchmark transaction only), with 'real' parameter
+        they are run on the real cubes.
+        Usage: python manage.py runscript benchmark_f14_indicators --script-args patients=500000
+               python manage.py runscript benchmark_f14_indicators --script-args real
+    """
+    print("-----------------------------------------------------------------------")
+    print("Benchmark of F14 indicators was started!")
+    patients = DEFAULT_PATIENTS
+    for arg in args:
+        if arg.startswith('patients='):
+            patients = int(arg[len('patients='):])
+
+    skeleton = get_grouped_rule_services()
+    print(f"Found {len(skeleton)} report rows.")
+    if not skeleton:
+        return
+
+    with transaction.atomic():
+        if 'real' not in args:
+            start = time.perf_counter()
+            create_fixture_cubes(
+                patients,
+                sorted({dz['diagnosis_code'] for record in skeleton for dz in record['diagnoses']}),
+                sorted({srv['service_code'] for record in skeleton for srv in record['services']}),
+            )
+            print(f"Fixture cubes of {patients} patients were created in {time.perf_counter() - start:.3f}s")
+
+        legacy_time = 0.0
+        cte_time = 0.0
+        mismatches = 0
+        for record in skeleton:
+            diagnoses = ','.join(["'" + dz['diagnosis_code'] + "'" for dz in record['diagnoses']])
+            services = ','.join(["'" + srv['service_code'] + "'" for srv in record['services']])
+
+            start = time.perf_counter()
+            legacy_counts = tuple(
+                fetch_count(query) for query in (
+                    legacy_patients_count_query(diagnoses, DATE_FROM, DATE_TO),
+                    legacy_referrals_count_query(diagnoses, services, DATE_FROM, DATE_TO),
+                    legacy_protocols_count_query(diagnoses, services, DATE_FROM, DATE_TO),
+                )
+            )
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(get_report_row_counts_query(diagnoses, services, DATE_FROM, DATE_TO))
+                cte_counts = tuple(cursor.fetchone())
+            cte_time += time.perf_counter() - start
+
+            if legacy_counts != cte_counts:
+                mismatches += 1
+                print(f"    {record['services_group']}: correlated {legacy_counts} != CTE {cte_counts}")
+
+    print(f"correlated: {legacy_time:.3f}s ({3 * len(skeleton)} queries)")
+    print(f"CTE:        {cte_time:.3f}s ({len(skeleton)} queries)")
+    print(f"Report rows with different counts: {mismatches}")
+    print("-----------------------------------------------------------------------")
+
+
+def fetch_count(query_body: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        rows = cursor.fetchall()
+    return rows[0][0] if rows and len(rows) == 1 else 0
+
+
+def create_fixture_cubes(patients: int, diagnoses: list, services: list):
+    # Noise codes are not in any report row, diagnoses and services dates are around of report period
+    diagnoses_array = 'ARRAY[' + ','.join(["'" + dz + "'" for dz in diagnoses + ['Z00.0', 'J06.9']]) + ']'
+    services_array = 'ARRAY[' + ','.join(["'" + srv + "'" for srv in services + ['A00.00.000']]) + ']'
+    document_types_array = "ARRAY['1','27','2','3','4','9','12','20','5']"
+    date_start = "DATE '" + DATE_FROM.strftime('%Y-%m-%d') + "' - 120"
+
+    query_body = """
+        CREATE TEMPORARY TABLE api_semddiagnosis
+            (LIKE public.api_semddiagnosis INCLUDING ALL)
+            ON COMMIT DROP;
+        CREATE TEMPORARY TABLE api_semdservice
+            (LIKE public.api_semdservice INCLUDING ALL)
+            ON COMMIT DROP;
+        INSERT INTO
+            api_semddiagnosis (id, ptn_id, rc_id, diagnosis_mkb10, diagnosis_date)
+        SELECT
+            row_number() OVER (),
+            '#' || p,
+            '#r' || p || '.' || d,
+            (""" + diagnoses_array + """)[1 + floor(random() * """ + str(len(diagnoses) + 2) + """)::int],
+            CASE WHEN random() < 0.05 THEN NULL ELSE """ + date_start + """ + floor(random() * 600)::int END
+        FROM
+            generate_series(1, """ + str(patients) + """) AS p,
+            generate_series(1, 1 + p % 3) AS d;
+        INSERT INTO
+            api_semdservice (id, ptn_id, rc_id, service_code, time_rc, service_date, document_type)
+        SELECT
+            row_number() OVER (),
+            '#' || p,
+            '#r' || p || '.' || s,
+            (""" + services_array + """)[1 + floor(random() * """ + str(len(services) + 1) + """)::int],
+            (""" + date_start + """ + floor(random() * 600)::int)::timestamp + random() * INTERVAL '1 day',
+            CASE WHEN random() < 0.05 THEN NULL ELSE """ + date_start + """ + floor(random() * 600)::int END,
+            (""" + document_types_array + """)[1 + floor(random() * 9)::int]
+        FROM
+            generate_series(1, """ + str(patients) + """) AS p,
+            generate_series(1, p % 5) AS s;
+        ANALYZE api_semddiagnosis;
+        ANALYZE api_semdservice;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+
+
+def legacy_patients_count_query(diagnoses: str, date_from: date, date_to: date) -> str:
+    # Correlated subquery path (as it was in F14 service)
+    return """
+        SELECT
+            COUNT(sd.*) as patient_count
+        FROM
+            (SELECT
+                 ptn_id, MIN(diagnosis_date) AS min_diagnosis_date
+             FROM
+                 api_semddiagnosis
+             WHERE
+                 diagnosis_mkb10 IN (""" + diagnoses + """)
+             GROUP BY
+                 ptn_id) AS sd
+        WHERE
+            min_diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """'
+    """
+
+
+def legacy_referrals_count_query(diagnoses: str, services: str, date_from: date, date_to: date) -> str:
+    # Correlated subquery path (as it was in F14 service)
+    return """
+        SELECT
+            COUNT(sd.*) as referrals_count
+        FROM
+            (SELECT
+                 ssd.ptn_id, ssd.min_diagnosis_date
+             FROM
+                 (SELECT
+                      ptn_id, MIN(diagnosis_date) AS min_diagnosis_date
+                  FROM
+                      api_semddiagnosis
+                  WHERE
+                      diagnosis_mkb10 IN (""" + diagnoses + """)
+                  GROUP BY
+                      ptn_id) AS ssd
+             WHERE
+                 min_diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """') AS sd
+            LEFT JOIN
+                (SELECT
+                     sss.ptn_id, MIN(sss.time_rc) AS min_services_date
+                 FROM
+                     api_semdservice sss
+                 WHERE
+                     sss.time_rc > (SELECT
+                                        sssd.min_diagnosis_date
+                                    FROM
+                                        (SELECT
+                                             MIN(diagnosis_date) AS min_diagnosis_date
+                                         FROM
+                                             api_semddiagnosis
+                                         WHERE
+                                             diagnosis_mkb10 IN (""" + diagnoses + """) AND
+                                             ptn_id = sss.ptn_id) AS sssd
+                                    WHERE
+                                        sssd.min_diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """') AND
+                     service_code IN (""" + services + """) AND
+                     document_type IN ('1','27')
+                 GROUP BY
+                     ptn_id) ss ON sd.ptn_id = ss.ptn_id
+        WHERE
+            ss.min_services_date IS NOT NULL
+        """
+
+
+def legacy_protocols_count_query(diagnoses: str, services: str, date_from: date, date_to: date) -> str:
+    # Correlated subquery path (as it was in F14 service)
+    return """
+            SELECT
+                COUNT(sd.*) AS protocols_count
+            FROM
+                (SELECT
+                     ssd.ptn_id, ssd.min_diagnosis_date
+                 FROM
+                     (SELECT
+                          ptn_id, MIN(diagnosis_date) AS min_diagnosis_date
+                      FROM
+                          api_semddiagnosis
+                      WHERE
+                          diagnosis_mkb10 IN (""" + diagnoses + """)
+                      GROUP BY
+                          ptn_id) AS ssd
+                 WHERE
+                     min_diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """') AS sd
+                LEFT JOIN
+                    (SELECT
+                         sss.ptn_id, MIN(sss.service_date) AS min_services_date
+                     FROM
+                         api_semdservice sss
+                     WHERE
+                         sss.service_date > (SELECT
+                                                sssd.min_diagnosis_date
+                                             FROM
+                                                 (SELECT
+                                                      MIN(diagnosis_date) AS min_diagnosis_date
+                                                  FROM
+                                                      api_semddiagnosis
+                                                  WHERE
+                                                      diagnosis_mkb10 IN (""" + diagnoses + """) AND
+                                                      ptn_id = sss.ptn_id) AS sssd
+                                             WHERE
+                                                 sssd.min_diagnosis_date BETWEEN '""" + date_from.strftime('%Y-%m-%d') + """' AND '""" + date_to.strftime('%Y-%m-%d') + """') AND
+                         service_code IN (""" + services + """) AND
+                         document_type IN ('2','3','4','9','12','20')
+                     GROUP BY
+                         ptn_id) ss ON sd.ptn_id = ss.ptn_id
+            WHERE
+                ss.min_services_date IS NOT NULL;
+        """
@@ -0,0 +1,171 @@
+import copy
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+
+from django.db import connection, transaction
+
+from api.services.order_services.order_F14v2_services import get_grouped_rule_services, get_report_indicators, \
+    query_report_indicators, query_rollup_indicators
+from api.utils.milestones_rollup_utils import MILESTONES_ROLLUP_QUERY
+
+DEFAULT_ROWS = 3000000
+DEFAULT_MOS = 50
+DATE_FROM = date(2024, 1, 1)
+DATE_TO = date(2024, 12, 31)
+
+
+def run(*args):
+    """
+        Compare F14 v.2 indicators paths on synthetic Patient-Diagnosis cube:
+        - per row: three GROUP BY queries for every report row
+        - single pass: report rows are joined to cube as VALUES lists, counts by conditional aggregation
+        - rollup: the same single pass over daily rollup of cube
+        Synthetic cube and rollup are temporary tables which hide the real ones in the benchmark transaction only.
+        Usage: python manage.py runscript benchmark_f14v2_indicators --script-args rows=5000000 mos=100
+    """
+    print("-----------------------------------------------------------------------")
+    print("Benchmark of F14 v.2 indicators was started!")
+    rows = DEFAULT_ROWS
+    mos = DEFAULT_MOS
+    for arg in args:
+        if arg.startswith('rows='):
+            rows = int(arg[len('rows='):])
+        elif arg.startswith('mos='):
+            mos = int(arg[len('mos='):])
+
+    skeleton = get_grouped_rule_services(DATE_FROM, DATE_TO)
+    print(f"Found {len(skeleton)} report rows.")
+    if not skeleton:
+        return
+
+    diagnoses = sorted({dz['diagnosis_code'] for record in skeleton for dz in record['diagnoses']})
+    codes = sorted({code for record in skeleton for code in record['codes']})
+
+    with transaction.atomic():
+        start = time.perf_counter()
+        create_synthetic_cube(rows, mos, diagnoses, codes)
+        print(f"Synthetic cube of {rows} rows was created in {time.perf_counter() - start:.3f}s")
+
+        start = time.perf_counter()
+        rollup_rows = create_synthetic_rollup()
+        print(f"Rollup of {rollup_rows} rows was created in {time.perf_counter() - start:.3f}s")
+
+        start = time.perf_counter()
+        legacy_result = legacy_get_report_indicators(copy.deepcopy(skeleton), DATE_FROM, DATE_TO)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        single_pass_result = get_report_indicators(copy.deepcopy(skeleton), DATE_FROM, DATE_TO,
+                                                   query_indicators=query_report_indicators,
+                                                   query_sla=no_sla_indicators)
+        single_pass_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rollup_result = get_report_indicators(copy.deepcopy(skeleton), DATE_FROM, DATE_TO,
+                                              query_indicators=query_rollup_indicators,
+                                              query_sla=no_sla_indicators)
+        rollup_time = time.perf_counter() - start
+
+    legacy_json = json.dumps(legacy_result['milestones'], sort_keys=True, default=str)
+
+    print(f"per row:     {legacy_time:.3f}s ({3 * len(skeleton)} queries)")
+    print(f"single pass: {single_pass_time:.3f}s, results are equal: "
+          f"{legacy_json == json.dumps(single_pass_result['milestones'], sort_keys=True, default=str)}")
+    print(f"rollup:      {rollup_time:.3f}s, results are equal: "
+          f"{legacy_json == json.dumps(rollup_result['milestones'], sort_keys=True, default=str)}")
+    print("-----------------------------------------------------------------------")
+
+
+def no_sla_indicators(*args, **kwargs) -> list:
+    # SLA counts are got from milestone facts, which are not in synthetic cube
+    return []
+
+
+def create_synthetic_cube(rows: int, mos: int, diagnoses: list, codes: list):
+    # Noise diagnoses are not in any report row
+    diagnoses = diagnoses + ['Z00.0', 'Z01.8', 'J06.9']
+    diagnoses_array = 'ARRAY[' + ','.join(["'" + dz + "'" for dz in diagnoses]) + ']'
+    codes_array = 'ARRAY[' + ','.join(["'" + code + "'" for code in codes]) + ']'
+    days = (DATE_TO - DATE_FROM).days + 1
+
+    query_body = """
+        CREATE TEMPORARY TABLE api_patientdiagnosismilestones
+            (LIKE public.api_patientdiagnosismilestones INCLUDING ALL)
+            ON COMMIT DROP;
+        INSERT INTO
+            api_patientdiagnosismilestones (id, ptn_id, ptn_mo_oid, diagnosis_mkb10, diagnosis_date, diagnosis_milestones)
+        SELECT
+            g,
+            '#' || g,
+            'mo.' || (g % """ + str(mos) + """),
+            (""" + diagnoses_array + """)[1 + floor(random() * """ + str(len(diagnoses)) + """)::int],
+            DATE '""" + DATE_FROM.strftime('%Y-%m-%d') + """' + floor(random() * """ + str(days * 1.2) + """)::int,
+            CASE
+                WHEN random() < 0.6 THEN
+                    jsonb_build_object(
+                        (""" + codes_array + """)[1 + floor(random() * """ + str(len(codes)) + """)::int] || ':нап', 5,
+                        (""" + codes_array + """)[1 + floor(random() * """ + str(len(codes)) + """)::int] || ':исп', 12
+                    )
+                ELSE NULL
+            END
+        FROM
+            generate_series(1, """ + str(rows) + """) AS g;
+        ANALYZE api_patientdiagnosismilestones;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+
+
+def create_synthetic_rollup() -> int:
+    query_body = """
+        CREATE TEMPORARY TABLE api_patientdiagnosismilestonesrollup
+            (LIKE public.api_patientdiagnosismilestonesrollup INCLUDING ALL)
+            ON COMMIT DROP;
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(query_body)
+        cursor.execute(MILESTONES_ROLLUP_QUERY)
+        rows = cursor.rowcount
+        cursor.execute('ANALYZE api_patientdiagnosismilestonesrollup')
+    return rows
+
+
+def legacy_get_report_indicators(result: list, date_from: date, date_to: date) -> dict:
+    # Per row path (as it was in F14 v.2 service)
+    mo_oids = set()
+    period = "'" + date_from.strftime('%Y-%m-%d') + "' AND '" + date_to.strftime('%Y-%m-%d') + "'"
+
+    for record in result:
+        diagnoses = ','.join(["'" + dz['diagnosis_code'] + "'" for dz in record['diagnoses']])
+        for indicator, suffix in (('patients_count', None), ('referrals_count', ':нап'), ('protocols_count', ':исп')):
+            query_body = """
+                SELECT
+                    ptn_mo_oid, COUNT(*) AS patient_count
+                FROM
+                    api_patientdiagnosismilestones
+                WHERE
+                    diagnosis_mkb10 IN (""" + diagnoses + """) AND
+                    diagnosis_date BETWEEN """ + period
+            if suffix:
+                query_body += """ AND
+                    diagnosis_milestones ?| array[""" + \
+                    ','.join(["'" + code + suffix + "'" for code in record['codes']]) + ']::text[]'
+            query_body += """
+                GROUP BY
+                    ptn_mo_oid
+            """
+            with connection.cursor() as cursor:
+                cursor.execute(query_body)
+                counts = cursor.fetchall()
+
+            for count in counts:
+                mo_oids = mo_oids.union({str(count[0])})
+                record[indicator]['all'] += count[1]
+                record[indicator].setdefault(str(count[0]), count[1])
+
+    return OrderedDict([
+        ('milestones', result),
+        ('medical_organizations', sorted(mo_oids)),
+    ])
@@ -0,0 +1,36 @@
+import time
+
+from api.utils.directories_utils import DirectoryIndex, DIRECTORY_PASSPORTS, get_directory_signatures, \
+    load_directory_rows
+from api.utils.directory_snapshot_utils import write_directory_snapshot
+from backend.settings import DIRECTORY_SNAPSHOT_PATH
+
+
+def run(*args):
+    """
+        Build memory-mapped snapshot of NSI directories for ETL workers and API processes.
+        Usage: python manage.py runscript build_directory_snapshot --script-args path=/var/lib/oncor/directories.snap
+        (path of DIRECTORY_SNAPSHOT_PATH setting by default)
+    """
+    print("-----------------------------------------------------------------------")
+    print("Procedure BUILD directory snapshot was started!")
+    path = DIRECTORY_SNAPSHOT_PATH
+    for arg in args:
+        if arg.startswith('path='):
+            path = arg[len('path='):]
+    if not path:
+        print("Snapshot path is not set (see DIRECTORY_SNAPSHOT_PATH setting or 'path' parameter)")
+        return
+
+    start = time.perf_counter()
+    signatures = get_directory_signatures()
+    indexes = dict()
+    for passport_oid in DIRECTORY_PASSPORTS:
+        indexes[passport_oid] = DirectoryIndex(passport_oid, signatures.get(passport_oid, None),
+                                               load_directory_rows(passport_oid))
+        print(f"    Passport {passport_oid} ({signatures.get(passport_oid, None)}): "
+              f"{indexes[passport_oid].size} records were loaded")
+
+    size = write_directory_snapshot(path, indexes)
+    print(f"Snapshot {path} of {size} bytes was built in {time.perf_counter() - start:.3f}s")
+    print("-----------------------------------------------------------------------")
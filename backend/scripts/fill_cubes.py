@@ -1,429 +1,170 @@
-from datetime import datetime, timezone
+import multiprocessing
+import time
+from datetime import datetime
 
-import xmltodict
-from django.db import transaction, connections
+from django.db import connections, transaction
 
-from api.models.orientdb_engine import orient_db_client
 from api.models.semd_models import SemdDiagnosis, SemdService
-from backend.settings import SERVICE_BY_POST
+from api.services.order_services.order_F14_services import warm_up_report_cache as warm_up_f14_report_cache
+from api.utils.cube_loader_utils import LOAD_METHOD_COPY, LOAD_METHODS, finish_cube_bulk_load, get_semd_cubes_loaders, \
+    start_cube_bulk_load
+from api.utils.directories_utils import INSTRUMENTAL_DIAGNOSTICS_PASSPORT_OID, directory_cache
+from api.utils.fill_cubes_utils import get_fill_cubes_ledger, get_patients_chunks, init_fill_cubes_worker, \
+    mark_fill_cubes_chunk_done, new_fill_cubes_ledger, process_patients_chunk, set_fill_cubes_ledger
+from api.utils.semd_cubes_refresh_utils import refresh_semd_cubes
+from api.utils.semd_cubes_utils import get_semd_cubes_watermark, get_vimis_sending_watermark, \
+    set_semd_cubes_watermark
+from backend.settings import CUBES_FILL_CHUNK_SIZE, CUBES_FILL_WORKERS
 
 
 def run(*args):
+    """
+        Fill SEMD cubes. Patients are split into chunks of rids, chunks are processed by pool of worker processes
+        and rows of cubes are written by bulk loaders of this process. Loaded chunks are kept in ledger, so
+        interrupted run can be resumed.
+        Usage: python manage.py runscript fill_cubes --script-args erase-cubes workers=8
+               python manage.py runscript fill_cubes --script-args resume workers=8
+               python manage.py runscript fill_cubes --script-args incremental
+        Parameters: erase-cubes, resume, incremental, workers=N, chunk-size=N, loader=copy|bulk_create
+    """
     print("-----------------------------------------------------------------------")
     print("Procedure FILL CUBES was stated!")
-    if 'erase-cubes' in args:
-        print("Found 'erase-cubes' parameter, it is starting delete cubes records...")
-        with transaction.atomic():
-            semd_diagnoses = SemdDiagnosis.objects.all()
-            semd_diagnoses.delete()
-        print("    Patient-SEMD-diagnosis cube has been cleaned")
-        with transaction.atomic():
-            semd_services = SemdService.objects.all()
-            semd_services.delete()
-        print("    Patient-SEMD-service cube has been cleaned")
-
-    # Define queries
-    query_body = """
-        SELECT 
-            @rid, 
-            person.code as code, 
-            observer.nsiMedOrg.oid as mo_oid,
-            tags.tags.tag as tags
-        FROM 
-            ptn
+    method = LOAD_METHOD_COPY
+    workers = CUBES_FILL_WORKERS
+    chunk_size = CUBES_FILL_CHUNK_SIZE
+    for arg in args:
+        if arg.startswith('loader='):
+            method = arg[len('loader='):]
+            if method not in LOAD_METHODS:
+                print(f"Loader {method} is not valid, valid loaders: {', '.join(LOAD_METHODS)}")
+                return
+        elif arg.startswith('workers='):
+            workers = max(int(arg[len('workers='):]), 1)
+        elif arg.startswith('chunk-size='):
+            chunk_size = max(int(arg[len('chunk-size='):]), 1)
+
+    if 'incremental' in args:
+        run_incremental(method)
+        return
+
+    ledger = get_fill_cubes_ledger() if 'resume' in args else None
+    if ledger is not None:
+        print(f"Found 'resume' parameter, {len(ledger['done'])} of {len(ledger['chunks'])} chunks "
+              f"are already loaded")
+        watermark = datetime.fromisoformat(ledger['watermark']) if ledger['watermark'] else None
+    else:
+        if 'resume' in args:
+            print("Ledger of interrupted run was not found, new run is started")
+        if 'erase-cubes' in args:
+            print("Found 'erase-cubes' parameter, it is starting delete cubes records...")
+            set_semd_cubes_watermark(None)
+            with transaction.atomic():
+                semd_diagnoses = SemdDiagnosis.objects.all()
+                semd_diagnoses.delete()
+            print("    Patient-SEMD-diagnosis cube has been cleaned")
+            with transaction.atomic():
+                semd_services = SemdService.objects.all()
+                semd_services.delete()
+            print("    Patient-SEMD-service cube has been cleaned")
+
+        # Messages received after this moment may be missed by this run
+        watermark = get_vimis_sending_watermark()
+
+        chunks = get_patients_chunks(chunk_size)
+        ledger = new_fill_cubes_ledger(watermark, 'erase-cubes' in args, chunks)
+        print(f"Found {len(chunks)} chunks of patients.")
+
+    # Rows of cubes are written by bulk loaders, indexes of erased cubes are rebuilt once after load
+    start_cube_bulk_load((SemdDiagnosis, SemdService), defer_indexes=ledger['erase_cubes'])
+    diagnoses_loader, services_loader = get_semd_cubes_loaders(method)
+
+    done = set(ledger['done'])
+    todo = [(idx, first_rid, last_rid) for idx, (first_rid, last_rid) in enumerate(ledger['chunks'])
+            if idx not in done]
+
+    # Directory of instrumental diagnostics is loaded once and inherited by workers
+    directory_cache.get(INSTRUMENTAL_DIAGNOSTICS_PASSPORT_OID)
+
+    start = time.perf_counter()
+    i = n = 0
+    if workers > 1:
+        # Forked workers open their own connections
+        connections.close_all()
+        pool = multiprocessing.get_context('fork').Pool(workers, initializer=init_fill_cubes_worker)
+        results = pool.imap_unordered(process_patients_chunk, todo)
+    else:
+        pool = None
+        results = map(process_patients_chunk, todo)
+
+    try:
+        for k, (idx, patients_count, semds_count, diagnoses_rows, services_rows) in enumerate(results, 1):
+            # Rows of chunk and its mark in ledger are committed together
+            with transaction.atomic():
+                for row in diagnoses_rows:
+                    diagnoses_loader.add(row)
+                for row in services_rows:
+                    services_loader.add(row)
+                diagnoses_loader.flush()
+                services_loader.flush()
+                mark_fill_cubes_chunk_done(ledger, idx)
+
+            i += patients_count
+            n += semds_count
+            elapsed = time.perf_counter() - start
+            print(f"Chunk {str(k).zfill(6)}/{len(todo)} {ledger['chunks'][idx][0]}-{ledger['chunks'][idx][1]}: "
+                  f"{patients_count} patients, {semds_count} SEMDs, {i / elapsed:.1f} patients/s")
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+    print(f"    {diagnoses_loader.stats()}")
+    print(f"    {services_loader.stats()}")
+    finish_cube_bulk_load((SemdDiagnosis, SemdService))
+
+    print(f"Patients count = {i}, SEMDs count = {n}")
+
+    # Patient endpoints extract messages after watermark from vimis_sending on the fly
+    set_semd_cubes_watermark(watermark)
+    set_fill_cubes_ledger(None)
+    print(f"Cubes watermark = {watermark}")
+
+    print("Start stage of warming up F14 report cache...")
+    warm_up_f14_report_cache()
+    print("Stage of warming up F14 report cache has finished.")
+
+
+def run_incremental(method: str):
     """
-    query_count_body = """
-        SELECT 
-            count(*) 
-        FROM 
-            ptn
+        Incremental refresh of cubes by messages received after cubes watermark, patients which rows were changed
+        are marked for recomputing of milestones (fill_milestones_cube only-dirty)
     """
-
-    # Calculate count of queryset
-    orient_result = orient_db_client.query(query_count_body, -1)
-    count = orient_result[0].count
-    print(f'Found {count} patients.')
-
-    # Get queryset
-    patients = orient_db_client.query(query_body, -1)
-
-    i = n = 0
-    # Get SEMD records for each patient in queryset
-    for patient in patients:
-        # Get patient parameters
-        ptn_id = str(patient.oRecordData.get('rid', None))
-        ptn_code = patient.oRecordData.get('code', None)
-        ptn_mo_oid = patient.oRecordData.get('mo_oid', None)
-        ptn_tags = [] \
-            if patient.oRecordData.get('tags', None) is None \
-            else [str(rid) for rid in patient.oRecordData.get('tags', None)]
-        i += 1
-        print(f"{str(i).zfill(6)} {ptn_id}: ", end='')
-
-        if not ptn_id:
-            continue
-
-        # Define records queries
-        query_body = f"""
-            SELECT 
-                @rid, 
-                internalMessageId 
-            FROM 
-                (
-                    SELECT 
-                        EXPAND(records) 
-                    FROM 
-                        ptn 
-                    WHERE 
-                        @rid={ptn_id}
-                ) 
-            WHERE 
-                @class="RcSMS"
-        """
-
-        # Get records
-        records = orient_db_client.query(query_body, -1)
-        records_count = len(records)
-        print(f"{records_count} SEMDs")
-        n += records_count
-
-        if not records_count:
-            continue
-
-        rc_ids = {
-            record.oRecordData.get('internalMessageId', None): record.oRecordData.get('rid', None)
-            for record in records 
-            if record.oRecordData.get('internalMessageId', None)
-        }
-        messages = [
-            "'" + record.oRecordData.get('internalMessageId', None) + "'" 
-            for record in records
-            if record.oRecordData.get('internalMessageId', None)
-        ]
-        query_body = """
-            SELECT
-                internal_message_id,
-                date_time as time_rc,
-                document_type,
-                array_to_string(xpath('/x:ClinicalDocument/x:code[@codeSystem="1.2.643.5.1.13.13.99.2.592"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ',') as nsi_doc_type_592,
-                array_to_string(xpath('/x:ClinicalDocument/x:code[@codeSystem="1.2.643.5.1.13.13.11.1522"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ',') as nsi_doc_type_1522,
-                sms_profile as profile,
-                array_to_string(xpath('/x:ClinicalDocument/x:author/x:assignedAuthor/x:representedOrganization/x:id/@root', payload::xml, '{{x,urn:hl7-org:v3}}'), ' ') as author_mo_oid,
-                array_to_string(xpath('/x:ClinicalDocument/x:author/x:assignedAuthor/x:id[@root="1.2.643.100.3"]/@extension', payload::xml, '{{x,urn:hl7-org:v3}}'), ' ') as author_snils,
-                array_to_string(xpath('/x:ClinicalDocument/x:author/x:assignedAuthor/x:code[@codeSystem="1.2.643.5.1.13.13.11.1002"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ' ') as author_post,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[x:observation[x:value[@codeSystem="1.2.643.5.1.13.13.11.1005"]]]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as diagnoses,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as services,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[@codeSystem="1.2.643.5.1.13.13.11.1471"]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as instrumental_diagnostics
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id in (""" + ','.join(messages) + ')'
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            semds = cursor.fetchall()
-
-        if not semds:
-            continue
-
-        # Start transaction for each patient
-        with transaction.atomic():
-            # Get diagnoses for each SEMD
-            for semd in semds:
-                internal_message_id = semd[0]
-                rc_id = rc_ids[internal_message_id]
-                time_rc = datetime(semd[1].year, semd[1].month, semd[1].day,
-                                   semd[1].hour, semd[1].minute, semd[1].second, tzinfo=timezone.utc)
-                document_type = semd[2]
-                nsi_doc_type = semd[3] if semd[3] else semd[4]
-                profile = semd[5]
-                author_mo_oid = semd[6]
-                author_snils = semd[7]
-                author_post = semd[8]
-                xml_diagnoses = semd[9].split('<new/>')
-                xml_services = semd[10].split('<new/>')
-                xml_instrumental_diagnostics = semd[11].split('<new/>')
-
-                # Calculate diagnoses set
-                diagnoses = set()
-                for xml in xml_diagnoses:
-                    if not xml:
-                        continue
-                    try:
-                        row_diagnosis_code1379 = None
-                        parent = xmltodict.parse(xml)
-                        if not isinstance(parent, dict):
-                            continue
-                        for parent_key, parent_dict in parent.items():
-                            if not isinstance(parent_dict, dict):
-                                continue
-                            row_diagnosis_code1076 = None
-                            parent_node_code_node = parent_dict.get('code', None)
-                            if parent_node_code_node and isinstance(parent_node_code_node, dict) and \
-                                    parent_node_code_node.get('@codeSystem', None) == '1.2.643.5.1.13.13.11.1076':
-                                row_diagnosis_code1076 = parent_node_code_node.get('@code', None)
-
-                            for key, entry_list in parent_dict.items():
-                                if not isinstance(entry_list, list):
-                                    entry_list = [entry_list]
-
-                                for entry in entry_list:
-                                    if not isinstance(entry, dict):
-                                        continue
-                                    observation = entry.get('observation', None)
-                                    if not observation:
-                                        continue
-
-                                    row_diagnosis_date = None
-                                    observation_effective_times = observation.get('effectiveTime', None)
-                                    if isinstance(observation_effective_times, dict):
-                                        observation_effective_time = observation_effective_times.get('@value', None)
-                                        if isinstance(observation_effective_time, str):
-                                            row_diagnosis_date = datetime(
-                                                int(observation_effective_time[0:4]),
-                                                int(observation_effective_time[4:6]),
-                                                int(observation_effective_time[6:8]),
-                                                tzinfo=timezone.utc
-                                            ).date()
-
-                                    row_diagnosis_code1077 = None
-                                    node_code_node = observation.get('code', None)
-                                    if node_code_node and isinstance(node_code_node, dict) and \
-                                            node_code_node.get('@codeSystem', None) == '1.2.643.5.1.13.13.11.1077':
-                                        row_diagnosis_code1077 = node_code_node.get('@code', None)
-
-                                    row_diagnosis_mkb10 = None
-                                    observation_values = observation.get('value', None)
-                                    if observation_values:
-                                        if not isinstance(observation_values, list):
-                                            observation_values = [observation_values]
-
-                                        for observation_value in observation_values:
-                                            if not isinstance(observation_value, dict):
-                                                continue
-                                            observation_value_code_system = observation_value.get('@codeSystem', '')
-                                            if observation_value_code_system == '1.2.643.5.1.13.13.11.1005':
-                                                row_diagnosis_mkb10 = observation_value.get('@code', None)
-                                                break
-
-                                    if row_diagnosis_mkb10:
-                                        diagnoses = diagnoses.union(
-                                            {
-                                                (
-                                                    row_diagnosis_mkb10,
-                                                    row_diagnosis_date,
-                                                    row_diagnosis_code1379,
-                                                    row_diagnosis_code1076,
-                                                    row_diagnosis_code1077
-                                                )
-                                            }
-                                        )
-                    except:
-                        pass
-
-                # Calculate services set
-                services = set()
-                for xml in xml_services:
-                    if not xml:
-                        continue
-                    try:
-                        row_instrumental_diagnostics_code = None
-                        parent = xmltodict.parse(xml)
-                        if not isinstance(parent, dict):
-                            continue
-                        for parent_key, parent_dict in parent.items():
-                            if not isinstance(parent_dict, dict):
-                                continue
-
-                            row_service_date = None
-                            effective_times = parent_dict.get('effectiveTime', None)
-                            if isinstance(effective_times, dict):
-                                effective_time = effective_times.get('@value', None)
-                                if isinstance(effective_time, str):
-                                    row_service_date = datetime(
-                                        int(effective_time[0:4]),
-                                        int(effective_time[4:6]),
-                                        int(effective_time[6:8]),
-                                        tzinfo=timezone.utc
-                                    ).date()
-                                else:
-                                    low_effective_times = effective_times.get('low', None)
-                                    if isinstance(low_effective_times, dict):
-                                        effective_time = low_effective_times.get('@value', None)
-                                        if isinstance(effective_time, str):
-                                            row_service_date = datetime(
-                                                int(effective_time[0:4]),
-                                                int(effective_time[4:6]),
-                                                int(effective_time[6:8]),
-                                                tzinfo=timezone.utc
-                                            ).date()
-
-                            row_service_code = None
-                            for key, value in parent_dict.items():
-                                if not isinstance(value, dict):
-                                    continue
-                                code_system = value.get('@codeSystem', '')
-                                if code_system == '1.2.643.5.1.13.13.11.1070':
-                                    row_service_code = value.get('@code', None)
-                                    break
-
-                            if row_service_code:
-                                if not row_service_date and document_type == '5':
-                                    row_service_date = datetime(time_rc.year, time_rc.month, time_rc.day,
-                                                                tzinfo=timezone.utc).date()
-                                services = services.union(
-                                    {
-                                        (
-                                            row_service_code,
-                                            row_service_date,
-                                            row_instrumental_diagnostics_code
-                                        )
-                                    }
-                                )
-                    except:
-                        pass
-
-                # Calculate instrumental_diagnostics set if services set is empty
-                if not services:
-                    instrumental_diagnostics = set()
-                    for xml in xml_instrumental_diagnostics:
-                        if not xml:
-                            continue
-                        try:
-                            parent = xmltodict.parse(xml)
-                            if not isinstance(parent, dict):
-                                continue
-                            for parent_key, parent_dict in parent.items():
-
-                                row_instrumental_diagnostics_date = None
-                                effective_times = parent_dict.get('effectiveTime', None)
-                                if isinstance(effective_times, dict):
-                                    effective_time = effective_times.get('@value', None)
-                                    if isinstance(effective_time, str):
-                                        row_instrumental_diagnostics_date = datetime(
-                                            int(effective_time[0:4]),
-                                            int(effective_time[4:6]),
-                                            int(effective_time[6:8]),
-                                            tzinfo=timezone.utc
-                                        ).date()
-                                    else:
-                                        low_effective_times = effective_times.get('low', None)
-                                        if isinstance(low_effective_times, dict):
-                                            effective_time = low_effective_times.get('@value', None)
-                                            if isinstance(effective_time, str):
-                                                row_instrumental_diagnostics_date = datetime(
-                                                    int(effective_time[0:4]),
-                                                    int(effective_time[4:6]),
-                                                    int(effective_time[6:8]),
-                                                    tzinfo=timezone.utc
-                                                ).date()
-
-                                row_instrumental_diagnostics_code = None
-                                for key, value in parent_dict.items():
-                                    if not isinstance(value, dict):
-                                        continue
-                                    code_system = value.get('@codeSystem', '')
-                                    if code_system == '1.2.643.5.1.13.13.11.1471':
-                                        row_instrumental_diagnostics_code = value.get('@code', None)
-                                        break
-
-                                if row_instrumental_diagnostics_code:
-                                    if not row_instrumental_diagnostics_date and document_type == '5':
-                                        row_instrumental_diagnostics_date = datetime(time_rc.year, time_rc.month,
-                                                                                     time_rc.day,
-                                                                                     tzinfo=timezone.utc).date()
-                                    instrumental_diagnostics = instrumental_diagnostics.union(
-                                        {
-                                            (
-                                                row_instrumental_diagnostics_code,
-                                                row_instrumental_diagnostics_date
-                                            )
-                                        }
-                                    )
-                        except:
-                            pass
-
-                    for instrumental_diagnostic in instrumental_diagnostics:
-                        query_body = """
-                            SELECT
-                                json->>'NMU' as services
-                            FROM
-                                directory
-                            WHERE
-                                passport_oid='1.2.643.5.1.13.13.11.1471' AND
-                                id='""" + instrumental_diagnostic[0] + "'"
-                        with connections['rosminzdrav-directories'].cursor() as cursor:
-                            cursor.execute(query_body)
-                            ins_diag_services = cursor.fetchall()
-                        if len(ins_diag_services) == 1:
-                            ins_diag_services = ins_diag_services[0][0]
-                            if ins_diag_services:
-                                ins_diag_services = ins_diag_services.split('; ')
-                                for ins_diag_service in ins_diag_services:
-                                    services = services.union(
-                                        {
-                                            (
-                                                ins_diag_service,
-                                                instrumental_diagnostic[1],
-                                                instrumental_diagnostic[0]
-                                            )
-                                        }
-                                    )
-
-                    if not services and document_type == '20':
-                        row_service_code = SERVICE_BY_POST.get(author_post, None)
-                        if row_service_code:
-                            services = services.union(
-                                {
-                                    (
-                                        row_service_code,
-                                        datetime(time_rc.year, time_rc.month, time_rc.day,
-                                                 tzinfo=timezone.utc).date(),
-                                        None
-                                    )
-                                }
-                            )
-
-                # Save records to cubes
-                for diagnosis in diagnoses:
-                    semd_diagnosis = SemdDiagnosis()
-                    semd_diagnosis.ptn_id = ptn_id
-                    semd_diagnosis.ptn_code = ptn_code
-                    semd_diagnosis.ptn_mo_oid = ptn_mo_oid
-                    semd_diagnosis.ptn_tags = ptn_tags
-                    semd_diagnosis.rc_id = rc_id
-                    semd_diagnosis.time_rc = time_rc
-                    semd_diagnosis.document_type = document_type
-                    semd_diagnosis.nsi_doc_type = nsi_doc_type
-                    semd_diagnosis.profile = profile
-                    semd_diagnosis.author_mo_oid = author_mo_oid
-                    semd_diagnosis.author_snils = author_snils
-                    semd_diagnosis.author_post = author_post
-                    semd_diagnosis.internal_message_id = internal_message_id
-                    semd_diagnosis.diagnosis_mkb10 = diagnosis[0]
-                    semd_diagnosis.diagnosis_date = diagnosis[1]
-                    semd_diagnosis.diagnosis_code1379 = diagnosis[2]
-                    semd_diagnosis.diagnosis_code1076 = diagnosis[3]
-                    semd_diagnosis.diagnosis_code1077 = diagnosis[4]
-                    semd_diagnosis.save()
-
-                for service in services:
-                    semd_service = SemdService()
-                    semd_service.ptn_id = ptn_id
-                    semd_service.ptn_code = ptn_code
-                    semd_diagnosis.ptn_mo_oid = ptn_mo_oid
-                    semd_service.ptn_tags = ptn_tags
-                    semd_service.rc_id = rc_id
-                    semd_service.time_rc = time_rc
-                    semd_service.document_type = document_type
-                    semd_service.nsi_doc_type = nsi_doc_type
-                    semd_service.profile = profile
-                    semd_service.author_mo_oid = author_mo_oid
-                    semd_service.author_snils = author_snils
-                    semd_service.author_post = author_post
-                    semd_service.internal_message_id = internal_message_id
-                    semd_service.service_code = service[0]
-                    semd_service.service_date = service[1]
-                    semd_service.instrumental_diagnostics_code = service[2]
-                    semd_service.save()
-
-    print(f"SEMDs count = {n}")
+    print("Found 'incremental' parameter, cubes are refreshed by new messages only")
+    after = get_semd_cubes_watermark()
+    if after is None or get_fill_cubes_ledger() is not None:
+        print("Cubes are not filled completely, run fill_cubes without 'incremental' parameter")
+        return
+
+    # Messages received after this moment will be processed by the next refresh
+    watermark = get_vimis_sending_watermark()
+    if watermark is None:
+        print("There are no messages in vimis_sending")
+        return
+    print(f"Refresh messages after {after} up to {watermark}")
+
+    start_cube_bulk_load((SemdDiagnosis, SemdService))
+    diagnoses_loader, services_loader = get_semd_cubes_loaders(method)
+    messages_count, semds_count, patients_count = refresh_semd_cubes(after, watermark, diagnoses_loader,
+                                                                     services_loader)
+    print(f"    {diagnoses_loader.stats()}")
+    print(f"    {services_loader.stats()}")
+    finish_cube_bulk_load((SemdDiagnosis, SemdService))
+
+    print(f"Messages count = {messages_count}, SEMDs count = {semds_count}, changed patients count = {patients_count}")
+
+    set_semd_cubes_watermark(watermark)
+    print(f"Cubes watermark = {watermark}")
+
+    print("Start stage of warming up F14 report cache...")
+    warm_up_f14_report_cache()
+    print("Stage of warming up F14 report cache has finished.")
@@ -1,7 +1,7 @@
 from django.db import connections, transaction
 
 from api.models.egisz_db_66_models import VimisSending
-from api.models.rosminzdrav_directories_models import Directory
+from api.utils.directories_utils import get_mo, get_mo_department_name
 
 
 def run():
@@ -36,39 +36,8 @@ def run():
                         cursor.execute(query_body)
                         medical_organization_id, medical_organization_extension = cursor.fetchone()
 
-                    medical_organization_name = None
-                    medical_organization_city = None
-                    mo = None
-                    try:
-                        mo = (
-                            Directory.objects
-                            .using('rosminzdrav-directories')
-                            .filter(
-                                passport_oid='1.2.643.5.1.13.13.11.1461',
-                                oid=medical_organization_id
-                            )
-                        )[0]
-                    except:
-                        pass
-                    if mo:
-                        medical_organization_name = mo.name
-                        medical_organization_city = mo.json["areaName"]
-
-                    medical_organization_extension_name = None
-                    me = None
-                    try:
-                        me = (
-                            Directory.objects
-                            .using('rosminzdrav-directories')
-                            .filter(
-                                passport_oid='1.2.643.5.1.13.13.99.2.114',
-                                oid=medical_organization_extension
-                            )
-                        )[0]
-                    except:
-                        pass
-                    if me:
-                        medical_organization_extension_name = me.name
+                    medical_organization_name, medical_organization_city = get_mo(medical_organization_id)
+                    medical_organization_extension_name = get_mo_department_name(medical_organization_extension)
 
                     vs.medical_organization_id = medical_organization_id
                     vs.medical_organization_extension = medical_organization_extension
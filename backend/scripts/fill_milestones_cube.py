@@ -1,19 +1,37 @@
 from datetime import date, datetime
 
 from django.db import connection, transaction
-from django.utils import formats, translation
 
-from api.models.orientdb_engine import orient_db_client
-from api.models.semd_models import PatientDiagnosisMilestones, OncorSettings
-from api.utils.directories_utils import expand_diagnoses_only_codes, expand_services_only_codes
+from api.models.orientdb_engine import orient_db_pool
+from api.models.semd_models import PatientDiagnosisMilestones
+from api.services.order_services.order_F14v2_services import warm_up_report_cache as warm_up_f14v2_report_cache
+from api.utils.milestone_facts_utils import clear_milestone_facts, build_milestone_facts, \
+    build_patients_milestone_facts, clear_patients_milestone_facts
+from api.utils.milestones_histogram_utils import build_milestones_histogram
+from api.utils.milestones_rollup_utils import invalidate_milestones_rollup, build_milestones_rollup
+from api.utils.orders_rules_utils import orders_rules_cache
+from api.utils.semd_cubes_refresh_utils import clear_milestones_dirty_patients, get_milestones_dirty_patients
+from api.utils.working_days_utils import fill_milestone_facts_working_days
+
+# Milestones of patients changed by incremental refresh are recomputed by chunks of this size
+DIRTY_PATIENTS_CHUNK_SIZE = 500
 
 
 def run(*args):
     print("-----------------------------------------------------------------------")
     print("Procedure FILL Patient-Diagnosis cube was started!")
+    # Rollup is stale until the cube is filled
+    invalidate_milestones_rollup()
+    if 'only-dirty' in args:
+        print("Found 'only-dirty' parameter, milestones are recomputed for patients changed by incremental refresh")
+        fill_dirty_patients_milestones()
+        build_milestones_aggregates()
+        return
+
     if 'erase-cube' in args:
         print("Found 'erase-cube' parameter, it is starting delete cubes records...")
         with transaction.atomic():
+            clear_milestone_facts()
             patient_diagnosis = PatientDiagnosisMilestones.objects.all()
             patient_diagnosis.delete()
         print("    Patient-Diagnosis cube has been cleaned")
@@ -21,23 +39,8 @@ def run(*args):
     if 'only-fill-milestones' not in args:
         # Create patient-diagnosis in cube
         print("Start stage of creating patient-diagnosis in cube...")
-        query_body = """
-            INSERT INTO
-                api_patientdiagnosismilestones (ptn_id, ptn_code, ptn_tags, diagnosis_mkb10, diagnosis_date)
-            SELECT
-                  sd.ptn_id, sd.ptn_code, sd.ptn_tags, sd.diagnosis_mkb10, sd.min_diagnosis_date
-            FROM
-               (SELECT
-                    ptn_id, ptn_code, ptn_tags, diagnosis_mkb10, MIN(diagnosis_date) AS min_diagnosis_date
-                FROM
-                    api_semddiagnosis
-                GROUP BY
-                    ptn_id, ptn_code, ptn_tags, diagnosis_mkb10) as sd
-            WHERE
-                sd.min_diagnosis_date IS NOT NULL
-        """
         with connection.cursor() as cursor:
-            cursor.execute(query_body)
+            cursor.execute(get_patient_diagnoses_query())
 
         print(f"Stage of creating patient-diagnosis in cube has finished. "
               f"{PatientDiagnosisMilestones.objects.all().count()} patient-diagnosis were created.")
@@ -46,17 +49,7 @@ def run(*args):
 
         print("Start stage of getting mo_oid of patients...")
         # Save mo_oid of patient
-        query_body = """
-            SELECT 
-                @rid, 
-                observer.nsiMedOrg.oid as mo_oid
-            FROM 
-                ptn
-        """
-        patients = orient_db_client.query(query_body, -1)
-        patients_mo_oid = dict()
-        for patient in patients:
-            patients_mo_oid[str(patient.oRecordData.get('rid', None))] = patient.oRecordData.get('mo_oid', None)
+        patients_mo_oid = get_patients_mo_oid()
 
         print(f"Stage of getting mo_oid of patients has finished. "
               f"{len(patients_mo_oid)} mo_oids of patient were get.")
@@ -76,199 +69,202 @@ def run(*args):
     # Fill milestones
     rule_diagnoses_services = get_rule_diagnoses_services()
     with transaction.atomic():
-        patient_diagnoses = PatientDiagnosisMilestones.objects.all()
-        i = 0
-        for patient_diagnosis in patient_diagnoses:
-            milestones = dict()
-            for rule_diagnoses_service in rule_diagnoses_services:
-                if not rule_diagnoses_service['diagnoses'].count(patient_diagnosis.diagnosis_mkb10):
-                    continue
-
-                if not rule_diagnoses_service['services']:
-                    continue
-
-                # Get referrals
-                query_body = """
-                    SELECT
-                        time_rc
-                    FROM
-                        api_semdservice
-                    WHERE
-                        document_type IN ('1', '27') AND
-                        ptn_id='""" + patient_diagnosis.ptn_id + """' AND
-                        service_code IN (""" + ','.join(rule_diagnoses_service['services']) + """) AND
-                        time_rc>='""" + patient_diagnosis.diagnosis_date.strftime('%Y-%m-%d') + """'
-                    ORDER BY
-                        time_rc
-                    LIMIT 1
-                    """
-                with connection.cursor() as cursor:
-                    cursor.execute(query_body)
-                    semd_services = cursor.fetchall()
-
-                if len(semd_services) == 1:
-                    milestones[rule_diagnoses_service['code'] + ':нап'] = \
-                        (semd_services[0][0].date() - patient_diagnosis.diagnosis_date).days
-
-                # Get referrals
-                query_body = """
-                    SELECT
-                        service_date
-                    FROM
-                        api_semdservice
-                    WHERE
-                        document_type IN ('2', '3', '4', '9', '12', '20') AND
-                        ptn_id='""" + patient_diagnosis.ptn_id + """' AND
-                        service_code IN (""" + ','.join(rule_diagnoses_service['services']) + """) AND
-                        service_date>='""" + patient_diagnosis.diagnosis_date.strftime('%Y-%m-%d') + """'
-                    ORDER BY
-                        service_date
-                    LIMIT 1
-                    """
-                with connection.cursor() as cursor:
-                    cursor.execute(query_body)
-                    semd_services = cursor.fetchall()
-
-                if len(semd_services) == 1:
-                    milestones[rule_diagnoses_service['code'] + ':исп'] = \
-                        (semd_services[0][0] - patient_diagnosis.diagnosis_date).days
-
-            if milestones:
-                patient_diagnosis.diagnosis_milestones = milestones
-                patient_diagnosis.save()
+        fill_milestones(PatientDiagnosisMilestones.objects.all(), rule_diagnoses_services)
 
-            print(f"{i}: {patient_diagnosis.ptn_id} {patient_diagnosis.diagnosis_mkb10} - {len(milestones)} | {milestones}")
-            i += 1
+    print("Start stage of building milestone facts...")
+    facts = build_milestone_facts()
+    print(f"Stage of building milestone facts has finished. {facts} milestone facts were created.")
 
+    print("Start stage of computing working days of milestone facts...")
+    facts = fill_milestone_facts_working_days()
+    print(f"Stage of computing working days of milestone facts has finished. {facts} milestone facts were updated.")
 
-def get_rule_diagnoses_services(check_date: date = datetime.now().date()) -> list:
-    result = list()
+    build_milestones_aggregates()
 
-    def find_rule_diagnoses_service(diagnoses: set, services: set) -> int | None:
-        for result_idx, result_item in enumerate(result):
-            if result_item['diagnoses'] == diagnoses and result_item['services'] == services:
-                return result_idx
-        return None
 
-    try:
-        orders = OncorSettings.objects.get(code='orders_rules').value
-    except:
-        orders = list()
+def build_milestones_aggregates():
+    print("Start stage of building milestones histograms...")
+    histogram_rows = build_milestones_histogram()
+    print(f"Stage of building milestones histograms has finished. {histogram_rows} histogram rows were created.")
 
-    if not orders:
-        return []
+    print("Start stage of building milestones rollup...")
+    rollup_rows = build_milestones_rollup()
+    print(f"Stage of building milestones rollup has finished. {rollup_rows} rollup rows were created.")
 
-    date_formats = formats.get_format("DATE_INPUT_FORMATS", lang=translation.get_language())
-    date_formats.append('%d.%m.%Y')
+    print("Start stage of warming up F14 v.2 report cache...")
+    warm_up_f14v2_report_cache()
+    print("Stage of warming up F14 v.2 report cache has finished.")
 
-    try:
-        for order in orders:
-            if not isinstance(order, dict):
-                continue
 
-            order_code = order.get('code', None)
-            if not order_code or not isinstance(order_code, str):
-                continue
+def fill_dirty_patients_milestones():
+    """
+        Recompute patient-diagnoses, milestones and milestone facts of patients marked by incremental refresh
+        of SEMD cubes
+    """
+    ptn_ids, marked_until = get_milestones_dirty_patients()
+    print(f"Found {len(ptn_ids)} patients with stale milestones.")
 
-            order_valid = order.get('действителен', None)
-            if order_valid and isinstance(order_valid, dict):
-                order_valid_from = order_valid.get('от', None)
-                order_valid_to = order_valid.get('до', None)
-            else:
-                order_valid_from = None
-                order_valid_to = None
-
-            if order_valid_from:
-                is_date_error = True
-                for date_format in date_formats:
-                    try:
-                        order_valid_from = datetime.strptime(order_valid_from, date_format).date()
-                        is_date_error = False
-                        break
-                    except:
-                        pass
-                if is_date_error:
-                    order_valid_from = None
-
-            if order_valid_to:
-                is_date_error = True
-                for date_format in date_formats:
-                    try:
-                        order_valid_to = datetime.strptime(order_valid_to, date_format).date()
-                        is_date_error = False
-                        break
-                    except:
-                        pass
-                if is_date_error:
-                    order_valid_to = None
-
-            if not order_valid_from or not isinstance(order_valid_from, date):
-                continue
+    print("Start stage of recomputing milestones and milestone facts of patients...")
 
-            if order_valid_from > check_date:
-                continue
+    rule_diagnoses_services = get_rule_diagnoses_services()
+    facts = 0
+    for k in range(0, len(ptn_ids), DIRTY_PATIENTS_CHUNK_SIZE):
+        chunk = ptn_ids[k:k + DIRTY_PATIENTS_CHUNK_SIZE]
+        patients_mo_oid = get_patients_mo_oid(chunk)
+        with transaction.atomic():
+            clear_patients_milestone_facts(chunk)
+            PatientDiagnosisMilestones.objects.filter(ptn_id__in=chunk).delete()
+            with connection.cursor() as cursor:
+                cursor.execute(get_patient_diagnoses_query(chunk))
 
-            if order_valid_to and isinstance(order_valid_to, date) and order_valid_to < check_date:
+            patient_diagnoses = list(PatientDiagnosisMilestones.objects.filter(ptn_id__in=chunk))
+            for patient_diagnosis in patient_diagnoses:
+                patient_diagnosis.ptn_mo_oid = patients_mo_oid.get(patient_diagnosis.ptn_id, None)
+                patient_diagnosis.save()
+            fill_milestones(patient_diagnoses, rule_diagnoses_services)
+            facts += build_patients_milestone_facts(chunk)
+        clear_milestones_dirty_patients(chunk, marked_until)
+
+    print(f"Stage of recomputing milestones and milestone facts of patients has finished. "
+          f"{facts} milestone facts were created.")
+
+    print("Start stage of computing working days of milestone facts...")
+    facts = fill_milestone_facts_working_days(only_missing=True)
+    print(f"Stage of computing working days of milestone facts has finished. {facts} milestone facts were updated.")
+
+
+def get_rule_diagnoses_services(check_date: date | None = None) -> list:
+    if check_date is None:
+        check_date = datetime.now().date()
+
+    # Items of orders valid at check date with the same diagnoses and services are merged,
+    # code of item is taken from the latest order, diagnoses are kept as compiled frozenset for membership tests
+    groups = dict()
+    for item in orders_rules_cache.get().valid_at(check_date):
+        if item.code is None:
+            continue
+        key = (item.diagnosis_codes, item.service_codes)
+        if key not in groups or item.order_valid_from > groups[key].order_valid_from:
+            groups[key] = item
+
+    return [
+        {
+            'services': ["'" + service + "'" for service in sorted(service_codes)],
+            'diagnoses': diagnosis_codes,
+            'order_valid_from': item.order_valid_from,
+            'code': item.code,
+        }
+        for (diagnosis_codes, service_codes), item in groups.items()
+    ]
+
+
+def get_patient_diagnoses_query(ptn_ids: list | None = None) -> str:
+    """
+        Query creating patient-diagnoses of cube from Patient-SEMD-diagnosis cube (of all patients or of patients)
+    """
+    return """
+        INSERT INTO
+            api_patientdiagnosismilestones (ptn_id, ptn_code, ptn_tags, diagnosis_mkb10, diagnosis_date)
+        SELECT
+              sd.ptn_id, sd.ptn_code, sd.ptn_tags, sd.diagnosis_mkb10, sd.min_diagnosis_date
+        FROM
+           (SELECT
+                ptn_id, ptn_code, ptn_tags, diagnosis_mkb10, MIN(diagnosis_date) AS min_diagnosis_date
+            FROM
+                api_semddiagnosis
+            """ + ("" if ptn_ids is None else """WHERE
+                ptn_id IN (""" + ','.join(["'" + ptn_id + "'" for ptn_id in ptn_ids]) + """)
+            """) + """GROUP BY
+                ptn_id, ptn_code, ptn_tags, diagnosis_mkb10) as sd
+        WHERE
+            sd.min_diagnosis_date IS NOT NULL
+    """
+
+
+def get_patients_mo_oid(ptn_ids: list | None = None) -> dict:
+    """
+        mo_oid of patients (of all patients if ptn_ids is None)
+    """
+    query_body = """
+        SELECT
+            @rid,
+            observer.nsiMedOrg.oid as mo_oid
+        FROM
+            ptn
+    """
+    if ptn_ids is not None:
+        query_body += """
+        WHERE
+            @rid IN [""" + ','.join(ptn_ids) + """]
+        """
+    patients = orient_db_pool.query(query_body, -1)
+    patients_mo_oid = dict()
+    for patient in patients:
+        patients_mo_oid[str(patient.oRecordData.get('rid', None))] = patient.oRecordData.get('mo_oid', None)
+
+    return patients_mo_oid
+
+
+def fill_milestones(patient_diagnoses, rule_diagnoses_services: list):
+    i = 0
+    for patient_diagnosis in patient_diagnoses:
+        milestones = dict()
+        for rule_diagnoses_service in rule_diagnoses_services:
+            if patient_diagnosis.diagnosis_mkb10 not in rule_diagnoses_service['diagnoses']:
                 continue
 
-            rules = order.get('правила', None)
-            if not rules or not isinstance(rules, list):
+            if not rule_diagnoses_service['services']:
                 continue
 
-            for rule in rules:
-                if not isinstance(rule, dict):
-                    continue
-
-                rule_code = rule.get('code', None)
-                if not rule_code or not isinstance(rule_code, str):
-                    continue
-
-                rule_diagnoses = rule.get('диагнозы', None)
-                if not rule_diagnoses or not isinstance(rule_diagnoses, str):
-                    continue
-
-                rule_expanded_diagnoses = expand_diagnoses_only_codes(rule_diagnoses)
-
-                rule_mandatory_services = rule.get('обязательныеУслуги', None)
-                if not rule_mandatory_services or not isinstance(rule_mandatory_services, list):
-                    continue
-
-                for rule_mandatory_service in rule_mandatory_services:
-                    if not rule_mandatory_service or not isinstance(rule_mandatory_service, dict):
-                        continue
-
-                    rule_services_code = rule_mandatory_service.get('code', None)
-                    if not rule_services_code or not isinstance(rule_services_code, str):
-                        continue
-
-                    rule_services = rule_mandatory_service.get('услуги', None)
-                    if not rule_services or not isinstance(rule_services, list):
-                        continue
-
-                    rule_expanded_services = expand_services_only_codes(rule_services)
-                    if not rule_services:
-                        continue
-
-                    idx = find_rule_diagnoses_service(rule_expanded_diagnoses, rule_expanded_services)
-                    if idx is None:
-                        result.append({
-                            'services': rule_expanded_services,
-                            'diagnoses': rule_expanded_diagnoses,
-                            'order_valid_from': order_valid_from,
-                            'code': order_code + '|' + rule_code + '|' + rule_services_code,
-                        })
-                    else:
-                        if order_valid_from > result[idx]['order_valid_from']:
-                            result[idx]['order_valid_from'] = order_valid_from
-                            result[idx]['code'] = order_code + '|' + rule_code + '|' + rule_services_code
-
-        for i, item in enumerate(result):
-            item['services'] = sorted(item['services'])
-            item['services'] = ["'" + service + "'" for service in item['services']]
-            item['diagnoses'] = list(item['diagnoses'])
-            item['diagnoses'] = sorted(item['diagnoses'])
-
-    except Exception as e:
-        print(str(e))
-
-    return result
+            # Get referrals
+            query_body = """
+                SELECT
+                    time_rc
+                FROM
+                    api_semdservice
+                WHERE
+                    document_type IN ('1', '27') AND
+                    ptn_id='""" + patient_diagnosis.ptn_id + """' AND
+                    service_code IN (""" + ','.join(rule_diagnoses_service['services']) + """) AND
+                    time_rc>='""" + patient_diagnosis.diagnosis_date.strftime('%Y-%m-%d') + """'
+                ORDER BY
+                    time_rc
+                LIMIT 1
+                """
+            with connection.cursor() as cursor:
+                cursor.execute(query_body)
+                semd_services = cursor.fetchall()
+
+            if len(semd_services) == 1:
+                milestones[rule_diagnoses_service['code'] + ':нап'] = \
+                    (semd_services[0][0].date() - patient_diagnosis.diagnosis_date).days
+
+            # Get referrals
+            query_body = """
+                SELECT
+                    service_date
+                FROM
+                    api_semdservice
+                WHERE
+                    document_type IN ('2', '3', '4', '9', '12', '20') AND
+                    ptn_id='""" + patient_diagnosis.ptn_id + """' AND
+                    service_code IN (""" + ','.join(rule_diagnoses_service['services']) + """) AND
+                    service_date>='""" + patient_diagnosis.diagnosis_date.strftime('%Y-%m-%d') + """'
+                ORDER BY
+                    service_date
+                LIMIT 1
+                """
+            with connection.cursor() as cursor:
+                cursor.execute(query_body)
+                semd_services = cursor.fetchall()
+
+            if len(semd_services) == 1:
+                milestones[rule_diagnoses_service['code'] + ':исп'] = \
+                    (semd_services[0][0] - patient_diagnosis.diagnosis_date).days
+
+        if milestones:
+            patient_diagnosis.diagnosis_milestones = milestones
+            patient_diagnosis.save()
+
+        print(f"{i}: {patient_diagnosis.ptn_id} {patient_diagnosis.diagnosis_mkb10} - {len(milestones)} | {milestones}")
+        i += 1
@@ -2,7 +2,7 @@ from datetime import datetime
 
 from django.db import transaction
 
-from api.models.orientdb_engine import orient_db_client
+from api.models.orientdb_engine import orient_db_pool
 from api.models.semd_models import PatientRecord, PatientDiagnosis
 
 
@@ -61,7 +61,7 @@ def run(*args):
 
         # Get records
         try:
-            diagnosis = orient_db_client.query(query_body, -1)[0]
+            diagnosis = orient_db_pool.query(query_body, -1)[0]
         except Exception:
             diagnosis = None
 
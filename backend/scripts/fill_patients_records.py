@@ -2,8 +2,13 @@ from datetime import datetime, timezone
 
 from django.db import transaction, connection
 
-from api.models.orientdb_engine import orient_db_client, Patient
+from api.models.orientdb_engine import orient_db_pool, Patient
 from api.models.semd_models import PatientRecord
+from api.utils.patients_index_utils import set_patients_index_watermarks
+
+# Fields of patient search index rows compared by incremental refresh
+PATIENT_INDEX_FIELDS = ('rid', 'lastname', 'firstname', 'middlename', 'birthday', 'gender', 'code', 'snils', 'mo_oid',
+                        'med_terr', 'is_in_cancer_register')
 
 
 def run(*args):
@@ -14,6 +19,14 @@ def run(*args):
                 first_rid = arg[4:]
             except Exception:
                 pass
+    indexed_patients = None
+    if 'incremental' in args and not first_rid:
+        # Only new and changed patients are saved, patients deleted in OrientDB are deleted from search index
+        print("Found 'incremental' parameter, search index is refreshed by changed patients only")
+        indexed_patients = {
+            patient[0]: patient[1:]
+            for patient in Patient.objects.values_list(*PATIENT_INDEX_FIELDS)
+        }
     print("-----------------------------------------------------------------------")
     print(f"Procedure FILL PATIENTS RECORDS with first rid = {first_rid} was stated!")
     if 'erase-records' in args:
@@ -60,14 +73,14 @@ def run(*args):
         """
 
     # Calculate count of queryset
-    orient_result = orient_db_client.query(query_count_body, -1)
+    orient_result = orient_db_pool.query(query_count_body, -1)
     count = orient_result[0].count
     print(f'Found {count} patients.')
 
     # Get queryset
-    patients = orient_db_client.query(query_body, -1)
+    patients = orient_db_pool.query(query_body, -1)
 
-    i = 0
+    i = changed = 0
     # Get records for each patient in queryset
     for patient in patients:
         # Get patient parameters
@@ -97,6 +110,17 @@ def run(*args):
         if not ptn_id:
             continue
 
+        ptn_gender = None if ptn_gender is None else ptn_gender[:1]
+        is_in_cancer_register = False
+        if indexed_patients is not None:
+            indexed_patient = indexed_patients.pop(ptn_id, None)
+            if indexed_patient is not None:
+                is_in_cancer_register = indexed_patient[-1]
+                if indexed_patient[:-1] == (ptn_lastname, ptn_firstname, ptn_middlename, ptn_birthday, ptn_gender,
+                                            ptn_code, ptn_snils, ptn_mo_oid, ptn_med_terr):
+                    continue
+            changed += 1
+
         # Start transaction for each patient
         with transaction.atomic():
             # Save patient
@@ -106,17 +130,34 @@ def run(*args):
                 firstname=ptn_firstname,
                 middlename=ptn_middlename,
                 birthday=ptn_birthday,
-                gender=None if ptn_gender is None else ptn_gender[:1],
+                gender=ptn_gender,
                 code=ptn_code,
                 snils=ptn_snils,
                 mo_oid=ptn_mo_oid,
                 med_terr=ptn_med_terr,
-                is_in_cancer_register=False
+                is_in_cancer_register=is_in_cancer_register
             )
             patient.save()
 
+    if indexed_patients is not None:
+        # Patients which were not found in OrientDB
+        deleted_rids = list(indexed_patients)
+        for k in range(0, len(deleted_rids), 1000):
+            Patient.objects.filter(rid__in=deleted_rids[k:k + 1000]).delete()
+        print(f"    {changed} new or changed patients were saved, {len(deleted_rids)} patients missing in OrientDB were deleted")
+
+    # Patients created after this moment are found by search through rids above watermarks
+    print(f"Watermarks of search index = {set_patients_index_watermarks()}")
+
+    if 'only-patients' in args:
+        print("Found 'only-patients' parameter, continue without the loading records")
+        classes = []
+    else:
+        classes = ["RcChem", "RcHorm", "RcHosp", "RcOper", "RcRay", "RcSpecTreat", "RcClinicalGroup", "RcDeath",
+                   "RcForm90", "RcObs", "RcRegIn", "RcRegOut", "RcDz"]
+
     n = 0
-    for cls in ["RcChem", "RcHorm", "RcHosp", "RcOper", "RcRay", "RcSpecTreat", "RcClinicalGroup", "RcDeath", "RcForm90", "RcObs", "RcRegIn", "RcRegOut", "RcDz"]:
+    for cls in classes:
         # Define records queries
         query_body = f'''
             SELECT 
@@ -132,12 +173,12 @@ def run(*args):
         """
 
         # Calculate count of queryset
-        orient_result = orient_db_client.query(query_count_body, -1)
+        orient_result = orient_db_pool.query(query_count_body, -1)
         count = orient_result[0].count
         print(f'Found {count} {cls} records.')
 
         # Get records
-        records = orient_db_client.query(query_body, -1)
+        records = orient_db_pool.query(query_body, -1)
         n += count
 
         # Save patient records
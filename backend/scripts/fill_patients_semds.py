@@ -2,14 +2,14 @@ import math
 from datetime import datetime, timezone
 from typing import Optional
 
-import xmltodict
-from django.db import transaction, connections, connection
+from django.db import transaction, connection
 
 from api.models.oncor_data_analytics_models import RcSms
 from api.models.semd_models import PatientDiagnosis, PatientSEMD
+from api.utils.cda_utils import CONTENT_NOT_ANALYZED, CONTENT_XPATHS
+from api.utils.semd_extraction_utils import extract_semd_content, extract_semds
 
 ITEMS_IN_ITERATION = 1000
-INDICATOR_MIN_LENGTH = 5
 EXPECTED_INDICATORS = {
     '1': {
         'recipient': 'МО напр.',
@@ -520,101 +520,32 @@ def run(*args):
 
 
 def get_diagnoses(internal_message_id) -> list:
-    query_body = """
-        SELECT
-            regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:*[x:observation[x:value[@codeSystem="1.2.643.5.1.13.13.11.1005"]]]]', payload::xml, '{{x,urn:hl7-org:v3}}'), '<new/>'), '\n', ' ', 'g') as diagnoses
-        FROM
-            vimis_sending
-        WHERE
-            internal_message_id = '""" + internal_message_id + "'"
-
-    with connections['egisz-db'].cursor() as cursor:
-        cursor.execute(query_body)
-        try:
-            semd = cursor.fetchone()
-        except Exception:
-            semd = None
-
+    semd = extract_semds([internal_message_id]).get(internal_message_id, None)
     if not semd:
         return list()
 
-    xml_diagnoses = semd[0].split('<new/>')
-
     # Calculate diagnoses set
     diagnoses = set()
-    for xml in xml_diagnoses:
-        if not xml:
-            continue
-        try:
-            parent = xmltodict.parse(xml)
-            if not isinstance(parent, dict):
-                continue
-            for parent_key, parent_dict in parent.items():
-                if not isinstance(parent_dict, dict):
-                    continue
-                row_diagnosis_code1076 = None
-                parent_node_code_node = parent_dict.get('code', None)
-                if parent_node_code_node and isinstance(parent_node_code_node, dict) and \
-                        (parent_node_code_node.get('@codeSystem', None) == '1.2.643.5.1.13.13.11.1076' or
-                         parent_node_code_node.get('@codeSystem', None) == '1.2.643.5.1.13.13.99.2.795'):
-                    row_diagnosis_code1076 = parent_node_code_node.get('@code', None)
-
-                for key, entry_list in parent_dict.items():
-                    if not isinstance(entry_list, list):
-                        entry_list = [entry_list]
-
-                    for entry in entry_list:
-                        if not isinstance(entry, dict):
-                            continue
-                        observation = entry.get('observation', None)
-                        if not observation:
-                            continue
-
-                        row_diagnosis_date = None
-                        observation_effective_times = observation.get('effectiveTime', None)
-                        if isinstance(observation_effective_times, dict):
-                            observation_effective_time = observation_effective_times.get('@value', None)
-                            if isinstance(observation_effective_time, str):
-                                row_diagnosis_date = (
-                                        observation_effective_time[0:4] + '-' +
-                                        observation_effective_time[4:6] + '-' +
-                                        observation_effective_time[6:8]
-                                )
-
-                        row_diagnosis_code1077 = None
-                        node_code_node = observation.get('code', None)
-                        if node_code_node and isinstance(node_code_node, dict) and \
-                                node_code_node.get('@codeSystem', None) == '1.2.643.5.1.13.13.11.1077':
-                            row_diagnosis_code1077 = node_code_node.get('@code', None)
-
-                        row_diagnosis_mkb10 = None
-                        observation_values = observation.get('value', None)
-                        if observation_values:
-                            if not isinstance(observation_values, list):
-                                observation_values = [observation_values]
-
-                            for observation_value in observation_values:
-                                if not isinstance(observation_value, dict):
-                                    continue
-                                observation_value_code_system = observation_value.get('@codeSystem', '')
-                                if observation_value_code_system == '1.2.643.5.1.13.13.11.1005':
-                                    row_diagnosis_mkb10 = observation_value.get('@code', None)
-                                    break
-
-                        if row_diagnosis_mkb10:
-                            diagnoses = diagnoses.union(
-                                {
-                                    (
-                                        row_diagnosis_mkb10,
-                                        row_diagnosis_date,
-                                        row_diagnosis_code1076,
-                                        row_diagnosis_code1077
-                                    )
-                                }
-                            )
-
-        except Exception:
-            pass
+    for diagnosis in semd.diagnoses:
+        row_diagnosis_code1076 = None
+        parent_node_code_node = diagnosis['parent_node_code_node']
+        if parent_node_code_node['code_system'] == '1.2.643.5.1.13.13.11.1076' or \
+                parent_node_code_node['code_system'] == '1.2.643.5.1.13.13.99.2.795':
+            row_diagnosis_code1076 = parent_node_code_node['code']
+
+        row_diagnosis_code1077 = None
+        node_code_node = diagnosis['code_node']
+        if node_code_node['code_system'] == '1.2.643.5.1.13.13.11.1077':
+            row_diagnosis_code1077 = node_code_node['code']
+
+        diagnoses.add(
+            (
+                diagnosis['mkb10'],
+                diagnosis['date'],
+                row_diagnosis_code1076,
+                row_diagnosis_code1077
+            )
+        )
 
     # Save records to result
     result_diagnoses = list()
@@ -649,462 +580,18 @@ def get_diagnosis(diagnoses: list, code1077: Optional[str] = None,
 
 
 def get_content(internal_message_id: str, soap_doc_type: str) -> (dict, str):
-    result_dict = None
-    error_str = ''
-    if soap_doc_type == '1':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act/x:performer/x:assignedEntity/x:representedOrganization/x:id/@root', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as recipient,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act/x:code[@codeSystem="1.2.643.5.1.13.13.11.1009"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as purpose,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as service,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1463"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as consultation_type
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'recipient': semd[0],
-                'purpose': semd[1],
-                'service': semd[2],
-                'consultation_type': semd[3]
-            }
-
-    elif soap_doc_type == '2':
-        query_body = """
-            SELECT
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="1805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as protocol,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="1806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as conclusion,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as recommendation
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'protocol': semd[0] if len(semd[0]) >= INDICATOR_MIN_LENGTH else '',
-                'conclusion': semd[1] if len(semd[1]) >= INDICATOR_MIN_LENGTH else '',
-                'recommendation': semd[2] if len(semd[2]) >= INDICATOR_MIN_LENGTH else '',
-            }
-
-    elif soap_doc_type == '3':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as laboratory_tests
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'laboratory_tests': semd[0]
-            }
-
-    elif soap_doc_type == '4':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as histological_tests
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'histological_tests': semd[0]
-            }
-
-    elif soap_doc_type == '5':
-        query_body = """
-            SELECT
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as protocol,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="12193"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as protocol2,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as conclusion,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="837"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as conclusion2,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as recommendation
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'protocol': semd[0] + semd[1] if len(semd[0] + semd[1]) >= INDICATOR_MIN_LENGTH else '',
-                'conclusion': semd[2] + semd[3] if len(semd[2] + semd[3]) >= INDICATOR_MIN_LENGTH else '',
-                'recommendation': semd[4] if len(semd[4]) >= INDICATOR_MIN_LENGTH else '',
-            }
-
-    elif soap_doc_type == '6':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="vimisConsiliumProtocol"]]/x:entry/x:observation/x:effectiveTime/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as date,
-                array_to_string(xpath('/x:ClinicalDocument/x:effectiveTime/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as date2,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="vimisConsiliumProtocol"]]/x:entry/x:observation/x:text/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ', '),'\n',' ','g') as number,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="CONSILIUM"]]/x:entry/x:observation[x:code[@code="11003"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ', '),'\n',' ','g') as number2,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1506"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as purpose,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.166"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as form,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.349"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as conclusion
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'date': (
-                    semd[0][0:4] + '-' + semd[0][4:6] + '-' + semd[0][6:8]
-                    if semd[0]
-                    else semd[1][0:4] + '-' + semd[1][4:6] + '-' + semd[1][6:8]
-                ),
-                'number': semd[2] + semd[3],
-                'purpose': semd[4],
-                'form': semd[5],
-                'conclusion': semd[6],
-                'diagnostics': '',
-                'laboratory_tests': '',
-                'treatments': ''
-            }
-
-    elif soap_doc_type == '7':
-        result_dict = 'Анализ не проводился.'
-
-    elif soap_doc_type == '8':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="HOSP"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_start,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="HOSP"]]/x:component/x:section[x:code[@code="PATIENTROUTE"]]/x:component/x:section[x:code[@code="DEPARTINFO"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_start2,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.256"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as urgency,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="STATEADM"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1006"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as stateadm,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="HOSP"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_end,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="HOSP"]]/x:component/x:section[x:code[@code="PATIENTROUTE"]]/x:component/x:section[x:code[@code="DEPARTINFO"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_end2,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="STATEDIS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1006"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as statedis,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1046"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as result,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESCONS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as consultations,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESINSTR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as diagnostics,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESLAB"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as laboratory_tests,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESMOR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as morphology_tests,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="DRUG"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1367"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as sum_drug,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="2"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.133"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as ray_therapy,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="41"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.647"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as chemo_therapy,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="42"][@codeSystem="1.2.643.5.1.13.13.11.1518"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.407"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as hormone_therapy,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as sur
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            if semd[0]:
-                date_start = semd[0][0:4] + '-' + semd[0][4:6] + '-' + semd[0][6:8]
-            else:
-                date_start = semd[1].split(';')
-                date_start = date_start[0]
-                date_start = date_start[0:4] + '-' + date_start[4:6] + '-' + date_start[6:8]
-            if semd[4]:
-                date_end = semd[4][0:4] + '-' + semd[4][4:6] + '-' + semd[4][6:8]
-            else:
-                date_end = semd[5].split(';')
-                date_end = date_end[len(date_end) - 1]
-                date_end = date_end[0:4] + '-' + date_end[4:6] + '-' + date_end[6:8]
-            result_dict = {
-                'date_start': date_start,
-                'urgency': semd[2],
-                'stateadm': semd[3].split(';')[0],
-                'date_end': date_end,
-                'statedis': semd[6].split(';')[0],
-                'result': semd[7],
-                'consultations': semd[8],
-                'diagnostics': semd[9],
-                'laboratory_tests': semd[10],
-                'morphology_tests': semd[11],
-                'sum_drug': semd[12],
-                'ray_therapy': semd[13],
-                'chemo_therapy': semd[14],
-                'hormone_therapy': semd[15],
-                'sur': semd[16]
-            }
-
-    elif soap_doc_type == '9':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as cytological_tests
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'cytological_tests': semd[0]
-            }
-
-    elif soap_doc_type == '10':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as sur,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SUR"]]//x:effectiveTime/x:low/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_start,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SUR"]]//x:effectiveTime/x:high/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_end
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'sur': semd[0],
-                'date_start': semd[1],
-                'date_end': semd[2]
-            }
-
-    elif soap_doc_type == '11':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.144"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as late_reason,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.547"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ' ') as tnm,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.546"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as stage,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.143"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as side,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1486"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as morph_class,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.146"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as clinical_group,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.129"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as how_discover,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.901"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as gem_limph_class,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1487"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as topograph,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1477"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as loc_met,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:value[@codeSystem="1.2.643.5.1.13.13.99.2.127"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as loc_far_met,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[x:code[@code="12298"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_number,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[x:code[@code="12299"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_main,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.141"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as plural,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.583"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_state,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.761"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as blast_form,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.760"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as miel_phase,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.128"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as method,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1117"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as refined_method
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'late_reason': semd[0],
-                'tnm': semd[1],
-                'stage': semd[2],
-                'side': semd[3],
-                'morph_class': semd[4],
-                'clinical_group': semd[5],
-                'how_discover': semd[6],
-                'gem_limph_class': semd[7],
-                'topograph': semd[8],
-                'loc_met': semd[9],
-                'loc_far_met': semd[10],
-                'tumor_number': semd[11],
-                'tumor_main': semd[12],
-                'plural': semd[13],
-                'tumor_state': semd[14],
-                'blast_form': semd[15],
-                'miel_phase': semd[16],
-                'method': semd[17],
-                'refined_method': semd[18]
-            }
-
-    elif soap_doc_type == '12':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="AMBS"]]/x:entry/x:encounter/x:effectiveTime/x:low/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_start,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="AMBS"]]/x:entry/x:encounter/x:effectiveTime/x:high/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as date_end,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="AMBS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1007"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as order,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="AMBS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1046"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as result,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESCONS"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as consultations,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESINSTR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as diagnostics,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESLAB"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1080"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as laboratory_tests,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="RESMOR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as morphology_tests,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="DRUG"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1367"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as sum_drug,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="SUR"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ';') as sur
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'date_start': semd[0][0:4] + '-' + semd[0][4:6] + '-' + semd[0][6:8],
-                'date_end': semd[1][0:4] + '-' + semd[1][4:6] + '-' + semd[1][6:8],
-                'order': semd[2],
-                'result': semd[3],
-                'consultations': semd[4],
-                'diagnostics': semd[5],
-                'laboratory_tests': semd[6],
-                'morphology_tests': semd[7],
-                'sum_drug': semd[8],
-                'sur': semd[9]
-            }
-
-    elif soap_doc_type == '13':
-        result_dict = 'Анализ не проводился.'
-
-    elif soap_doc_type == '16':
-        result_dict = 'Анализ не проводился.'
-
-    elif soap_doc_type == '20':
-        query_body = """
-            SELECT
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="805"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as protocol,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="806"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as conclusion,
-                regexp_replace(array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[x:code[@code="807"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/text()', payload::xml, '{{x,urn:hl7-org:v3}}'), ' '),'\n',' ','g') as recommendation
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'protocol': semd[0] if len(semd[0]) >= INDICATOR_MIN_LENGTH else '',
-                'conclusion': semd[1] if len(semd[1]) >= INDICATOR_MIN_LENGTH else '',
-                'recommendation': semd[2] if len(semd[2]) >= INDICATOR_MIN_LENGTH else '',
-            }
-
-    elif soap_doc_type == '27':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="SCOPORG"]]/x:entry/x:act/x:performer/x:assignedEntity/x:representedOrganization/x:id/@root', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as recipient,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component//x:*[@codeSystem="1.2.643.5.1.13.13.11.1070"]/@code', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as service
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'recipient': semd[0],
-                'service': semd[1]
-            }
-
-    elif soap_doc_type == '37':
-        query_body = """
-            SELECT
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="ORGINFO"]]/x:entry/x:act/x:performer/x:assignedEntity/x:representedOrganization/x:id/@root', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as recipient,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.547"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ' ') as tnm,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.546"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as stage,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.143"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as side,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1486"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as morph_class,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.146"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as clinical_group,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.129"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as how_discover,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.901"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as gem_limph_class,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1487"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as topograph,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1477"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as loc_met,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:value[@codeSystem="1.2.643.5.1.13.13.99.2.127"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as loc_far_met,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[x:code[@code="12298"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_number,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[x:code[@code="12299"][@codeSystem="1.2.643.5.1.13.13.99.2.166"]]/x:value/@value', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_main,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.141"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as plural,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.583"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as tumor_state,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.761"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as blast_form,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.760"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as miel_phase,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.99.2.128"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as method,
-                array_to_string(xpath('/x:ClinicalDocument/x:component/x:structuredBody/x:component/x:section[x:code[@code="DGN"]]//x:*[@codeSystem="1.2.643.5.1.13.13.11.1117"]/@displayName', payload::xml, '{{x,urn:hl7-org:v3}}'), ', ') as refined_method
-            FROM
-                vimis_sending
-            WHERE
-                internal_message_id = '""" + internal_message_id + "'"
-        with connections['egisz-db'].cursor() as cursor:
-            cursor.execute(query_body)
-            try:
-                semd = cursor.fetchone()
-            except Exception:
-                semd = None
-        if semd:
-            result_dict = {
-                'recipient': semd[0],
-                'tnm': semd[1],
-                'stage': semd[2],
-                'side': semd[3],
-                'morph_class': semd[4],
-                'clinical_group': semd[5],
-                'how_discover': semd[6],
-                'gem_limph_class': semd[7],
-                'topograph': semd[8],
-                'loc_met': semd[9],
-                'loc_far_met': semd[10],
-                'tumor_number': semd[11],
-                'tumor_main': semd[12],
-                'plural': semd[13],
-                'tumor_state': semd[14],
-                'blast_form': semd[15],
-                'miel_phase': semd[16],
-                'method': semd[17],
-                'refined_method': semd[18]
-            }
-
+    # Content is extracted with SEMD by the same parsing of payload and kept in extraction table
+    semd = extract_semds([internal_message_id]).get(internal_message_id, None)
+    if semd is None:
+        result_dict = None if soap_doc_type in CONTENT_XPATHS else CONTENT_NOT_ANALYZED
+    elif semd.content is not None and soap_doc_type in semd.content:
+        result_dict = semd.content[soap_doc_type]
     else:
-        result_dict = 'Анализ не проводился.'
+        result_dict = extract_semd_content(semd, soap_doc_type)
 
+    error_str = ''
     if isinstance(result_dict, dict):
+        result_dict = dict(result_dict)
         error_qty = 0
         for key in list(result_dict.keys()):
             if result_dict[key] == '':
@@ -9,7 +9,7 @@ from django.db.models import Q
 from lxml import etree
 
 from api.models.oncor_data_analytics_models import RcSemd, StatEhr
-from api.models.orientdb_engine import orient_db_client
+from api.models.orientdb_engine import orient_db_pool
 from api.models.semd_models import PatientSEMD
 
 ATTACHMENTS_DIR = 'C:\\oncor\\attachments\\'
@@ -295,7 +295,7 @@ def run(*args):
                     '''
 
                     try:
-                        sms_record = orient_db_client.query(query_body, -1)[0]
+                        sms_record = orient_db_pool.query(query_body, -1)[0]
                     except Exception:
                         sms_record = None
 
@@ -330,7 +330,7 @@ def run(*args):
                     '''
 
                     try:
-                        sms_record = orient_db_client.query(query_body, -1)[0]
+                        sms_record = orient_db_pool.query(query_body, -1)[0]
                     except Exception:
                         sms_record = None
 